@@ -0,0 +1,75 @@
+"""
+Camera lookup by IP: blind index (HMAC column + SQL index) vs decrypting every row.
+
+Usage: python benchmarks/bench_blind_index.py [rows] [lookups]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import camera_repository
+import migrations
+from camera_crypto import credentials, blind_index
+
+
+def ip(index):
+    return f"10.{index // 65536}.{index // 256 % 256}.{index % 256}"
+
+
+def populate(count):
+    ips = [ip(index) for index in range(count)]
+    tokens = credentials.encrypt_many(ips)
+    usernames = credentials.encrypt_many(['admin'] * count)
+    passwords = credentials.encrypt_many(['secret'] * count)
+    camera_db.executemany(
+        'INSERT INTO cameras (ip, username, password, ptz, ip_bidx, username_bidx) VALUES (?, ?, ?, 0, ?, ?)',
+        [(tokens[i], usernames[i], passwords[i], blind_index('ip', ips[i]), blind_index('username', 'admin'))
+         for i in range(count)])
+
+
+def scan_lookup(target):
+    # Ancien chemin : tout déchiffrer puis chercher
+    return next((camera for camera in camera_repository.get_cameras() if camera.ip == target), None)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    camera_db.configure(os.path.join(tempfile.mkdtemp(prefix='bench_bidx_'), 'bidx.db'))
+    migrations.reset_current()
+    migrations.ensure_current()
+    populate(count)
+    targets = [ip(random.randrange(count)) for _ in range(lookups)]
+
+    start = time.perf_counter()
+    for target in targets:
+        assert camera_repository.find_by_ip(target).ip == target
+    indexed = (time.perf_counter() - start) / lookups
+
+    credentials.clear_cache()
+    start = time.perf_counter()
+    for target in targets[:3]:
+        assert scan_lookup(target).ip == target
+    scanned = (time.perf_counter() - start) / 3
+
+    camera_db.execute('UPDATE cameras SET ip_bidx = NULL, username_bidx = NULL')
+    start = time.perf_counter()
+    last_id = 0
+    while last_id is not None:
+        with camera_db.transaction() as conn:
+            last_id = migrations.backfill_blind_index(conn, last_id, migrations.BATCH_SIZE)
+    backfill = time.perf_counter() - start
+
+    print(f"{count} cameras")
+    print(f"{'find_camera_by_ip':28}{indexed * 1e6:10.0f} us/lookup")
+    print(f"{'decrypt all + search':28}{scanned * 1e6:10.0f} us/lookup  ({scanned / indexed:.0f}x slower)")
+    print(f"{'one-time backfill':28}{backfill:10.2f} s")
+    camera_db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
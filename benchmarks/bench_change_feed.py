@@ -0,0 +1,94 @@
+"""
+Applying a camera edit made by another process, with N cameras in the table: change feed
+diff (read the log, fetch and decrypt the changed rows) vs full reload (read and decrypt
+every row through iter_pages).
+
+Both sides are timed once the edit is committed: the detection delay (up to
+change_feed.POLL_INTERVAL of polling) is the same for both and is not counted.
+
+Usage: python benchmarks/bench_change_feed.py [cameras] [edits]
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import change_feed
+import migrations
+from camera_repository import iter_pages
+from camera_crypto import credentials, blind_index
+
+# Écrivain séparé : modifie la caméra 1 à chaque ligne reçue, répond une fois la transaction validée
+WRITER = '''
+import sys
+sys.path.insert(0, {root!r})
+import camera_db, camera_repository
+camera_db.configure({db!r})
+for line in sys.stdin:
+    camera_repository.update_camera(1, f"10.9.0.{{int(line)}}", 'admin', 'secret', 0)
+    print(line.strip(), flush=True)
+'''
+
+
+def populate(count):
+    ips = [f"10.{index // 65536}.{index // 256 % 256}.{index % 256}" for index in range(count)]
+    tokens = credentials.encrypt_many(ips)
+    usernames = credentials.encrypt_many(['admin'] * count)
+    passwords = credentials.encrypt_many(['secret'] * count)
+    camera_db.executemany(
+        'INSERT INTO cameras (ip, username, password, ptz, ip_bidx, username_bidx) VALUES (?, ?, ?, 0, ?, ?)',
+        [(tokens[i], usernames[i], passwords[i], blind_index('ip', ips[i]), blind_index('username', 'admin'))
+         for i in range(count)])
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    db = os.path.join(tempfile.mkdtemp(prefix='bench_feed_'), 'feed.db')
+    camera_db.configure(db)
+    migrations.reset_current()
+    migrations.ensure_current()
+    populate(count)
+
+    received = []
+    # poll() appelé directement : pas de thread, pas d'attente de la période
+    feed = change_feed.ChangeFeed(lambda upserted, deleted: received.append(upserted))
+    feed.version = change_feed.current_version()
+    loaded = sum(len(page) for page in iter_pages())
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    writer = subprocess.Popen([sys.executable, '-c', WRITER.format(root=root, db=db)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    diff_times, reload_times = [], []
+    try:
+        for index in range(edits):
+            writer.stdin.write(f"{index}\n")
+            writer.stdin.flush()
+            writer.stdout.readline()
+            start = time.perf_counter()
+            feed.poll()
+            diff_times.append(time.perf_counter() - start)
+            assert received[-1][0].ip == f"10.9.0.{index}", 'edit not seen by the feed'
+            start = time.perf_counter()
+            loaded = sum(len(page) for page in iter_pages())
+            reload_times.append(time.perf_counter() - start)
+    finally:
+        writer.stdin.close()
+        writer.wait()
+
+    print(f"{count} cameras, {edits} edits from another process "
+          f"(detection: up to {change_feed.POLL_INTERVAL * 1000:.0f} ms of polling, not counted)")
+    print(f"full reload:  {median(reload_times) * 1000:8.2f} ms median, "
+          f"{max(reload_times) * 1000:.2f} ms max ({loaded} rows)")
+    print(f"change feed:  {median(diff_times) * 1000:8.2f} ms median, "
+          f"{max(diff_times) * 1000:.2f} ms max ({len(received)} diffs of 1 row)")
+
+
+if __name__ == '__main__':
+    main()
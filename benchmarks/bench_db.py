@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: connect-per-call (old path) vs the shared camera_db connection.
+
+Inserts are measured row by row on both paths (one transaction per row: only the connection
+reuse differs), then as one executemany batch on the shared connection.
+
+Usage: python benchmarks/bench_db.py [rows]
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS cameras
+            (id INTEGER PRIMARY KEY, ip TEXT, username TEXT, password TEXT, ptz INTEGER DEFAULT 0)'''
+INSERT = 'INSERT INTO cameras (ip, username, password, ptz) VALUES (?, ?, ?, ?)'
+SELECT = 'SELECT id, ip, username, password, ptz FROM cameras WHERE id = ?'
+
+
+def make_rows(count):
+    return [(f'10.0.{i // 256}.{i % 256}'.encode(), b'admin', b'secret-token', i % 2)
+            for i in range(count)]
+
+
+def bench_connect_per_call(db_file, rows):
+    conn = sqlite3.connect(db_file)
+    conn.execute(SCHEMA)
+    conn.close()
+
+    start = time.perf_counter()
+    for row in rows:
+        conn = sqlite3.connect(db_file)
+        conn.execute(INSERT, row)
+        conn.commit()
+        conn.close()
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for camera_id in range(1, len(rows) + 1):
+        conn = sqlite3.connect(db_file)
+        conn.execute(SELECT, (camera_id,)).fetchone()
+        conn.close()
+    select_time = time.perf_counter() - start
+    return insert_time, select_time
+
+
+def bench_pooled(db_file, rows, batched):
+    camera_db.configure(db_file)
+    camera_db.execute(SCHEMA)
+
+    start = time.perf_counter()
+    if batched:
+        camera_db.executemany(INSERT, rows)
+    else:
+        for row in rows:
+            camera_db.execute(INSERT, row)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for camera_id in range(1, len(rows) + 1):
+        camera_db.query_one(SELECT, (camera_id,))
+    select_time = time.perf_counter() - start
+    camera_db.close_connection()
+    return insert_time, select_time
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rows = make_rows(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        old = bench_connect_per_call(os.path.join(tmp, 'old.db'), rows)
+        pooled = bench_pooled(os.path.join(tmp, 'pooled.db'), rows, batched=False)
+        batched = bench_pooled(os.path.join(tmp, 'batched.db'), rows, batched=True)
+
+    print(f"{count} rows")
+    print(f"{'':30}{'insert (s)':>12}{'select (s)':>12}")
+    print(f"{'connect-per-call':30}{old[0]:12.3f}{old[1]:12.3f}")
+    print(f"{'camera_db, row by row':30}{pooled[0]:12.3f}{pooled[1]:12.3f}")
+    print(f"{'camera_db, executemany':30}{batched[0]:12.3f}{batched[1]:12.3f}")
+    # Réutilisation de la connexion seule, puis avec le regroupement des écritures
+    print(f"{'speed-up (connection reuse)':30}{old[0] / pooled[0]:11.1f}x{old[1] / pooled[1]:11.1f}x")
+    print(f"{'speed-up (+ batched insert)':30}{old[0] / batched[0]:11.1f}x{old[1] / batched[1]:11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
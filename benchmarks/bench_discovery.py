@@ -0,0 +1,69 @@
+"""
+Discovery + concurrent probing of N cameras against local stand-ins.
+
+Usage: python benchmarks/bench_discovery.py [--devices 50,200] [--latency 0.02] [--workers 32]
+
+One mock ONVIF HTTP server answers for every device; each device gets its own loopback
+address (127.0.x.y, Linux) so the per-host HTTP sessions are not shared.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import camera_discovery
+import camera_manager
+import migrations
+from mock_onvif import MockOnvifServer, MockDiscoveryResponder
+
+
+def device_host(index):
+    return f"127.0.{index // 250}.{index % 250 + 2}"
+
+
+def run(count, latency, workers, timeout):
+    server = MockOnvifServer('0.0.0.0', latency=latency).start()
+    xaddrs = [f"http://{device_host(i)}:{server.port}/onvif/device_service" for i in range(count)]
+    responder = MockDiscoveryResponder(xaddrs).start()
+    try:
+        start = time.perf_counter()
+        devices = camera_discovery.ws_discover(timeout, ('127.0.0.1', responder.port))
+        discovered = time.perf_counter()
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            devices = list(executor.map(
+                lambda d: camera_discovery.probe_device(d, 'admin', 'admin'), devices))
+        probed = time.perf_counter()
+        added = camera_manager.add_discovered_cameras(devices, 'admin', 'admin')
+        inserted = time.perf_counter()
+        errors = sum(1 for d in devices if d['error'])
+        return len(devices), errors, len(added), probed - discovered, inserted - probed, inserted - start
+    finally:
+        responder.stop()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', default='50,200')
+    parser.add_argument('--latency', type=float, default=0.02, help='Per-request camera latency (s)')
+    parser.add_argument('--workers', type=int, default=camera_discovery.PROBE_WORKERS)
+    parser.add_argument('--timeout', type=float, default=1.0, help='ProbeMatch listening time (s)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_discovery_')
+    print(f"{'N':>5}{'found':>7}{'errors':>8}{'added':>7}{'probe (s)':>11}{'insert (s)':>12}{'total (s)':>11}")
+    for count in (int(c) for c in args.devices.split(',')):
+        camera_db.configure(os.path.join(workdir, f'bench_{count}.db'))
+        migrations.reset_current()
+        camera_manager.init_db()
+        found, errors, added, probe, insert, total = run(count, args.latency, args.workers, args.timeout)
+        print(f"{count:5}{found:7}{errors:8}{added:7}{probe:11.2f}{insert:12.3f}{total:11.2f}")
+        camera_db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+RSS / CPU of N streams: one player process per camera vs one video wall process (--grid).
+
+Usage: python benchmarks/bench_grid.py SOURCE [--counts 1,4,9,16] [--warmup 10] [--window 5]
+
+SOURCE is any URI libVLC can open (local file, rtsp://...). Requires psutil.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+try:
+    import psutil
+except ImportError:
+    sys.exit("psutil is required for this benchmark (pip install psutil)")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAYER = os.path.join(ROOT, 'player_vilkin_hikvision.py')
+
+
+def measure(processes, warmup, window):
+    """RSS totale (Mo) et CPU moyen (%) de l'ensemble des processus"""
+    time.sleep(warmup)
+    tracked = [psutil.Process(p.pid) for p in processes]
+    for proc in tracked:
+        proc.cpu_percent(None)
+    time.sleep(window)
+    cpu = sum(proc.cpu_percent(None) for proc in tracked)
+    rss = sum(proc.memory_info().rss for proc in tracked) / (1024 * 1024)
+    return rss, cpu
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_per_process(source, count, warmup, window):
+    processes = [subprocess.Popen([sys.executable, PLAYER, '--uri', source]) for _ in range(count)]
+    try:
+        return measure(processes, warmup, window)
+    finally:
+        stop(processes)
+
+
+def run_grid(source, count, warmup, window):
+    args = [sys.executable, PLAYER, '--grid']
+    for _ in range(count):
+        args += ['--uri', source]
+    processes = [subprocess.Popen(args)]
+    try:
+        return measure(processes, warmup, window)
+    finally:
+        stop(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source')
+    parser.add_argument('--counts', default='1,4,9,16')
+    parser.add_argument('--warmup', type=float, default=10)
+    parser.add_argument('--window', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'N':>3}{'RSS proc (MB)':>16}{'RSS grid (MB)':>16}{'CPU proc (%)':>15}{'CPU grid (%)':>15}")
+    for count in (int(c) for c in args.counts.split(',')):
+        rss_proc, cpu_proc = run_per_process(args.source, count, args.warmup, args.window)
+        rss_grid, cpu_grid = run_grid(args.source, count, args.warmup, args.window)
+        print(f"{count:3}{rss_proc:16.1f}{rss_grid:16.1f}{cpu_proc:15.1f}{cpu_grid:15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Health scan of a simulated fleet: N cameras, a share of them unreachable.
+
+Usage: python benchmarks/bench_health.py [--cameras 100,1000] [--down 0.1] [--concurrency 100]
+
+Reachable cameras share one mock ONVIF server and one mock RTSP server bound to every
+loopback address; each camera gets its own 127.0.x.y (Linux). Unreachable ones use
+TEST-NET-1 addresses (192.0.2.x): connect timeout, or an immediate error when the host
+has no route.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import health_monitor
+from mock_onvif import MockOnvifServer, MockRtspServer
+
+
+def camera_host(index, down):
+    if down:
+        return f"192.0.2.{index % 250 + 2}"
+    return f"127.0.{index // 250}.{index % 250 + 2}"
+
+
+def run(count, down_ratio, concurrency, http_port, rtsp_port):
+    down_every = round(1 / down_ratio) if down_ratio else 0
+    targets = [(index, camera_host(index, down_every and index % down_every == 0))
+               for index in range(count)]
+    lags = []
+
+    async def measure():
+        # Réactivité de la boucle pendant le scan (ce que verrait un autre client de la boucle)
+        task = asyncio.ensure_future(health_monitor.scan(targets, concurrency,
+                                                         http_port=http_port, rtsp_port=rtsp_port))
+        while not task.done():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+        return task.result()
+
+    start = time.perf_counter()
+    results = asyncio.run(measure())
+    scanned = time.perf_counter()
+    health_monitor.store_results(results)
+    stored = time.perf_counter()
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return counts, scanned - start, stored - scanned, max(lags) if lags else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cameras', default='100,1000')
+    parser.add_argument('--down', type=float, default=0.1, help='Share of unreachable cameras')
+    parser.add_argument('--concurrency', type=int, default=health_monitor.MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    http = MockOnvifServer('0.0.0.0').start()
+    rtsp = MockRtspServer('0.0.0.0').start()
+    camera_db.configure(os.path.join(tempfile.mkdtemp(prefix='bench_health_'), 'health.db'))
+    print(f"{'N':>6}{'ok':>6}{'degraded':>10}{'down':>6}{'scan (s)':>10}{'store (s)':>11}{'max loop lag (ms)':>19}")
+    try:
+        for count in (int(c) for c in args.cameras.split(',')):
+            counts, scan, store, lag = run(count, args.down, args.concurrency, http.port, rtsp.port)
+            print(f"{count:6}{counts.get('ok', 0):6}{counts.get('degraded', 0):10}"
+                  f"{counts.get('down', 0):6}{scan:10.2f}{store:11.3f}{lag * 1000:19.1f}")
+    finally:
+        http.stop()
+        rtsp.stop()
+        camera_db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Bulk import / export of the camera table.
+
+Usage: python benchmarks/bench_import.py [--rows 50000] [--workers 0,4] [--baseline 2000]
+
+Writes a CSV and a JSON file of N cameras (1% invalid rows), imports each into a fresh
+database, then exports it again. The baseline is the old path (add_camera per row, one
+transaction each), measured on a sample and extrapolated to N rows.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import camera_io
+import camera_manager
+import migrations
+
+
+def make_records(count, invalid=True):
+    for index in range(count):
+        record = {'ip': f"10.{index // 65536}.{index // 256 % 256}.{index % 256}",
+                  'username': 'admin', 'password': f"secret-{index}", 'ptz': index % 2}
+        if invalid and index % 100 == 99:
+            record['ip'] = 'not an ip!'
+        yield record
+
+
+def write_files(directory, count):
+    csv_path = os.path.join(directory, 'cameras.csv')
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=camera_io.FIELDS)
+        writer.writeheader()
+        writer.writerows(make_records(count))
+    json_path = os.path.join(directory, 'cameras.json')
+    with open(json_path, 'w') as f:
+        json.dump(list(make_records(count)), f, indent=1)
+    return csv_path, json_path
+
+
+def fresh_db(directory, name):
+    camera_db.configure(os.path.join(directory, name))
+    migrations.reset_current()
+    camera_manager.init_db()
+
+
+def baseline(directory, sample):
+    fresh_db(directory, 'baseline.db')
+    start = time.perf_counter()
+    for record in make_records(sample, invalid=False):
+        camera_manager.add_camera(record['ip'], record['username'], record['password'], record['ptz'])
+    return (time.perf_counter() - start) / sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--workers', default='0', help='Comma-separated process pool sizes')
+    parser.add_argument('--baseline', type=int, default=2000, help='Sample size of the old path')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench_import_')
+    csv_path, json_path = write_files(directory, args.rows)
+    print(f"{args.rows} rows ({os.path.getsize(csv_path) / 1e6:.1f} MB CSV), 1% invalid")
+    print(f"{'':28}{'seconds':>9}{'rows/s':>10}{'imported':>10}{'errors':>8}")
+
+    if args.baseline:
+        per_row = baseline(directory, args.baseline)
+        print(f"{'add_camera per row (est.)':28}{per_row * args.rows:9.2f}{1 / per_row:10.0f}")
+
+    for workers in (int(w) for w in args.workers.split(',')):
+        for label, path in (('csv', csv_path), ('json', json_path)):
+            fresh_db(directory, f"{label}_{workers}.db")
+            report = camera_io.import_cameras(path, workers=workers)
+            seconds = report['seconds']
+            print(f"{f'import {label}, workers={workers}':28}{seconds:9.2f}{report['read'] / seconds:10.0f}"
+                  f"{report['imported']:10}{len(report['errors']):8}")
+
+    for fmt in ('csv', 'jsonl'):
+        start = time.perf_counter()
+        count = camera_io.export_cameras(os.path.join(directory, f"export.{fmt}"), with_passwords=True)
+        seconds = time.perf_counter() - start
+        print(f"{f'export {fmt}':28}{seconds:9.2f}{count / seconds:10.0f}")
+    camera_db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Online key rotation: re-encrypt N cameras in batches while another process keeps
+looking cameras up and decrypting their password (what the viewer does).
+
+Usage: python benchmarks/bench_key_rotation.py [cameras]
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+# Trousseau temporaire : le vrai camera_keys.json n'est pas touché
+_directory = tempfile.mkdtemp(prefix='bench_rotation_')
+os.environ['CAMERA_KEYRING'] = os.path.join(_directory, 'keys.json')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import camera_manager
+import change_feed
+import key_rotation
+from camera_crypto import credentials, blind_index
+
+# Lecteur séparé : recherches par IP et déchiffrement du mot de passe jusqu'au fichier stop
+READER = '''
+import os, sys, time, random
+sys.path.insert(0, {root!r})
+import camera_db, camera_repository
+camera_db.configure({db!r})
+worst = 0.0
+reads = errors = 0
+while not os.path.exists({stop!r}):
+    start = time.perf_counter()
+    camera = camera_repository.find_by_ip(f"10.0.1.{{random.randrange(256)}}")
+    if camera.password != 'secret':
+        errors += 1
+    worst = max(worst, time.perf_counter() - start)
+    reads += 1
+print(reads, errors, worst)
+'''
+
+
+def populate(count):
+    ips = [f"10.{index // 65536}.{index // 256 % 256}.{index % 256}" for index in range(count)]
+    tokens = credentials.encrypt_many(ips)
+    usernames = credentials.encrypt_many(['admin'] * count)
+    passwords = credentials.encrypt_many(['secret'] * count)
+    camera_db.executemany(
+        'INSERT INTO cameras (ip, username, password, ptz, ip_bidx, username_bidx) VALUES (?, ?, ?, 0, ?, ?)',
+        [(tokens[i], usernames[i], passwords[i], blind_index('ip', ips[i]), blind_index('username', 'admin'))
+         for i in range(count)])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    db = os.path.join(_directory, 'rotation.db')
+    stop = os.path.join(_directory, 'stop')
+    camera_db.configure(db)
+    camera_manager.init_db()
+    populate(count)
+    version = change_feed.current_version()
+
+    key_rotation.add_key()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    reader = subprocess.Popen([sys.executable, '-c', READER.format(root=root, db=db, stop=stop)],
+                              stdout=subprocess.PIPE, text=True)
+    time.sleep(1)
+    start = time.perf_counter()
+    status = key_rotation.rotate()
+    seconds = time.perf_counter() - start
+    open(stop, 'w').close()
+    reads, errors, worst = reader.communicate()[0].split()
+
+    start = time.perf_counter()
+    key_rotation.retire()
+    retire_seconds = time.perf_counter() - start
+
+    print(f"{count} cameras, batches of {key_rotation.BATCH_SIZE}")
+    print(f"rotation:        {seconds:8.1f} s ({status['rotated'] / seconds:.0f} rows/s)")
+    print(f"retire (verify): {retire_seconds:8.1f} s")
+    print(f"reader meanwhile: {reads} lookups, {errors} errors, worst {float(worst) * 1000:.1f} ms")
+    print(f"change log entries written: {change_feed.current_version() - version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Cost of the motion detector per analyzed frame at several tap resolutions.
+
+Usage: python benchmarks/bench_motion.py [--frames 500] [--fps 5]
+
+Frames are synthetic (noise + a moving block); libVLC decoding/scaling is not included.
+The last column estimates how many streams one core can analyze at --fps.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_tap import MotionDetector, build_mask
+
+RESOLUTIONS = [(160, 90), (320, 180), (640, 360), (1280, 720)]
+
+
+def make_frames(width, height, count=16):
+    rng = np.random.default_rng(0)
+    frames = []
+    for index in range(count):
+        frame = rng.integers(0, 16, (height, width), dtype=np.uint8)
+        x = index * width // count
+        frame[height // 4:height // 2, x:x + width // 8] = 220
+        frames.append(frame)
+    return frames
+
+
+def run(width, height, frames_count, masked):
+    regions = [(0.0, 0.0, 0.5, 1.0)] if masked else None
+    detector = MotionDetector(width, height, mask=build_mask(width, height, regions))
+    frames = make_frames(width, height)
+    detector.process(frames[0], 0.0)
+    start = time.perf_counter()
+    for index in range(frames_count):
+        detector.process(frames[index % len(frames)], index * 0.2)
+    return (time.perf_counter() - start) * 1000 / frames_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--fps', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'resolution':>12}{'ms/frame':>10}{'masked':>10}{'streams/core':>14}")
+    for width, height in RESOLUTIONS:
+        full = run(width, height, args.frames, False)
+        masked = run(width, height, args.frames, True)
+        print(f"{f'{width}x{height}':>12}{full:10.3f}{masked:10.3f}{1000 / (full * args.fps):14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Startup-time benchmark of ONVIF clients against a local mock endpoint:
+stock ONVIFCamera (as before) vs onvif_client.create_camera.
+
+Each launch = device + media + ptz + imaging services, GetProfiles and GetStreamUri.
+
+Parsed WSDL documents are only cached in memory, so a second table launches each camera
+in a new Python process, as a player or PTZ window does: without preload (the parsing is
+paid again every time) and after onvif_client.preload() (a pre-warmed launcher worker,
+where the timer starts once the worker is ready).
+
+Usage: python benchmarks/bench_onvif_startup.py [launches]
+"""
+import os
+import sys
+import time
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from onvif import ONVIFCamera
+import onvif_client
+from mock_onvif import MockOnvifServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lancement dans un processus neuf : imports faits, chronomètre démarré après `setup`
+CHILD = '''
+import sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {benchmarks!r})
+from onvif import ONVIFCamera
+import onvif_client
+from bench_onvif_startup import launch
+{setup}
+start = time.perf_counter()
+launch({factory})
+print((time.perf_counter() - start) * 1000)
+'''
+
+
+def launch(camera):
+    media_service = camera.create_media_service()
+    camera.create_ptz_service()
+    camera.create_imaging_service()
+    profile = media_service.GetProfiles()[0]
+    return media_service.GetStreamUri({
+        'StreamSetup': {'Stream': 'RTP-Unicast', 'Transport': 'RTSP'},
+        'ProfileToken': profile.token
+    }).Uri
+
+
+def run(label, factory, launches):
+    timings = []
+    for _ in range(launches):
+        start = time.perf_counter()
+        launch(factory())
+        timings.append((time.perf_counter() - start) * 1000)
+    warm = timings[1:] or timings
+    print(f"{label:28}{timings[0]:10.1f}{sum(warm) / len(warm):10.1f}")
+
+
+def run_process(label, factory, launches, port, setup=''):
+    script = CHILD.format(root=ROOT, benchmarks=os.path.join(ROOT, 'benchmarks'), setup=setup,
+                          factory=factory.format(port=port))
+    timings = [float(subprocess.run([sys.executable, '-c', script], check=True,
+                                    capture_output=True, text=True).stdout)
+               for _ in range(launches)]
+    print(f"{label:28}{min(timings):10.1f}{sum(timings) / len(timings):10.1f}")
+
+
+def main():
+    launches = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    server = MockOnvifServer().start()
+    try:
+        print(f"{launches} launches against 127.0.0.1:{server.port}")
+        print(f"{'':28}{'1st (ms)':>10}{'next (ms)':>10}")
+        run('ONVIFCamera (stock)',
+            lambda: ONVIFCamera('127.0.0.1', server.port, 'admin', 'admin'), launches)
+        run('onvif_client.create_camera',
+            lambda: onvif_client.create_camera('127.0.0.1', 'admin', 'admin', server.port), launches)
+
+        processes = max(1, min(launches, 5))
+        print(f"\n{processes} launches, each in a new process")
+        print(f"{'':28}{'min (ms)':>10}{'mean (ms)':>10}")
+        run_process('ONVIFCamera (stock)', "ONVIFCamera('127.0.0.1', {port}, 'admin', 'admin')",
+                    processes, server.port)
+        run_process('create_camera, no preload',
+                    "onvif_client.create_camera('127.0.0.1', 'admin', 'admin', {port})",
+                    processes, server.port)
+        run_process('create_camera, pre-warmed',
+                    "onvif_client.create_camera('127.0.0.1', 'admin', 'admin', {port})",
+                    processes, server.port, setup='onvif_client.preload()')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
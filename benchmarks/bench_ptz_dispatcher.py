@@ -0,0 +1,112 @@
+"""
+PTZ commands under OS key repeat, against a local mock endpoint with network latency:
+synchronous SOAP calls in the key handlers (as before) vs PTZDispatcher.
+
+Load: an arrow key held while M auto-repeats (a new ContinuousMove speed at every repeat,
+then a direction change), then the key is released (Stop). Reported: requests sent, time
+spent in the key handlers (Tk loop blocked) and delay between the release and the Stop
+acknowledged by the camera.
+
+Usage: python benchmarks/bench_ptz_dispatcher.py [latency_ms] [repeat_hz] [seconds]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import onvif_client
+from ptz_dispatcher import PTZDispatcher
+from mock_onvif import MockOnvifServer
+
+
+def key_events(repeat_hz, seconds):
+    """[(instant, 'move' | 'stop', vitesse)] : vitesse changée à chaque répétition, puis arrêt"""
+    events = []
+    period = 1.0 / repeat_hz
+    count = int(seconds * repeat_hz)
+    for index in range(count):
+        speed = round(0.1 + 0.9 * index / count, 3)
+        events.append((index * period, 'move', speed if index < count // 2 else -speed))
+    events.append((count * period, 'stop', None))
+    return events
+
+
+def make_commands(ptz_service, log):
+    PTZSpeed = ptz_service.zeep_client.wsdl.types.get_type('{http://www.onvif.org/ver10/schema}PTZSpeed')
+    Vector2D = ptz_service.zeep_client.wsdl.types.get_type('{http://www.onvif.org/ver10/schema}Vector2D')
+    Vector1D = ptz_service.zeep_client.wsdl.types.get_type('{http://www.onvif.org/ver10/schema}Vector1D')
+
+    def move(pan):
+        request = ptz_service.create_type('ContinuousMove')
+        request.ProfileToken = 'Profile_1'
+        request.Velocity = PTZSpeed()
+        request.Velocity.PanTilt = Vector2D(x=pan, y=0)
+        request.Velocity.Zoom = Vector1D(x=0)
+        ptz_service.ContinuousMove(request)
+        log.append(('move', pan, time.perf_counter()))
+
+    def stop():
+        ptz_service.Stop({'ProfileToken': 'Profile_1'})
+        log.append(('stop', None, time.perf_counter()))
+
+    return move, stop
+
+
+def run(label, events, move, stop, log, dispatcher=None):
+    """Rejoue les événements à leur instant ; renvoie le temps passé dans les gestionnaires"""
+    log.clear()
+    handler_times = []
+    start = time.perf_counter()
+    for instant, kind, pan in events:
+        delay = start + instant - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        # Sans dispatcher, un événement en retard attend la fin du précédent (boucle Tk bloquée)
+        handled = time.perf_counter()
+        if dispatcher is None:
+            move(pan) if kind == 'move' else stop()
+        elif kind == 'move':
+            dispatcher.submit('move', lambda pan=pan: move(pan))
+        else:
+            dispatcher.submit('move', stop, ordered=True)
+        handler_times.append(time.perf_counter() - handled)
+    if dispatcher is not None:
+        dispatcher.wait_idle()
+    final = log[-1]
+    assert final[0] == 'stop', 'last command sent is not Stop'
+    # Les mouvements envoyés suivent l'ordre des touches : aucun ancien après un récent
+    submitted = [pan for _, kind, pan in events if kind == 'move']
+    positions = [submitted.index(pan) for kind, pan, _ in log if kind == 'move']
+    assert positions == sorted(positions), 'stale move sent after a newer one'
+    print(f"{label:24}{len(log):>9}{max(handler_times) * 1000:>11.2f}"
+          f"{sum(handler_times) * 1000:>11.0f}{(final[2] - start - events[-1][0]) * 1000:>13.1f}")
+
+
+def main():
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+    repeat_hz = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 2
+    server = MockOnvifServer(latency=latency).start()
+    try:
+        camera = onvif_client.create_camera('127.0.0.1', 'admin', 'admin', server.port)
+        ptz_service = camera.create_ptz_service()
+        log = []
+        move, stop = make_commands(ptz_service, log)
+        stop()
+        events = key_events(repeat_hz, seconds)
+        print(f"{len(events)} key events in {seconds:.0f}s ({repeat_hz:.0f} Hz repeat), "
+              f"{latency * 1000:.0f} ms per SOAP call")
+        print(f"{'':24}{'requests':>9}{'max UI ms':>11}{'UI ms':>11}{'stop lag ms':>13}")
+        run('synchronous handlers', events, move, stop, log)
+        dispatcher = PTZDispatcher().start()
+        try:
+            run('PTZDispatcher', events, move, stop, log, dispatcher)
+        finally:
+            dispatcher.close()
+        print(f"coalesced: {dispatcher.coalesced} command(s)")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
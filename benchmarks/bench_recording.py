@@ -0,0 +1,68 @@
+"""
+Recording throughput: N cameras stream-copied to segments by one Recorder process.
+
+Usage: python benchmarks/bench_recording.py SOURCE [--cameras 1,8,32] [--duration 30] [--segment 5]
+
+SOURCE is a local RTSP endpoint (e.g. a file served by `vlc file.mp4 --sout
+'#rtp{sdp=rtsp://:8554/bench}' --sout-keep`) or any URI libVLC can open.
+Reports process CPU, bytes written per second and indexed segments.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import migrations
+import recorder
+
+
+def disk_usage(root):
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith('.ts'):
+                total += os.path.getsize(os.path.join(directory, name))
+    return total
+
+
+def run(source, count, duration, segment):
+    workdir = tempfile.mkdtemp(prefix='bench_recording_')
+    camera_db.configure(os.path.join(workdir, 'bench.db'))
+    migrations.reset_current()
+    rec = recorder.Recorder(os.path.join(workdir, 'rec'), segment_seconds=segment)
+    try:
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        for index in range(count):
+            rec.add(f"bench{index}", source)
+        time.sleep(duration)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        written = disk_usage(rec.root)
+        rec.shutdown()
+        segments = camera_db.query_one('SELECT COUNT(*) FROM recording_segments')[0]
+        return cpu / wall * 100, written / wall / (1024 * 1024), segments
+    finally:
+        camera_db.close_connection()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source')
+    parser.add_argument('--cameras', default='1,8,32')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--segment', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'N':>3}{'CPU (%)':>10}{'CPU/cam (%)':>13}{'MB/s':>10}{'segments':>10}")
+    for count in (int(c) for c in args.cameras.split(',')):
+        cpu, throughput, segments = run(args.source, count, args.duration, args.segment)
+        print(f"{count:3}{cpu:10.1f}{cpu / count:13.2f}{throughput:10.2f}{segments:10}")
+
+
+if __name__ == '__main__':
+    main()
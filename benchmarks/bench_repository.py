@@ -0,0 +1,68 @@
+"""
+Listing N cameras: old get_cameras() 5-tuples (every row decrypted one by one, password
+token kept) vs camera_repository Camera objects (__slots__, projection without password).
+
+Usage: python benchmarks/bench_repository.py [cameras]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_db
+import camera_manager
+import camera_repository
+from camera_crypto import credentials, blind_index
+
+
+def populate(count):
+    ips = [f"10.{index // 65536}.{index // 256 % 256}.{index % 256}" for index in range(count)]
+    tokens = credentials.encrypt_many(ips)
+    usernames = credentials.encrypt_many(['admin'] * count)
+    passwords = credentials.encrypt_many(['secret'] * count)
+    camera_db.executemany(
+        'INSERT INTO cameras (ip, username, password, ptz, ip_bidx, username_bidx) VALUES (?, ?, ?, 0, ?, ?)',
+        [(tokens[i], usernames[i], passwords[i], blind_index('ip', ips[i]), blind_index('username', 'admin'))
+         for i in range(count)])
+
+
+def old_get_cameras():
+    # Ancien code du viewer et du manager
+    rows = camera_db.query('SELECT id, ip, username, password, ptz FROM cameras')
+    return [(row[0], credentials.decrypt(row[1]), credentials.decrypt(row[2]),
+             row[3].encode() if isinstance(row[3], str) else row[3], row[4]) for row in rows]
+
+
+def measure(function):
+    credentials.clear_cache()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, retained, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    camera_db.configure(os.path.join(tempfile.mkdtemp(prefix='bench_repository_'), 'repository.db'))
+    camera_manager.init_db()
+    populate(count)
+
+    print(f"{count} cameras{'':14}{'ms':>8}{'retained KB':>14}{'peak KB':>10}")
+    _, seconds, retained, peak = measure(old_get_cameras)
+    print(f"{'old 5-tuples':27}{seconds * 1000:8.0f}{retained / 1024:14.0f}{peak / 1024:10.0f}")
+    cameras, seconds, retained, peak = measure(camera_repository.get_cameras)
+    print(f"{'Camera objects':27}{seconds * 1000:8.0f}{retained / 1024:14.0f}{peak / 1024:10.0f}")
+    print(f"passwords read or decrypted by the listing: "
+          f"{sum(camera.password_loaded for camera in cameras)}")
+    start = time.perf_counter()
+    assert cameras[count // 2].password == 'secret'
+    print(f"first password access (query + decrypt): {(time.perf_counter() - start) * 1e6:.0f} us")
+
+
+if __name__ == '__main__':
+    main()
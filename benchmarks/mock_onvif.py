@@ -0,0 +1,288 @@
+"""
+Minimal local ONVIF endpoint for benchmarks: answers the SOAP calls the app makes
+(GetCapabilities, GetProfiles, GetStreamUri, GetSystemDateAndTime, ...) with canned responses.
+
+    server = MockOnvifServer().start()
+    ... ONVIFCamera('127.0.0.1', server.port, 'admin', 'admin') ...
+    server.stop()
+
+MockDiscoveryResponder answers WS-Discovery probes (UDP) with one ProbeMatch per XAddr.
+MockRtspServer answers RTSP OPTIONS (health checks).
+"""
+import re
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENVELOPE = ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" '
+            'xmlns:tds="http://www.onvif.org/ver10/device/wsdl" '
+            'xmlns:trt="http://www.onvif.org/ver10/media/wsdl" '
+            'xmlns:tptz="http://www.onvif.org/ver20/ptz/wsdl" '
+            'xmlns:timg="http://www.onvif.org/ver20/imaging/wsdl" '
+            'xmlns:tt="http://www.onvif.org/ver10/schema">'
+            '<s:Body>{body}</s:Body></s:Envelope>')
+
+PROFILES = [
+    # token, largeur, hauteur, débit (kbps)
+    ('Profile_1', 2560, 1440, 6144),
+    ('Profile_2', 640, 360, 512),
+]
+
+
+def _capabilities(base):
+    return ('<tds:GetCapabilitiesResponse><tds:Capabilities>'
+            f'<tt:Device><tt:XAddr>{base}/onvif/device_service</tt:XAddr></tt:Device>'
+            f'<tt:Imaging><tt:XAddr>{base}/onvif/imaging</tt:XAddr></tt:Imaging>'
+            f'<tt:Media><tt:XAddr>{base}/onvif/media</tt:XAddr>'
+            '<tt:StreamingCapabilities><tt:RTPMulticast>false</tt:RTPMulticast>'
+            '<tt:RTP_TCP>true</tt:RTP_TCP><tt:RTP_RTSP_TCP>true</tt:RTP_RTSP_TCP>'
+            '</tt:StreamingCapabilities></tt:Media>'
+            f'<tt:PTZ><tt:XAddr>{base}/onvif/ptz</tt:XAddr></tt:PTZ>'
+            '</tds:Capabilities></tds:GetCapabilitiesResponse>')
+
+
+def _profiles():
+    items = []
+    for token, width, height, bitrate in PROFILES:
+        items.append(
+            f'<trt:Profiles token="{token}" fixed="true"><tt:Name>{token}</tt:Name>'
+            '<tt:VideoSourceConfiguration token="VideoSourceConfig_1"><tt:Name>VSC</tt:Name>'
+            '<tt:UseCount>2</tt:UseCount><tt:SourceToken>VideoSource_1</tt:SourceToken>'
+            f'<tt:Bounds x="0" y="0" width="{PROFILES[0][1]}" height="{PROFILES[0][2]}"/>'
+            '</tt:VideoSourceConfiguration>'
+            f'<tt:VideoEncoderConfiguration token="VEC_{token}"><tt:Name>VEC</tt:Name>'
+            '<tt:UseCount>1</tt:UseCount><tt:Encoding>H264</tt:Encoding>'
+            f'<tt:Resolution><tt:Width>{width}</tt:Width><tt:Height>{height}</tt:Height></tt:Resolution>'
+            '<tt:Quality>3</tt:Quality><tt:RateControl><tt:FrameRateLimit>25</tt:FrameRateLimit>'
+            f'<tt:EncodingInterval>1</tt:EncodingInterval><tt:BitrateLimit>{bitrate}</tt:BitrateLimit>'
+            '</tt:RateControl></tt:VideoEncoderConfiguration>'
+            '<tt:PTZConfiguration token="PTZ_1"><tt:Name>PTZ</tt:Name><tt:UseCount>2</tt:UseCount>'
+            '<tt:NodeToken>PTZNode_1</tt:NodeToken></tt:PTZConfiguration>'
+            '</trt:Profiles>')
+    return '<trt:GetProfilesResponse>' + ''.join(items) + '</trt:GetProfilesResponse>'
+
+
+def _stream_uri(host, token):
+    tokens = [profile[0] for profile in PROFILES]
+    channel = 101 + (tokens.index(token) if token in tokens else 0)
+    return ('<trt:GetStreamUriResponse><trt:MediaUri>'
+            f'<tt:Uri>rtsp://{host}:554/Streaming/Channels/{channel}</tt:Uri>'
+            '<tt:InvalidAfterConnect>false</tt:InvalidAfterConnect>'
+            '<tt:InvalidAfterReboot>false</tt:InvalidAfterReboot>'
+            '<tt:Timeout>PT0S</tt:Timeout></trt:MediaUri></trt:GetStreamUriResponse>')
+
+
+def _snapshot_uri(base):
+    return ('<trt:GetSnapshotUriResponse><trt:MediaUri>'
+            f'<tt:Uri>{base}/snapshot.jpg</tt:Uri>'
+            '<tt:InvalidAfterConnect>false</tt:InvalidAfterConnect>'
+            '<tt:InvalidAfterReboot>false</tt:InvalidAfterReboot>'
+            '<tt:Timeout>PT0S</tt:Timeout></trt:MediaUri></trt:GetSnapshotUriResponse>')
+
+
+def _date_time():
+    now = time.gmtime()
+    return ('<tds:GetSystemDateAndTimeResponse><tds:SystemDateAndTime>'
+            '<tt:DateTimeType>NTP</tt:DateTimeType><tt:DaylightSavings>false</tt:DaylightSavings>'
+            '<tt:UTCDateTime>'
+            f'<tt:Time><tt:Hour>{now.tm_hour}</tt:Hour><tt:Minute>{now.tm_min}</tt:Minute>'
+            f'<tt:Second>{now.tm_sec}</tt:Second></tt:Time>'
+            f'<tt:Date><tt:Year>{now.tm_year}</tt:Year><tt:Month>{now.tm_mon}</tt:Month>'
+            f'<tt:Day>{now.tm_mday}</tt:Day></tt:Date>'
+            '</tt:UTCDateTime></tds:SystemDateAndTime></tds:GetSystemDateAndTimeResponse>')
+
+
+def _device_information():
+    return ('<tds:GetDeviceInformationResponse><tds:Manufacturer>Mock</tds:Manufacturer>'
+            '<tds:Model>MockCam</tds:Model><tds:FirmwareVersion>1.0</tds:FirmwareVersion>'
+            '<tds:SerialNumber>0001</tds:SerialNumber><tds:HardwareId>1</tds:HardwareId>'
+            '</tds:GetDeviceInformationResponse>')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Sans TCP_NODELAY, en-têtes et corps envoyés séparément déclenchent le delayed-ACK (~40 ms)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type='application/soap+xml; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/snapshot.jpg'):
+            self._reply(200, self.server.snapshot, 'image/jpeg')
+        else:
+            self._reply(404, b'')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = self.rfile.read(length).decode(errors='replace')
+        self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        # Nom de l'opération = premier élément du Body
+        match = re.search(r'<(?:[\w-]+:)?Body[^>]*>\s*<(?:[\w-]+:)?(\w+)', request)
+        operation = match.group(1) if match else ''
+        host = self.headers.get('Host', '127.0.0.1').split(':')[0]
+        base = f'http://{self.headers.get("Host", "127.0.0.1")}'
+
+        if operation == 'GetCapabilities':
+            body = _capabilities(base)
+        elif operation == 'GetProfiles':
+            body = _profiles()
+        elif operation == 'GetStreamUri':
+            token = re.search(r'ProfileToken>([^<]+)<', request)
+            body = _stream_uri(host, token.group(1) if token else '')
+        elif operation == 'GetSnapshotUri':
+            body = _snapshot_uri(base)
+        elif operation == 'GetSystemDateAndTime':
+            body = _date_time()
+        elif operation == 'GetDeviceInformation':
+            body = _device_information()
+        elif operation in ('ContinuousMove', 'Stop', 'Move', 'GotoPreset'):
+            prefix = 'timg' if '/imaging' in self.path else 'tptz'
+            body = f'<{prefix}:{operation}Response/>'
+        else:
+            self._reply(400, ENVELOPE.format(body='').encode())
+            return
+        self._reply(200, ENVELOPE.format(body=body).encode())
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Des centaines de connexions simultanées (scan de santé) : file d'attente plus longue
+    request_queue_size = 1024
+
+
+class MockOnvifServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, snapshot=b''):
+        self.httpd = _HTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.requests = 0
+        self.httpd.latency = latency
+        self.httpd.snapshot = snapshot
+        self.host = host
+        self.port = self.httpd.server_address[1]
+        self._thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+PROBE_MATCH = ('<?xml version="1.0" encoding="UTF-8"?>'
+               '<e:Envelope xmlns:e="http://www.w3.org/2003/05/soap-envelope" '
+               'xmlns:w="http://schemas.xmlsoap.org/ws/2004/08/addressing" '
+               'xmlns:d="http://schemas.xmlsoap.org/ws/2005/04/discovery" '
+               'xmlns:dn="http://www.onvif.org/ver10/network/wsdl">'
+               '<e:Header><w:MessageID>uuid:mock-{index}</w:MessageID>'
+               '<w:RelatesTo>{relates_to}</w:RelatesTo>'
+               '<w:Action>http://schemas.xmlsoap.org/ws/2005/04/discovery/ProbeMatches</w:Action>'
+               '</e:Header><e:Body><d:ProbeMatches><d:ProbeMatch>'
+               '<w:EndpointReference><w:Address>urn:uuid:mock-device-{index}</w:Address></w:EndpointReference>'
+               '<d:Types>dn:NetworkVideoTransmitter</d:Types>'
+               '<d:Scopes>onvif://www.onvif.org/type/video_encoder onvif://www.onvif.org/name/MockCam</d:Scopes>'
+               '<d:XAddrs>{xaddr}</d:XAddrs><d:MetadataVersion>1</d:MetadataVersion>'
+               '</d:ProbeMatch></d:ProbeMatches></e:Body></e:Envelope>')
+
+
+class MockDiscoveryResponder:
+    def __init__(self, xaddrs, host='127.0.0.1', port=0):
+        self.xaddrs = list(xaddrs)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.probes = 0
+        self._running = False
+        self._thread = None
+
+    def _serve(self):
+        while self._running:
+            try:
+                data, sender = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            message = data.decode(errors='replace')
+            if 'Probe' not in message:
+                continue
+            self.probes += 1
+            match = re.search(r'MessageID>([^<]+)<', message)
+            relates_to = match.group(1) if match else ''
+            # Chaque caméra répond séparément
+            for index, xaddr in enumerate(self.xaddrs):
+                self.sock.sendto(PROBE_MATCH.format(index=index, relates_to=relates_to,
+                                                    xaddr=xaddr).encode(), sender)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self.sock.close()
+
+
+class _RtspHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'\r\n', b'\n'):
+                break
+            request.append(line)
+        self.server.requests += 1
+        cseq = next((l.split(b':', 1)[1].strip() for l in request if l.lower().startswith(b'cseq')), b'1')
+        self.wfile.write(b'RTSP/1.0 200 OK\r\nCSeq: ' + cseq +
+                         b'\r\nPublic: OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN\r\n\r\n')
+
+
+class _RtspServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+class MockRtspServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = _RtspServer((host, port), _RtspHandler)
+        self.server.requests = 0
+        self.port = self.server.server_address[1]
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
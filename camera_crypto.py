@@ -0,0 +1,230 @@
+import os
+import re
+import hmac
+import json
+import base64
+import hashlib
+import binascii
+import ipaddress
+import threading
+from collections import OrderedDict
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+
+# Original built-in key: used until a keyring file exists (databases created before the
+# keyring are encrypted with it), then kept in the keyring until it is retired
+ENCRYPTION_KEY = b'g4ZltE3Vv2Xzq5y6Lq3l4f8Ozt2Ck2Tk6v5b0rN2ghE='
+
+# Keyring: active Fernet keys (first = used to encrypt) and the blind index key
+KEYRING_FILE = os.environ.get('CAMERA_KEYRING',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'camera_keys.json'))
+
+# Bytes kept from the HMAC (128 bits: no practical collisions, smaller index)
+BLIND_INDEX_SIZE = 16
+
+# Max number of decrypted values kept in memory
+DEFAULT_CACHE_SIZE = 4096
+
+# Layout of a Fernet token: version(1) | timestamp(8) | iv(16) | ciphertext(16*n) | hmac(32)
+_FERNET_VERSION = 0x80
+_FERNET_OVERHEAD = 1 + 8 + 16 + 32
+_TOKEN_RE = re.compile(rb'^[A-Za-z0-9_-]+={0,2}$')
+
+
+def _legacy_blind_index_key():
+    # Derived from the built-in key; stored in the keyring so key rotation never changes it
+    return hmac.new(base64.urlsafe_b64decode(ENCRYPTION_KEY), b'camera blind index v1',
+                    hashlib.sha256).digest()
+
+
+def key_id(key):
+    """Short fingerprint of a key (safe to log or store)"""
+    return hashlib.sha256(key).hexdigest()[:16]
+
+
+def load_keyring(path=None):
+    """{'keys': [active keys, newest first], 'blind_index_key': bytes}"""
+    path = path or KEYRING_FILE
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {'keys': [ENCRYPTION_KEY], 'blind_index_key': _legacy_blind_index_key()}
+    keys = [key.encode() for key in data['keys']]
+    if not keys:
+        raise ValueError(f"no active key in {path}")
+    return {'keys': keys, 'blind_index_key': base64.urlsafe_b64decode(data['blind_index_key'])}
+
+
+def save_keyring(keyring, path=None):
+    """Atomic write, readable by the owner only"""
+    path = path or KEYRING_FILE
+    temporary = f"{path}.tmp"
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'keys': [key.decode() for key in keyring['keys']],
+                   'blind_index_key': base64.urlsafe_b64encode(keyring['blind_index_key']).decode()},
+                  f, indent=2)
+    os.replace(temporary, path)
+
+
+_keyring = load_keyring()
+
+# Blind index key: separate from the encryption keys, stable across rotations
+BLIND_INDEX_KEY = _keyring['blind_index_key']
+
+
+def looks_encrypted(data):
+    """
+    Structural check for a Fernet token (no decryption, no exception flow).
+    Anything that fails it is legacy plaintext stored before encryption was added.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if not isinstance(data, bytes) or len(data) % 4 or not _TOKEN_RE.match(data):
+        return False
+    try:
+        raw = base64.urlsafe_b64decode(data)
+    except (binascii.Error, ValueError):
+        return False
+    return (len(raw) >= _FERNET_OVERHEAD + 16
+            and raw[0] == _FERNET_VERSION
+            and (len(raw) - _FERNET_OVERHEAD) % 16 == 0)
+
+
+def normalize_host(value):
+    """Canonical form of an IP address or host name (what the blind index is computed on)"""
+    value = str(value).strip()
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return value.lower().rstrip('.')
+
+
+def blind_index(field, value, key=None):
+    """
+    Keyed HMAC of a plaintext value: equal values give equal indexes, so the column can be
+    searched and indexed in SQL while the value itself stays Fernet-encrypted.
+    The field name separates the domains (same text as ip and as username differ).
+    """
+    if value is None:
+        return None
+    if field == 'ip':
+        value = normalize_host(value)
+    message = f"{field}:{value}".encode()
+    return hmac.new(key or BLIND_INDEX_KEY, message, hashlib.sha256).digest()[:BLIND_INDEX_SIZE]
+
+
+class CredentialCipher:
+    """
+    Fernet wrapper that decrypts each token once and keeps a bounded LRU of plaintexts.
+    Tokens from any active key decrypt (MultiFernet); new ones use the first key. With a
+    keyring path, the keys are reloaded when the file changes (rotation in another process).
+    """
+
+    def __init__(self, keys, cache_size=DEFAULT_CACHE_SIZE, keyring_path=None):
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._keyring_path = keyring_path
+        self._keyring_mtime = self._mtime()
+        self.hits = 0
+        self.misses = 0
+        self.set_keys([keys] if isinstance(keys, (bytes, str)) else keys)
+
+    def set_keys(self, keys):
+        """Active keys, newest first; cached plaintexts are dropped (a key may be gone)"""
+        keys = [key.encode() if isinstance(key, str) else key for key in keys]
+        with self._lock:
+            self.keys = keys
+            self.key = keys[0]
+            self._fernet = MultiFernet([Fernet(key) for key in keys])
+            self._cache.clear()
+
+    def _mtime(self):
+        if self._keyring_path is None:
+            return None
+        try:
+            return os.stat(self._keyring_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self):
+        """Reload the keyring file if it changed; True when the keys were replaced"""
+        mtime = self._mtime()
+        if mtime is None or mtime == self._keyring_mtime:
+            return False
+        keys = load_keyring(self._keyring_path)['keys']
+        self._keyring_mtime = mtime
+        if keys == self.keys:
+            return False
+        self.set_keys(keys)
+        return True
+
+    def encrypt(self, data):
+        self.reload()
+        return self._fernet.encrypt(str(data).encode())
+
+    def encrypt_many(self, values):
+        self.reload()
+        return [self._fernet.encrypt(str(value).encode()) for value in values]
+
+    def rotate(self, data):
+        """Re-encrypt a token with the first key (legacy plaintext is encrypted)"""
+        if isinstance(data, str):
+            data = data.encode()
+        if not looks_encrypted(data):
+            return self._fernet.encrypt(data)
+        return self._fernet.rotate(data)
+
+    def _decrypt(self, data):
+        if looks_encrypted(data):
+            try:
+                return self._fernet.decrypt(data).decode()
+            except InvalidToken:
+                # Clé ajoutée par un autre processus : relire le trousseau une fois
+                if self.reload():
+                    return self._decrypt(data)
+                # Token chiffré avec une clé inconnue : renvoyé tel quel, comme avant
+        return data.decode(errors='replace')
+
+    def decrypt(self, data):
+        """Return the plaintext as str, whether data is a token or legacy plaintext"""
+        if data is None:
+            return None
+        if isinstance(data, str):
+            data = data.encode()
+
+        with self._lock:
+            plaintext = self._cache.get(data)
+            if plaintext is not None:
+                self._cache.move_to_end(data)
+                self.hits += 1
+                return plaintext
+            self.misses += 1
+
+        plaintext = self._decrypt(data)
+
+        with self._lock:
+            self._cache[data] = plaintext
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return plaintext
+
+    def decrypt_many(self, values):
+        """Bulk decryption (export): bypasses the LRU so one pass does not flush it"""
+        return [None if data is None else self._decrypt(data.encode() if isinstance(data, str) else data)
+                for data in values]
+
+    def evict(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        with self._lock:
+            self._cache.pop(data, None)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared instance for the process
+credentials = CredentialCipher(_keyring['keys'], keyring_path=KEYRING_FILE)
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+import atexit
+from contextlib import contextmanager
+
+# Database file (shared by the viewer, the manager and the player processes)
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'camera_credentials.db')
+
+# How long a writer waits for another process' lock before giving up (ms)
+BUSY_TIMEOUT_MS = 5000
+
+# Number of compiled statements kept by sqlite3 for the connection
+STATEMENT_CACHE_SIZE = 256
+
+_connection = None
+_connection_pid = None
+_db_file = DB_FILE
+_lock = threading.RLock()
+
+
+def configure(db_file):
+    """Point the process-wide connection at another database file"""
+    global _db_file
+    with _lock:
+        close_connection()
+        _db_file = db_file
+
+
+def _open_connection(db_file):
+    # isolation_level=None: pas de BEGIN implicite, les transactions sont explicites
+    conn = sqlite3.connect(db_file,
+                           timeout=BUSY_TIMEOUT_MS / 1000,
+                           isolation_level=None,
+                           check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def get_connection():
+    """Return the long-lived connection of this process, opening it on first use"""
+    global _connection, _connection_pid
+    with _lock:
+        # A forked child must not reuse the parent's handle
+        if _connection is None or _connection_pid != os.getpid():
+            _connection = _open_connection(_db_file)
+            _connection_pid = os.getpid()
+        return _connection
+
+
+def close_connection():
+    global _connection, _connection_pid
+    with _lock:
+        if _connection is not None and _connection_pid == os.getpid():
+            try:
+                _connection.close()
+            except sqlite3.Error:
+                pass
+        _connection = None
+        _connection_pid = None
+
+
+atexit.register(close_connection)
+
+
+@contextmanager
+def transaction():
+    """
+    Explicit write transaction on the shared connection.
+    BEGIN IMMEDIATE takes the write lock up front, so a concurrent writer
+    waits on busy_timeout instead of failing with "database is locked".
+    """
+    with _lock:
+        conn = get_connection()
+        if conn.in_transaction:
+            # Nested call: join the outer transaction
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+
+def execute(sql, params=()):
+    """Run a single write statement in its own transaction, return lastrowid"""
+    with transaction() as conn:
+        return conn.execute(sql, params).lastrowid
+
+
+def executemany(sql, seq_of_params):
+    """Run a batch of writes in one transaction, return the number of rows changed"""
+    with transaction() as conn:
+        return conn.executemany(sql, seq_of_params).rowcount
+
+
+def query(sql, params=()):
+    """Run a read statement and return all rows"""
+    with _lock:
+        return get_connection().execute(sql, params).fetchall()
+
+
+def query_one(sql, params=()):
+    with _lock:
+        return get_connection().execute(sql, params).fetchone()
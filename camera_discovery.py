@@ -0,0 +1,173 @@
+"""
+Découverte des caméras ONVIF du réseau local (WS-Discovery), puis interrogation de chaque
+caméra en parallèle : GetDeviceInformation, GetCapabilities (PTZ) et profils média.
+"""
+import uuid
+import time
+import socket
+import select
+import argparse
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+import onvif_cache
+
+MULTICAST_ADDRESS = ('239.255.255.250', 3702)
+
+# Durée d'écoute des réponses ProbeMatch (secondes)
+DISCOVERY_TIMEOUT = 3.0
+
+# Sondes envoyées (UDP : une sonde peut se perdre)
+PROBE_REPEAT = 2
+
+# Caméras interrogées simultanément
+PROBE_WORKERS = 32
+
+PROBE = ('<?xml version="1.0" encoding="UTF-8"?>'
+         '<e:Envelope xmlns:e="http://www.w3.org/2003/05/soap-envelope" '
+         'xmlns:w="http://schemas.xmlsoap.org/ws/2004/08/addressing" '
+         'xmlns:d="http://schemas.xmlsoap.org/ws/2005/04/discovery" '
+         'xmlns:dn="http://www.onvif.org/ver10/network/wsdl">'
+         '<e:Header><w:MessageID>{message_id}</w:MessageID>'
+         '<w:To e:mustUnderstand="true">urn:schemas-xmlsoap-org:ws:2005:04:discovery</w:To>'
+         '<w:Action e:mustUnderstand="true">http://schemas.xmlsoap.org/ws/2005/04/discovery/Probe</w:Action>'
+         '</e:Header><e:Body><d:Probe><d:Types>dn:NetworkVideoTransmitter</d:Types></d:Probe>'
+         '</e:Body></e:Envelope>')
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_probe_matches(data, message_id=None):
+    """Réponses ProbeMatch d'un datagramme : liste de dicts (endpoint, xaddrs, scopes)"""
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError:
+        return []
+    relates_to = None
+    matches = []
+    for element in root.iter():
+        name = _local_name(element.tag)
+        if name == 'RelatesTo':
+            relates_to = (element.text or '').strip()
+        elif name == 'ProbeMatch':
+            match = {'endpoint': None, 'xaddrs': [], 'scopes': []}
+            for child in element.iter():
+                child_name = _local_name(child.tag)
+                if child_name == 'Address':
+                    match['endpoint'] = (child.text or '').strip()
+                elif child_name == 'XAddrs':
+                    match['xaddrs'] = (child.text or '').split()
+                elif child_name == 'Scopes':
+                    match['scopes'] = (child.text or '').split()
+            matches.append(match)
+    if message_id is not None and relates_to not in (None, message_id):
+        # Réponse à la sonde d'un autre client
+        return []
+    return matches
+
+
+def _device_from_match(match, source_ip):
+    """Adresse HTTP ONVIF à utiliser : première XAddr IPv4, sinon l'émetteur de la réponse"""
+    for xaddr in match['xaddrs']:
+        parts = urlsplit(xaddr)
+        if parts.hostname and ':' not in parts.hostname:
+            return {'host': parts.hostname, 'port': parts.port or 80, 'xaddr': xaddr,
+                    'endpoint': match['endpoint'], 'scopes': match['scopes']}
+    return {'host': source_ip, 'port': 80, 'xaddr': None,
+            'endpoint': match['endpoint'], 'scopes': match['scopes']}
+
+
+def ws_discover(timeout=DISCOVERY_TIMEOUT, address=MULTICAST_ADDRESS, repeat=PROBE_REPEAT):
+    """Envoie la sonde WS-Discovery et collecte les caméras qui répondent"""
+    message_id = f"uuid:{uuid.uuid4()}"
+    probe = PROBE.format(message_id=message_id).encode()
+    devices = {}
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as sock:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        sock.bind(('', 0))
+        for _ in range(repeat):
+            sock.sendto(probe, address)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([sock], [], [], remaining)
+            if not ready:
+                break
+            data, (source_ip, _) = sock.recvfrom(65535)
+            for match in parse_probe_matches(data, message_id):
+                device = _device_from_match(match, source_ip)
+                # Une caméra répond à chaque sonde : dédoublonnage par adresse
+                devices.setdefault((device['host'], device['port']), device)
+    return list(devices.values())
+
+
+def probe_device(device, username, password):
+    """Complète le dict de la caméra (modèle, PTZ, profils) ; 'error' si l'interrogation échoue"""
+    import onvif_client
+    from onvif.definition import SERVICES
+    try:
+        camera = onvif_client.create_camera(device['host'], username, password, device['port'])
+        info = camera.devicemgmt.GetDeviceInformation()
+        device['manufacturer'] = getattr(info, 'Manufacturer', None)
+        device['model'] = getattr(info, 'Model', None)
+        device['serial'] = getattr(info, 'SerialNumber', None)
+        # GetCapabilities est fait par le client à sa création (xaddrs des services)
+        device['ptz'] = int(SERVICES['ptz']['ns'] in camera.xaddrs)
+        device['metadata'] = onvif_cache.fetch_metadata(device['host'], username, password,
+                                                        device['port'], camera=camera)
+        device['error'] = None
+    except Exception as e:
+        device['error'] = str(e) or e.__class__.__name__
+    return device
+
+
+def discover(username, password, timeout=DISCOVERY_TIMEOUT, workers=PROBE_WORKERS,
+             address=MULTICAST_ADDRESS):
+    """WS-Discovery puis interrogation concurrente de toutes les caméras trouvées"""
+    devices = ws_discover(timeout, address)
+    if not devices:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(devices)),
+                            thread_name_prefix='onvif-probe') as executor:
+        return list(executor.map(lambda device: probe_device(device, username, password), devices))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Discover ONVIF cameras on the local network.')
+    parser.add_argument('-u', '--username', required=True)
+    parser.add_argument('-p', '--password', required=True)
+    parser.add_argument('--timeout', type=float, default=DISCOVERY_TIMEOUT)
+    parser.add_argument('--target', metavar='HOST:PORT',
+                        help='Send the probe to this address instead of the multicast group')
+    parser.add_argument('--add', action='store_true', help='Add the new cameras to the database')
+    args = parser.parse_args()
+
+    address = MULTICAST_ADDRESS
+    if args.target:
+        host, _, port = args.target.rpartition(':')
+        address = (host, int(port))
+
+    start = time.perf_counter()
+    devices = discover(args.username, args.password, args.timeout, address=address)
+    for device in devices:
+        status = device['error'] or f"{device.get('manufacturer')} {device.get('model')}"
+        print(f"{device['host']}:{device['port']:<6} ptz={device.get('ptz', '-')} {status}")
+    print(f"{len(devices)} device(s) in {time.perf_counter() - start:.2f}s")
+
+    if args.add:
+        # Pas d'interface Tk : schéma et écritures sans camera_manager
+        import migrations
+        import camera_repository
+        migrations.upgrade()
+        added = camera_repository.add_discovered_cameras(devices, args.username, args.password)
+        print(f"{len(added)} camera(s) added")
+
+
+if __name__ == '__main__':
+    main()
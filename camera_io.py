@@ -0,0 +1,316 @@
+"""
+Import / export de la table des caméras en CSV, JSON ou JSON Lines.
+
+L'import lit le fichier au fil de l'eau, valide chaque ligne, chiffre par lots (dans un
+pool de processus si demandé) et insère chaque lot par executemany dans sa propre
+transaction. Les lignes invalides sont rapportées avec leur numéro, sans arrêter l'import.
+L'export lit la table par pages (pagination sur l'id), jamais en entier.
+
+    python camera_io.py import cameras.csv
+    python camera_io.py export cameras.json --with-passwords
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+import ipaddress
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import camera_db
+import migrations
+import camera_repository
+from camera_crypto import credentials, CredentialCipher, blind_index
+
+FIELDS = ('ip', 'username', 'password', 'ptz')
+
+# Lignes par lot : chiffrement, executemany et transaction
+BATCH_SIZE = 1000
+
+# Erreurs affichées par la ligne de commande (toutes restent dans le rapport)
+MAX_PRINTED_ERRORS = 20
+
+_HOSTNAME_RE = re.compile(r'^(?=.{1,253}$)[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?'
+                          r'(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*$')
+
+_TRUE = {'1', 'true', 'yes', 'y', 'on'}
+_FALSE = {'0', 'false', 'no', 'n', 'off', ''}
+
+INSERT = ('INSERT INTO cameras (ip, username, password, ptz, ip_bidx, username_bidx) '
+          'VALUES (?, ?, ?, ?, ?, ?)')
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension == '.json':
+        return 'json'
+    raise ValueError(f"unknown file format for {path} (use .csv, .json or .jsonl)")
+
+
+# --- lecture ---------------------------------------------------------------------------
+
+def _iter_json_array(f, chunk_size=64 * 1024):
+    """Objets d'un tableau JSON lus un par un (le fichier n'est jamais chargé en entier)"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # Séparateurs entre les éléments
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != '[':
+                raise ValueError('expected a JSON array')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                item = None
+            else:
+                # Un nombre coupé en fin de tampon se décode aussi : attendre la suite
+                if end < len(buffer) or eof:
+                    yield item
+                    position = end
+                    continue
+        if eof:
+            if started:
+                raise ValueError('unterminated JSON array')
+            return
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_records(path, fmt=None):
+    """(numéro de ligne ou d'élément, dict) au fil de la lecture"""
+    fmt = fmt or detect_format(path)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            missing = {'ip', 'username'} - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f"missing CSV column(s): {', '.join(sorted(missing))}")
+            for record in reader:
+                yield reader.line_num, record
+        elif fmt == 'jsonl':
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as e:
+                        yield number, e
+        else:
+            for number, record in enumerate(_iter_json_array(f), 1):
+                yield number, record
+
+
+def parse_ptz(value):
+    if isinstance(value, bool) or isinstance(value, int):
+        return int(bool(value))
+    text = str(value if value is not None else '').strip().lower()
+    if text in _TRUE:
+        return 1
+    if text in _FALSE:
+        return 0
+    raise ValueError(f"invalid ptz value {value!r}")
+
+
+def validate(record):
+    """(ip, username, password, ptz) en clair ; ValueError si la ligne est invalide"""
+    if isinstance(record, Exception):
+        raise ValueError(f"invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError('expected an object')
+    ip = str(record.get('ip') or '').strip()
+    username = str(record.get('username') or '').strip()
+    password = record.get('password')
+    password = '' if password is None else str(password)
+    if not ip:
+        raise ValueError('missing ip')
+    try:
+        ip = str(ipaddress.ip_address(ip))
+    except ValueError:
+        if not _HOSTNAME_RE.match(ip):
+            raise ValueError(f"invalid ip or host name {ip!r}")
+    if not username:
+        raise ValueError('missing username')
+    if not password:
+        raise ValueError('missing password')
+    return ip, username, password, parse_ptz(record.get('ptz', 0))
+
+
+# --- chiffrement -------------------------------------------------------------------------
+
+_worker_cipher = None
+
+
+def _init_worker(keys):
+    global _worker_cipher
+    _worker_cipher = CredentialCipher(keys, cache_size=0)
+
+
+def _encrypt_batch(rows, cipher=None):
+    """Lot de lignes en clair -> lignes prêtes pour INSERT (dans un worker ou sur place)"""
+    cipher = cipher or _worker_cipher
+    values = cipher.encrypt_many([value for row in rows for value in row[:3]])
+    return [(values[index * 3], values[index * 3 + 1], values[index * 3 + 2]) + row[3:]
+            for index, row in enumerate(rows)]
+
+
+def _batches(path, fmt, report, known, batch_size):
+    batch = []
+    for number, record in iter_records(path, fmt):
+        report['read'] += 1
+        try:
+            row = validate(record)
+        except ValueError as e:
+            report['errors'].append((number, str(e)))
+            continue
+        ip_bidx = blind_index('ip', row[0])
+        if known is not None:
+            if ip_bidx in known:
+                report['errors'].append((number, f"duplicate ip {row[0]}"))
+                continue
+            known.add(ip_bidx)
+        batch.append(row + (ip_bidx, blind_index('username', row[1])))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(rows, report):
+    camera_db.executemany(INSERT, rows)
+    report['imported'] += len(rows)
+
+
+def import_cameras(path, fmt=None, batch_size=BATCH_SIZE, workers=0, skip_duplicates=True):
+    """
+    Importe un fichier ; renvoie {'read', 'imported', 'errors': [(ligne, message)], 'seconds'}.
+    workers > 0 : chiffrement dans un pool de processus (lots en vol bornés).
+    skip_duplicates : rejette les IP déjà en base ou déjà vues dans le fichier.
+    """
+    # Schéma seul : pas d'interface (camera_manager) pour un import en ligne de commande
+    migrations.upgrade()
+    start = time.perf_counter()
+    report = {'read': 0, 'imported': 0, 'errors': [], 'seconds': 0.0}
+    # Index aveugles existants : aucune ligne à déchiffrer pour détecter les doublons
+    known = None
+    if skip_duplicates:
+        known = {row[0] for row in camera_db.query('SELECT ip_bidx FROM cameras WHERE ip_bidx IS NOT NULL')}
+    batches = _batches(path, fmt, report, known, batch_size)
+
+    if workers <= 0:
+        cipher = CredentialCipher(credentials.keys, cache_size=0)
+        for batch in batches:
+            _insert(_encrypt_batch(batch, cipher), report)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(credentials.keys,)) as executor:
+            # Lecture, chiffrement et insertion se recouvrent ; l'ordre du fichier est gardé
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(_encrypt_batch, batch))
+                if len(pending) >= workers * 2:
+                    _insert(pending.popleft().result(), report)
+            while pending:
+                _insert(pending.popleft().result(), report)
+
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+# --- export ------------------------------------------------------------------------------
+
+def iter_cameras(batch_size=BATCH_SIZE, with_passwords=False):
+    """Caméras déchiffrées, page par page (WHERE id > dernier id) : mémoire bornée"""
+    fields = camera_repository.FIELDS if with_passwords else camera_repository.LIST_FIELDS
+    for page in camera_repository.iter_pages(batch_size, fields):
+        if with_passwords:
+            camera_repository.load_passwords(page)
+        for camera in page:
+            yield {'id': camera.id, 'ip': camera.ip, 'username': camera.username,
+                   'password': camera.password if with_passwords else '', 'ptz': camera.ptz}
+
+
+def export_cameras(path, fmt=None, batch_size=BATCH_SIZE, with_passwords=False):
+    """Écrit la table dans un fichier ; renvoie le nombre de caméras exportées"""
+    fmt = fmt or detect_format(path)
+    count = 0
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=('id',) + FIELDS)
+            writer.writeheader()
+            for camera in iter_cameras(batch_size, with_passwords):
+                writer.writerow(camera)
+                count += 1
+        else:
+            f.write('[\n' if fmt == 'json' else '')
+            for camera in iter_cameras(batch_size, with_passwords):
+                if fmt == 'json' and count:
+                    f.write(',\n')
+                f.write(json.dumps(camera))
+                f.write('\n' if fmt == 'jsonl' else '')
+                count += 1
+            f.write('\n]\n' if fmt == 'json' else '')
+    os.replace(temporary, path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import or export the camera table.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Add cameras from a CSV / JSON / JSONL file')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=('csv', 'json', 'jsonl'))
+    import_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    import_parser.add_argument('--workers', type=int, default=0,
+                               help='Encrypt in this many processes (0 = in this process)')
+    import_parser.add_argument('--allow-duplicates', action='store_true',
+                               help='Do not reject IPs that are already known')
+    export_parser = subparsers.add_parser('export', help='Write the cameras to a CSV / JSON / JSONL file')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--format', choices=('csv', 'json', 'jsonl'))
+    export_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    export_parser.add_argument('--with-passwords', action='store_true',
+                               help='Write the passwords in clear text (needed to re-import)')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        report = import_cameras(args.path, args.format, args.batch_size, args.workers,
+                                skip_duplicates=not args.allow_duplicates)
+        for number, message in report['errors'][:MAX_PRINTED_ERRORS]:
+            print(f"line {number}: {message}", file=sys.stderr)
+        if len(report['errors']) > MAX_PRINTED_ERRORS:
+            print(f"... {len(report['errors']) - MAX_PRINTED_ERRORS} more error(s)", file=sys.stderr)
+        print(f"{report['imported']} of {report['read']} camera(s) imported "
+              f"in {report['seconds']:.2f}s, {len(report['errors'])} error(s)")
+        sys.exit(1 if report['errors'] else 0)
+    else:
+        if args.with_passwords:
+            print('Warning: passwords are written in clear text', file=sys.stderr)
+        start = time.perf_counter()
+        count = export_cameras(args.path, args.format, args.batch_size, args.with_passwords)
+        print(f"{count} camera(s) exported in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+Liste de caméras virtualisée pour le viewer et le manager.
+
+Un ttk.Treeview ne dessine que les lignes visibles : une ligne par caméra, sans widget
+par ligne. Les actions (Play, PTZ, Edit...) portent sur la sélection : boutons de la
+fenêtre, double-clic / Entrée et menu contextuel. Les caméras sont lues par pages
+(camera_repository, sans les mots de passe) et déchiffrées dans un thread ; la boucle Tk insère chaque page
+dès qu'elle arrive, la fenêtre s'affiche donc tout de suite. Ensuite la liste suit le
+journal des modifications (change_feed) et n'applique que les lignes modifiées.
+"""
+import threading
+import tkinter as tk
+from tkinter import ttk
+from queue import Queue, Empty
+import camera_repository
+from change_feed import ChangeFeed
+
+# Caméras lues et déchiffrées par requête
+PAGE_SIZE = camera_repository.PAGE_SIZE
+
+# Période de la boucle Tk qui insère les pages reçues (ms)
+POLL_INTERVAL = 50
+
+# Délai après un défilement avant de signaler les lignes visibles (ms)
+VISIBLE_DELAY = 150
+
+
+class CameraList:
+    """
+    columns : [(nom, titre, largeur)] ; values(camera) -> valeurs des colonnes ;
+    tags(camera) -> tags de la ligne (couleurs). on_activate(camera) au double-clic / Entrée,
+    on_select(camera ou None) quand la sélection change, on_visible([ids]) après un défilement,
+    on_loaded() quand toutes les pages sont affichées, on_changed(upserted, deleted, previous)
+    après un diff du journal (previous : ancienne version des caméras modifiées).
+    """
+
+    def __init__(self, parent, columns, values, tags=None, on_activate=None, on_select=None,
+                 on_visible=None, on_loaded=None, menu=(), show_images=False, row_height=None,
+                 default_image=None, on_changed=None, live=True, page_size=PAGE_SIZE):
+        self.values = values
+        self.tags = tags or (lambda camera: ())
+        self.on_activate = on_activate
+        self.on_select = on_select
+        self.on_visible = on_visible
+        self.on_loaded = on_loaded
+        self.on_changed = on_changed
+        self.page_size = page_size
+        self.default_image = default_image
+        self.cameras = {}
+        self.loading = False
+        self._pages = Queue()
+        self._generation = 0
+        self._visible_job = None
+        # Diffs reçus du thread du journal, appliqués par la boucle Tk
+        self._changes = Queue()
+        self.feed = None
+        if live:
+            try:
+                self.feed = ChangeFeed(lambda upserted, deleted: self._changes.put((upserted, deleted))).start()
+            except Exception as e:
+                print(f"Change feed unavailable: {e}")
+
+        self.frame = tk.Frame(parent)
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.frame.grid_columnconfigure(0, weight=1)
+
+        style_name = 'Treeview'
+        if row_height:
+            style_name = f'Camera{row_height}.Treeview'
+            ttk.Style(parent).configure(style_name, rowheight=row_height)
+        self.tree = ttk.Treeview(self.frame, columns=[c[0] for c in columns], selectmode='browse',
+                                 show='tree headings' if show_images else 'headings',
+                                 style=style_name)
+        if show_images:
+            self.tree.column('#0', width=row_height * 16 // 9 + 20 if row_height else 60, stretch=False)
+        for name, heading, width in columns:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, stretch=True)
+        scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=lambda first, last: (scrollbar.set(first, last),
+                                                                self._schedule_visible()))
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.status = tk.Label(self.frame, text="", anchor="w")
+        self.status.grid(row=1, column=0, columnspan=2, sticky="ew")
+
+        self.tree.bind('<<TreeviewSelect>>', self._selection_changed)
+        self.tree.bind('<Double-1>', self._activate)
+        self.tree.bind('<Return>', self._activate)
+        self.tree.bind('<Configure>', lambda event: self._schedule_visible())
+
+        # Menu contextuel : [(libellé, callback(camera), condition(camera) ou None)]
+        self.menu_items = list(menu)
+        if self.menu_items:
+            self.menu = tk.Menu(self.tree, tearoff=0)
+            self.tree.bind('<Button-3>', self._show_menu)
+            self.tree.bind('<Button-2>', self._show_menu)  # macOS
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def focus(self):
+        self.tree.focus_set()
+
+    # --- chargement ----------------------------------------------------------------------
+
+    def load(self):
+        """(Re)charge toute la liste en arrière-plan ; les pages d'un ancien chargement sont ignorées"""
+        self._generation += 1
+        generation = self._generation
+        if self.feed is not None:
+            # Les modifications postérieures à ce point arriveront par le journal
+            self.feed.reset()
+        self.tree.delete(*self.tree.get_children())
+        self.cameras.clear()
+        self.loading = True
+        self.status.config(text="Loading cameras...")
+
+        def run():
+            try:
+                for page in camera_repository.iter_pages(self.page_size):
+                    if generation != self._generation:
+                        return
+                    self._pages.put((generation, page))
+            except Exception as e:
+                print(f"Camera list loading error: {e}")
+            self._pages.put((generation, None))
+        threading.Thread(target=run, name='camera-list', daemon=True).start()
+        self.tree.after(POLL_INTERVAL, self._poll_pages, generation)
+
+    def _poll_pages(self, generation):
+        if generation != self._generation:
+            return
+        try:
+            while True:
+                page_generation, page = self._pages.get_nowait()
+                if page_generation != generation:
+                    continue
+                if page is None:
+                    self.loading = False
+                    self.status.config(text=f"{len(self.cameras)} camera(s)")
+                    self._schedule_visible()
+                    if self.on_loaded is not None:
+                        self.on_loaded()
+                    if self.feed is not None:
+                        self.tree.after(POLL_INTERVAL, self._poll_changes, generation)
+                    return
+                for camera in page:
+                    self.upsert(camera)
+                self.status.config(text=f"Loading cameras... {len(self.cameras)}")
+                # Une page par tour : la boucle Tk reste libre entre deux pages
+                break
+        except Empty:
+            pass
+        self.tree.after(POLL_INTERVAL, self._poll_pages, generation)
+
+    def _poll_changes(self, generation):
+        if generation != self._generation:
+            return
+        try:
+            while True:
+                upserted, deleted = self._changes.get_nowait()
+                if upserted is None:
+                    # Journal purgé ou modification massive
+                    self.load()
+                    return
+                self.apply_changes(upserted, deleted)
+        except Empty:
+            pass
+        self.tree.after(POLL_INTERVAL, self._poll_changes, generation)
+
+    def apply_changes(self, upserted, deleted):
+        """Diff ligne à ligne : rien n'est reconstruit ni redéchiffré en dehors des lignes modifiées"""
+        previous = {camera.id: self.cameras.get(camera.id) for camera in upserted}
+        for camera_id in deleted:
+            previous[camera_id] = self.cameras.get(camera_id)
+            self.remove(camera_id)
+        for camera in upserted:
+            self.upsert(camera)
+        self.status.config(text=f"{len(self.cameras)} camera(s)")
+        # La caméra sélectionnée a pu changer ou disparaître
+        self._selection_changed()
+        if self.on_changed is not None:
+            self.on_changed(upserted, deleted, previous)
+
+    def sync(self):
+        """Après une écriture de ce processus : relire le journal sans attendre"""
+        if self.feed is not None:
+            self.feed.wake()
+        else:
+            self.load()
+
+    def stop(self):
+        if self.feed is not None:
+            self.feed.stop()
+
+    # --- lignes --------------------------------------------------------------------------
+
+    def upsert(self, camera):
+        """Ajoute ou met à jour la ligne d'une caméra (camera_repository.Camera)"""
+        iid = str(camera.id)
+        self.cameras[camera.id] = camera
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=self.values(camera), tags=self.tags(camera))
+        else:
+            options = {'image': self.default_image} if self.default_image is not None else {}
+            self.tree.insert('', tk.END, iid=iid, values=self.values(camera), tags=self.tags(camera),
+                             **options)
+
+    def remove(self, camera_id):
+        self.cameras.pop(camera_id, None)
+        if self.tree.exists(str(camera_id)):
+            self.tree.delete(str(camera_id))
+
+    def refresh(self, camera_id):
+        """Recalcule valeurs et tags d'une ligne (ex. état réseau changé)"""
+        camera = self.cameras.get(camera_id)
+        if camera is not None:
+            self.upsert(camera)
+
+    def set_image(self, camera_id, image):
+        if self.tree.exists(str(camera_id)):
+            self.tree.item(str(camera_id), image=image)
+
+    def selected(self):
+        selection = self.tree.selection()
+        return self.cameras.get(int(selection[0])) if selection else None
+
+    def visible_ids(self):
+        """Ids des lignes actuellement affichées (quelques dizaines au plus)"""
+        ids = []
+        height = self.tree.winfo_height()
+        y = 1
+        row = self.tree.identify_row(y)
+        while row and y < height:
+            ids.append(int(row))
+            bbox = self.tree.bbox(row)
+            if not bbox:
+                break
+            y = bbox[1] + bbox[3] + 1
+            row = self.tree.identify_row(y)
+        return ids
+
+    def _schedule_visible(self):
+        if self.on_visible is None:
+            return
+        if self._visible_job is not None:
+            self.tree.after_cancel(self._visible_job)
+        self._visible_job = self.tree.after(VISIBLE_DELAY, self._emit_visible)
+
+    def _emit_visible(self):
+        self._visible_job = None
+        self.on_visible(self.visible_ids())
+
+    # --- interactions ----------------------------------------------------------------------
+
+    def _selection_changed(self, event=None):
+        if self.on_select is not None:
+            self.on_select(self.selected())
+
+    def _activate(self, event=None):
+        camera = self.selected()
+        if camera is not None and self.on_activate is not None:
+            self.on_activate(camera)
+        return "break"
+
+    def _show_menu(self, event):
+        row = self.tree.identify_row(event.y)
+        if not row:
+            return
+        self.tree.selection_set(row)
+        self.tree.focus(row)
+        camera = self.cameras.get(int(row))
+        self.menu.delete(0, tk.END)
+        for label, command, condition in self.menu_items:
+            if condition is None or condition(camera):
+                self.menu.add_command(label=label, command=lambda c=command: c(camera))
+        self.menu.tk_popup(event.x_root, event.y_root)
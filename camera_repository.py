@@ -0,0 +1,224 @@
+"""
+Lecture et écriture des caméras, partagées par le viewer, le manager, la liste, le journal,
+l'export et les outils en ligne de commande (sans dépendance à l'interface Tk).
+
+Les caméras sont des objets Camera compacts (__slots__, pas de __dict__). La requête ne lit
+que les colonnes demandées ; ip et username passent par le cache LRU des identifiants (un
+rechargement de la liste ne redéchiffre que les valeurs modifiées). Le mot de passe n'est
+ni lu ni déchiffré pour un listing : Camera.password le charge au premier accès (play,
+PTZ, edit) et le garde.
+"""
+import camera_db
+import onvif_cache
+from camera_crypto import credentials, blind_index
+
+# Colonnes lisibles (l'id est toujours lu)
+FIELDS = ('ip', 'username', 'password', 'ptz')
+
+# Projection d'un listing : pas de mot de passe
+LIST_FIELDS = ('ip', 'username', 'ptz')
+
+# Caméras lues par requête (pages, WHERE id IN (...))
+PAGE_SIZE = 500
+
+
+def _token(value):
+    return value.encode() if isinstance(value, str) else value
+
+
+class Camera:
+    __slots__ = ('id', 'ip', 'username', 'ptz', '_token', '_password')
+
+    def __init__(self, id, ip=None, username=None, ptz=0, token=None):
+        self.id = id
+        self.ip = ip
+        self.username = username
+        self.ptz = ptz
+        self._token = token
+        self._password = None
+
+    @property
+    def password_loaded(self):
+        return self._token is not None
+
+    @property
+    def password_token(self):
+        """Mot de passe chiffré ; lu en base au premier besoin s'il n'a pas été projeté"""
+        if self._token is None:
+            row = camera_db.query_one('SELECT password FROM cameras WHERE id = ?', (self.id,))
+            self._token = _token(row[0]) if row is not None else None
+        return self._token
+
+    @property
+    def password(self):
+        """Mot de passe en clair, déchiffré une seule fois"""
+        if self._password is None:
+            token = self.password_token
+            if token is not None:
+                self._password = credentials.decrypt(token)
+        return self._password
+
+    def __repr__(self):
+        return f"Camera(id={self.id!r}, ip={self.ip!r}, username={self.username!r}, ptz={self.ptz!r})"
+
+
+def _columns(fields):
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"unknown camera field(s): {', '.join(sorted(unknown))}")
+    return ', '.join(('id',) + tuple(fields))
+
+
+def _build(rows, fields):
+    """Lignes (id, champs...) -> Camera ; ip et username déchiffrés via le cache LRU"""
+    columns = {field: index + 1 for index, field in enumerate(fields)}
+    ip = columns.get('ip')
+    username = columns.get('username')
+    ptz = columns.get('ptz')
+    password = columns.get('password')
+    decrypt = credentials.decrypt
+    return [Camera(row[0],
+                   decrypt(row[ip]) if ip is not None else None,
+                   decrypt(row[username]) if username is not None else None,
+                   (row[ptz] or 0) if ptz is not None else 0,
+                   _token(row[password]) if password is not None else None)
+            for row in rows]
+
+
+def iter_pages(page_size=PAGE_SIZE, fields=LIST_FIELDS):
+    """
+    Pages de caméras par ordre d'id (WHERE id > dernier id). Chaque page est une requête
+    courte : la connexion n'est jamais gardée entre deux pages.
+    """
+    columns = _columns(fields)
+    last_id = 0
+    while True:
+        rows = camera_db.query(f'SELECT {columns} FROM cameras WHERE id > ? ORDER BY id LIMIT ?',
+                               (last_id, page_size))
+        if not rows:
+            return
+        yield _build(rows, fields)
+        last_id = rows[-1][0]
+
+
+def get_cameras(fields=LIST_FIELDS):
+    return [camera for page in iter_pages(fields=fields) for camera in page]
+
+
+def fetch(camera_ids, fields=LIST_FIELDS):
+    """Caméras de ces ids (celles qui n'existent plus sont absentes), par ordre d'id"""
+    columns = _columns(fields)
+    camera_ids = list(camera_ids)
+    cameras = []
+    for start in range(0, len(camera_ids), PAGE_SIZE):
+        chunk = camera_ids[start:start + PAGE_SIZE]
+        rows = camera_db.query(f'SELECT {columns} FROM cameras '
+                               f'WHERE id IN ({",".join("?" * len(chunk))}) ORDER BY id', chunk)
+        cameras.extend(_build(rows, fields))
+    return cameras
+
+
+def get_camera(camera_id, fields=FIELDS):
+    cameras = fetch([camera_id], fields)
+    return cameras[0] if cameras else None
+
+
+def find_by_ip(ip, fields=LIST_FIELDS):
+    """Caméra ayant cette adresse (index aveugle, aucune ligne déchiffrée pour chercher), ou None"""
+    rows = camera_db.query(f'SELECT {_columns(fields)} FROM cameras WHERE ip_bidx = ? ORDER BY id LIMIT 1',
+                           (blind_index('ip', ip),))
+    return _build(rows, fields)[0] if rows else None
+
+
+def find_by_username(username, fields=LIST_FIELDS):
+    rows = camera_db.query(f'SELECT {_columns(fields)} FROM cameras WHERE username_bidx = ? ORDER BY id',
+                           (blind_index('username', username),))
+    return _build(rows, fields)
+
+
+def load_passwords(cameras):
+    """Déchiffre en masse les mots de passe d'une liste (export, mur vidéo)"""
+    missing = [camera for camera in cameras if camera._token is None]
+    for start in range(0, len(missing), PAGE_SIZE):
+        chunk = missing[start:start + PAGE_SIZE]
+        tokens = dict(camera_db.query(f'SELECT id, password FROM cameras '
+                                      f'WHERE id IN ({",".join("?" * len(chunk))})',
+                                      [camera.id for camera in chunk]))
+        for camera in chunk:
+            camera._token = _token(tokens.get(camera.id))
+    pending = [camera for camera in cameras if camera._password is None and camera._token is not None]
+    for camera, password in zip(pending, credentials.decrypt_many([camera._token for camera in pending])):
+        camera._password = password
+    return cameras
+
+
+# --- écritures ---------------------------------------------------------------------------
+
+class DuplicateCameraError(ValueError):
+    """Une autre caméra a déjà cette adresse"""
+
+
+def _check_duplicate(ip_bidx, ip, camera_id=None):
+    row = camera_db.query_one('SELECT id FROM cameras WHERE ip_bidx = ? AND id != ? LIMIT 1',
+                              (ip_bidx, camera_id if camera_id is not None else -1))
+    if row is not None:
+        raise DuplicateCameraError(f"camera {row[0]} already uses address {ip}")
+
+
+def add_camera(ip, username, password, ptz=0):
+    encrypted_ip = credentials.encrypt(ip)
+    encrypted_username = credentials.encrypt(username)
+    encrypted_password = credentials.encrypt(password)
+    ip_bidx = blind_index('ip', ip)
+
+    # Vérification et insertion dans la même transaction (verrou d'écriture pris)
+    with camera_db.transaction():
+        _check_duplicate(ip_bidx, ip)
+        return camera_db.execute('INSERT INTO cameras (ip, username, password, ptz, ip_bidx, username_bidx) '
+                                 'VALUES (?, ?, ?, ?, ?, ?)',
+                                 (encrypted_ip, encrypted_username, encrypted_password, ptz,
+                                  ip_bidx, blind_index('username', username)))
+
+
+def add_discovered_cameras(devices, username, password):
+    """
+    Ajoute en une transaction les caméras découvertes (camera_discovery) qui ne sont pas
+    déjà en base ; leurs profils ONVIF vont directement dans le cache.
+    """
+    added = []
+    with camera_db.transaction():
+        for device in devices:
+            if device.get('error'):
+                continue
+            try:
+                camera_id = add_camera(device['host'], username, password, device.get('ptz', 0))
+            except DuplicateCameraError:
+                continue
+            if device.get('metadata'):
+                onvif_cache.store(camera_id, device['metadata'])
+            added.append(camera_id)
+    return added
+
+
+def update_camera(camera_id, ip, username, password, ptz=0):
+    encrypted_ip = credentials.encrypt(ip)
+    encrypted_username = credentials.encrypt(username)
+    encrypted_password = credentials.encrypt(password)
+    ip_bidx = blind_index('ip', ip)
+
+    with camera_db.transaction():
+        _check_duplicate(ip_bidx, ip, camera_id)
+        old = camera_db.query_one('SELECT ip, username, password FROM cameras WHERE id = ?', (camera_id,))
+        camera_db.execute('UPDATE cameras SET ip = ?, username = ?, password = ?, ptz = ?, '
+                          'ip_bidx = ?, username_bidx = ? WHERE id = ?',
+                          (encrypted_ip, encrypted_username, encrypted_password, ptz,
+                           ip_bidx, blind_index('username', username), camera_id))
+        # Les profils/URI en cache ne sont plus valides si l'adresse ou les identifiants changent
+        if old is None or [credentials.decrypt(value) for value in old] != [str(ip), str(username), str(password)]:
+            onvif_cache.invalidate(camera_id)
+
+
+def delete_camera(camera_id):
+    with camera_db.transaction():
+        camera_db.execute('DELETE FROM cameras WHERE id = ?', (camera_id,))
+        onvif_cache.invalidate(camera_id)
@@ -1,81 +1,45 @@
 import os
-import sqlite3
-from cryptography.fernet import Fernet
+import launcher
+from launcher import LauncherPool
 import tkinter as tk
+from queue import Queue, Empty
+from collections import OrderedDict
+from PIL import Image, ImageTk
+from snapshot_service import SnapshotService, THUMBNAIL_SIZE
+from health_monitor import HealthScanner, STATUS_COLORS, load_health, describe
+from camera_list import CameraList
 import subprocess
-import shutil
 import sys
 
-# Encryption key (should be kept secret)
-ENCRYPTION_KEY = b'g4ZltE3Vv2Xzq5y6Lq3l4f8Ozt2Ck2Tk6v5b0rN2ghE='
-
-# Database file
-DB_FILE = os.path.join(os.path.dirname(__file__), 'camera_credentials.db')
-
-# Initialize encryption
-cipher = Fernet(ENCRYPTION_KEY)
+# Vignettes gardées en mémoire (PhotoImage), les autres lignes affichent le fond gris
+MAX_THUMBNAILS = 200
 
 def get_python39():
-    python_exe = shutil.which("python3.9")
-    if not python_exe:
-        try:
-            python_exe = subprocess.check_output(
-                ["py", "-3.9", "-c", "import sys; print(sys.executable)"]
-            ).decode().strip()
-        except Exception:
-            python_exe = sys.executable
-    return python_exe
+    return launcher.get_python39() or sys.executable
 
 def get_current_python():
     """Get the current Python executable path"""
     return sys.executable
 
-def is_encrypted(data):
-    try:
-        cipher.decrypt(data)
-        return True
-    except Exception:
-        return False
-
-def decrypt_data(encrypted_data):
-    try:
-        if is_encrypted(encrypted_data):
-            return cipher.decrypt(encrypted_data).decode()
-        return encrypted_data
-    except Exception:
-        return encrypted_data
-
-def get_cameras():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, ip, username, password, ptz FROM cameras')
-    cameras = cursor.fetchall()
-    conn.close()
-    
-    decrypted_cameras = []
-    for camera in cameras:
-        try:
-            ip_data = camera[1].encode() if isinstance(camera[1], str) else camera[1]
-            username_data = camera[2].encode() if isinstance(camera[2], str) else camera[2]
-            password_data = camera[3].encode() if isinstance(camera[3], str) else camera[3]
-            
-            decrypted_camera = (
-                camera[0],
-                decrypt_data(ip_data),
-                decrypt_data(username_data),
-                password_data,
-                camera[4]
-            )
-            decrypted_cameras.append(decrypted_camera)
-        except Exception as e:
-            print(f"Error processing camera {camera[0]}: {e}")
-            continue
-    return decrypted_cameras
-
 class CameraViewer:
     def __init__(self, root):
         self.root = root
         self.processes = []
+        # Workers pré-chauffés : le clic ne paie plus le démarrage de l'interpréteur
+        self.launcher = LauncherPool(get_python39()).start()
+        # Vignettes : demandées pour les lignes visibles seulement, affichées par la boucle Tk
+        self.snapshots = SnapshotService()
+        self.thumbnail_queue = Queue()
+        self.thumbnail_images = OrderedDict()
+        self.placeholder = ImageTk.PhotoImage(Image.new('RGB', THUMBNAIL_SIZE, '#2b2b2b'))
+        # État réseau : scanner asyncio en arrière-plan, dernier état connu affiché d'abord
+        self.health_queue = Queue()
+        try:
+            self.health = load_health()
+        except Exception as e:
+            print(f"Health table error: {e}")
+            self.health = {}
+        self.health_scanner = HealthScanner(callback=self.health_queue.put).start()
         
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
@@ -85,69 +49,176 @@ class CameraViewer:
         main_frame.grid_rowconfigure(0, weight=1)
         main_frame.grid_columnconfigure(0, weight=1)
 
-        list_frame = tk.Frame(main_frame)
-        list_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        list_frame.grid_rowconfigure(0, weight=1)
-        list_frame.grid_columnconfigure(0, weight=1)
-
-        scrollbar = tk.Scrollbar(list_frame)
-        scrollbar.grid(row=0, column=1, sticky="ns")
-
-        self.camera_list = tk.Text(list_frame, height=10, state=tk.DISABLED,
-                                 yscrollcommand=scrollbar.set, 
-                                 cursor="arrow")
-        self.camera_list.grid(row=0, column=0, sticky="nsew")
-        scrollbar.config(command=self.camera_list.yview)
-
-        self.load_cameras()
+        # Liste virtualisée : une ligne Treeview par caméra, aucun widget par ligne
+        self.camera_list = CameraList(
+            main_frame,
+            columns=[('camera', 'Camera', 90), ('status', 'Status', 110)],
+            values=self.camera_values, tags=self.camera_tags,
+            on_activate=self.play_camera_thread, on_select=self.selection_changed,
+            on_visible=self.request_thumbnails, on_loaded=self.cameras_loaded,
+            on_changed=self.cameras_changed,
+            menu=[("Play", self.play_camera_thread, None),
+                  ("PTZ", self.play_ptz_thread, lambda camera: camera.ptz == 1)],
+            show_images=True, row_height=THUMBNAIL_SIZE[1] + 6, default_image=self.placeholder)
+        for status, color in STATUS_COLORS.items():
+            if status is not None:
+                self.camera_list.tree.tag_configure(status, foreground=color)
+        self.camera_list.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         
-        # Ajout d'un frame pour le bouton en bas
+        # Ajout d'un frame pour les boutons en bas (actions sur la caméra sélectionnée)
         button_frame = tk.Frame(main_frame)
         button_frame.grid(row=1, column=0, pady=5)
         button_frame.grid_columnconfigure(0, weight=1)
+
+        self.play_button = tk.Button(button_frame, text="Play", state=tk.DISABLED,
+                                     command=lambda: self.on_selected(self.play_camera_thread),
+                                     cursor="hand2")
+        self.play_button.grid(row=0, column=0, padx=2)
+        self.ptz_button = tk.Button(button_frame, text="PTZ", state=tk.DISABLED,
+                                    command=lambda: self.on_selected(self.play_ptz_thread),
+                                    cursor="hand2")
+        self.ptz_button.grid(row=0, column=1, padx=2)
         
         self.manage_button = tk.Button(button_frame, text="Manage Cameras", 
                                      command=self.open_camera_manager,
                                      cursor="hand2")
-        self.manage_button.grid(row=0, column=0)
+        self.manage_button.grid(row=0, column=2, padx=2)
+
+        self.health_label = tk.Label(button_frame, text="", anchor="w")
+        self.health_label.grid(row=1, column=0, columnspan=3, sticky="ew")
+        self.update_health_summary()
         
-        self.root.bind('<Up>', self.navigate_up)
-        self.root.bind('<Down>', self.navigate_down)
         self.root.bind('<Return>', self.activate_button)
         
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.load_cameras()
+        self.camera_list.focus()
+        self.root.after(100, self.update_thumbnails)
+        self.root.after(500, self.update_health)
 
     def load_cameras(self):
-        self.camera_list.config(state=tk.NORMAL)
-        self.camera_list.delete("1.0", tk.END)
-        cameras = get_cameras()
-        for camera in cameras:
-            self.camera_list.insert(tk.END, f"Camera : {camera[0]} ")
-            
-            button_frame = tk.Frame(self.camera_list, highlightthickness=0, bd=0, bg=self.camera_list.cget('bg'))
-            button_frame.configure(pady=5, padx=5)
-            
-            play_button = tk.Button(button_frame, text="Play", 
-                                  command=lambda c=camera: self.play_camera_thread(c),
-                                  cursor="hand2")
-            play_button.pack(side=tk.LEFT, padx=2)
-            
-            if camera[4] == 1:  # camera[4] = ptz
-                ptz_button = tk.Button(button_frame, text="PTZ",
-                                       command=lambda c=camera: self.play_ptz_thread(c),
-                                       cursor="hand2")
-                ptz_button.pack(side=tk.LEFT, padx=2)
-            
-            self.camera_list.window_create("end", window=button_frame)
-            self.camera_list.insert(tk.END, "\n")
-            
-        self.camera_list.config(state=tk.DISABLED)
-
-    def navigate_up(self, event):
-        self.camera_list.yview_scroll(-1, "units")
-
-    def navigate_down(self, event):
-        self.camera_list.yview_scroll(1, "units")
+        # Lecture et déchiffrement en arrière-plan, la fenêtre reste réactive
+        self.camera_list.load()
+
+    def cameras_loaded(self):
+        cameras = self.camera_list.cameras
+        # Caméras supprimées : leur dernier état ne compte plus
+        self.health = {camera_id: state for camera_id, state in self.health.items() if camera_id in cameras}
+        self.update_health_summary()
+        self.health_scanner.set_targets([(camera.id, camera.ip) for camera in cameras.values()])
+
+    def cameras_changed(self, upserted, deleted, previous):
+        """Diff reçu du journal (autre processus, manager...) : seules ces lignes sont touchées"""
+        stale = list(deleted)
+        for camera in upserted:
+            old = previous.get(camera.id)
+            # Nouvelle adresse ou nouveaux identifiants : la vignette ne correspond plus. Le
+            # mot de passe n'est comparé que s'il avait servi (vignette prise avec lui).
+            if old is not None and (old.ip != camera.ip or old.username != camera.username
+                                    or old.password_loaded and old.password_token != camera.password_token):
+                stale.append(camera.id)
+        for camera_id in stale:
+            self.thumbnail_images.pop(camera_id, None)
+            self.camera_list.set_image(camera_id, self.placeholder)
+            self.snapshots.invalidate(camera_id)
+        for camera_id in deleted:
+            self.health.pop(camera_id, None)
+        moved = False
+        for camera in upserted:
+            old = previous.get(camera.id)
+            if old is None or old.ip != camera.ip:
+                # Adresse nouvelle : l'ancien état réseau ne vaut plus, passe anticipée
+                self.health.pop(camera.id, None)
+                self.camera_list.refresh(camera.id)
+                moved = True
+        self.update_health_summary()
+        cameras = self.camera_list.cameras
+        self.health_scanner.set_targets([(camera.id, camera.ip) for camera in cameras.values()],
+                                        rescan=moved)
+        self.request_thumbnails(self.camera_list.visible_ids())
+
+    def camera_values(self, camera):
+        status, latency_ms, _ = self.health.get(camera.id, (None, None, None))
+        return (f"Camera {camera.id}", describe(status, latency_ms))
+
+    def camera_tags(self, camera):
+        status = self.health.get(camera.id, (None,))[0]
+        return (status,) if status else ()
+
+    def selection_changed(self, camera):
+        self.play_button.config(state=tk.NORMAL if camera else tk.DISABLED)
+        self.ptz_button.config(state=tk.NORMAL if camera and camera.ptz == 1 else tk.DISABLED)
+
+    def on_selected(self, action):
+        camera = self.camera_list.selected()
+        if camera is not None:
+            action(camera)
+
+    def request_thumbnails(self, camera_ids):
+        # Seules les lignes affichées demandent une vignette (cache disque, pool borné)
+        for camera_id in camera_ids:
+            camera = self.camera_list.cameras.get(camera_id)
+            if camera is None:
+                continue
+            if camera_id in self.thumbnail_images:
+                self.thumbnail_images.move_to_end(camera_id)
+                if self.snapshots.cached(camera_id)[1]:
+                    continue
+            try:
+                # Mot de passe déchiffré dans le pool, et seulement si la vignette est à refaire
+                self.snapshots.request(camera.id, camera.ip, camera.username,
+                                       lambda camera=camera: camera.password,
+                                       lambda camera_id, path: self.thumbnail_queue.put((camera_id, path)))
+            except Exception as e:
+                print(f"Snapshot request error for camera {camera.id}: {e}")
+
+    def update_thumbnails(self):
+        # Tk n'est pas thread-safe : les threads du pool passent par la file
+        try:
+            while True:
+                camera_id, path = self.thumbnail_queue.get_nowait()
+                if camera_id not in self.camera_list.cameras:
+                    continue
+                try:
+                    image = ImageTk.PhotoImage(Image.open(path))
+                except Exception as e:
+                    print(f"Thumbnail error for camera {camera_id}: {e}")
+                    continue
+                self.thumbnail_images[camera_id] = image  # garder une référence
+                self.thumbnail_images.move_to_end(camera_id)
+                self.camera_list.set_image(camera_id, image)
+                # Mémoire bornée : les vignettes les moins récemment vues repassent au gris
+                while len(self.thumbnail_images) > MAX_THUMBNAILS:
+                    old_id, _ = self.thumbnail_images.popitem(last=False)
+                    self.camera_list.set_image(old_id, self.placeholder)
+        except Empty:
+            pass
+        self.root.after(100, self.update_thumbnails)
+
+    def update_health(self):
+        # Résultats du scanner (thread asyncio) appliqués par lots dans la boucle Tk
+        changed = False
+        try:
+            while True:
+                result = self.health_queue.get_nowait()
+                camera_id = result['camera_id']
+                if camera_id not in self.camera_list.cameras:
+                    continue
+                self.health[camera_id] = (result['status'], result['latency_ms'], result['checked_at'])
+                self.camera_list.refresh(camera_id)
+                changed = True
+        except Empty:
+            pass
+        if changed:
+            self.update_health_summary()
+        self.root.after(500, self.update_health)
+
+    def update_health_summary(self):
+        counts = {}
+        for status, _, _ in self.health.values():
+            counts[status] = counts.get(status, 0) + 1
+        self.health_label.config(text="  ".join(f"{status}: {count}"
+                                                for status, count in sorted(counts.items())))
 
     def activate_button(self, event):
         focused_widget = self.root.focus_get()
@@ -155,29 +226,15 @@ class CameraViewer:
             focused_widget.invoke()
 
     def play_camera_thread(self, camera):
-        decrypted_password = cipher.decrypt(camera[3]).decode()
-        python_exe = get_python39()  # Use Python 3.9 for ONVIF/camera interaction
-        if not python_exe:
-            messagebox.showerror("Error", "Python 3.9 is required to view cameras")
-            return
-            
-        process = subprocess.Popen([python_exe, 
-                                  os.path.join(os.path.dirname(__file__), 'player_vilkin_hikvision.py'),
-                                  str(camera[0]),
-                                  camera[1],
-                                  camera[2],
-                                  decrypted_password])
+        # Le mot de passe est transmis au worker par pipe, pas en argument
+        process = self.launcher.launch('player', camera.id, camera.ip, camera.username,
+                                       camera.password)
         self.processes.append(process)
 
     def play_ptz_thread(self, camera):
-        python_exe = get_python39()
-        if not python_exe:
-            messagebox.showerror("Error", "Python 3.9 is required for PTZ")
-            return
-        decrypted_password = cipher.decrypt(camera[3]).decode()
-        subprocess.Popen([python_exe,
-                          os.path.join(os.path.dirname(__file__), 'ptz_keyboard_control.py'),
-                          str(camera[0]), camera[1], camera[2], decrypted_password])
+        process = self.launcher.launch('ptz', camera.id, camera.ip, camera.username,
+                                       camera.password)
+        self.processes.append(process)
 
     def open_camera_manager(self):
         manager_path = os.path.join(os.path.dirname(__file__), 'camera_manager.py')
@@ -192,11 +249,15 @@ class CameraViewer:
                 process.kill()
             except Exception as e:
                 print(f"Error closing process: {e}")
+        self.launcher.shutdown()
+        self.snapshots.shutdown()
+        self.health_scanner.stop()
+        self.camera_list.stop()
         self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
     root.title("Camera Viewer")
-    root.geometry("300x250")
+    root.geometry("420x520")
     app = CameraViewer(root)
     root.mainloop()
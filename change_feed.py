@@ -0,0 +1,123 @@
+"""
+Flux des modifications de la table cameras, partagé par tous les processus.
+
+Des triggers SQLite (créés par migrations.py) inscrivent chaque ajout, modification ou suppression dans
+camera_changes avec un numéro de version croissant : tous les écrivains sont couverts
+(manager, import, autre processus) sans rien changer à leur code. Un abonné relit
+périodiquement les versions postérieures à la sienne, recharge seulement les caméras
+concernées (camera_repository, dans son thread) et transmet le diff à l'interface.
+"""
+import time
+import threading
+import camera_db
+import migrations
+import camera_repository
+from camera_crypto import credentials
+
+# Période de relecture du journal (secondes)
+POLL_INTERVAL = 0.25
+
+# Au-delà de ce nombre de caméras modifiées d'un coup, un rechargement complet est plus simple
+RELOAD_THRESHOLD = 2000
+
+# Âge au-delà duquel les entrées du journal sont supprimées (secondes)
+RETENTION = 24 * 3600
+
+def prune(retention=RETENTION):
+    migrations.ensure_current()
+    camera_db.execute('DELETE FROM camera_changes WHERE changed_at < ?', (time.time() - retention,))
+
+
+def current_version():
+    """Dernière version attribuée (y compris si le journal a été purgé depuis)"""
+    migrations.ensure_current()
+    row = camera_db.query_one("SELECT seq FROM sqlite_sequence WHERE name = 'camera_changes'")
+    return row[0] if row else 0
+
+
+def changes_since(version):
+    """
+    (dernière version, {camera_id: 'upsert' | 'delete'} ou None si le journal a été purgé
+    depuis `version` : l'abonné doit alors tout recharger)
+    """
+    migrations.ensure_current()
+    oldest = camera_db.query_one('SELECT min(version) FROM camera_changes')[0]
+    rows = camera_db.query('SELECT version, camera_id, op FROM camera_changes '
+                           'WHERE version > ? ORDER BY version', (version,))
+    if not rows:
+        return version, {}
+    if oldest is not None and oldest > version + 1:
+        return rows[-1][0], None
+    # Seule la dernière opération de chaque caméra compte
+    return rows[-1][0], {camera_id: op for _, camera_id, op in rows}
+
+
+class ChangeFeed:
+    """
+    Thread abonné : callback(upserted, deleted) avec les caméras modifiées (Camera) et
+    les ids supprimés, ou callback(None, None) quand un rechargement complet s'impose.
+    Le callback est appelé depuis le thread : l'interface le relaie par une file.
+    """
+
+    def __init__(self, callback, interval=POLL_INTERVAL, version=None):
+        self.callback = callback
+        self.interval = interval
+        self.version = version
+        self._keys = credentials.keys
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        migrations.ensure_current()
+        if self.version is None:
+            self.version = current_version()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def wake(self):
+        """Relecture immédiate (après une écriture de ce processus)"""
+        self._wake.set()
+
+    def reset(self, version=None):
+        """Repart de la version donnée (ex. juste avant un rechargement complet)"""
+        self.version = current_version() if version is None else version
+
+    def poll(self):
+        # Clé retirée par key_rotation.py : les mots de passe chiffrés gardés par l'interface
+        # ne se déchiffrent plus, tout recharger (rare)
+        credentials.reload()
+        keys, self._keys = self._keys, credentials.keys
+        if set(keys) - set(credentials.keys):
+            self.callback(None, None)
+            return
+        version, changes = changes_since(self.version)
+        if version == self.version:
+            return
+        self.version = version
+        if changes is None or len(changes) > RELOAD_THRESHOLD:
+            self.callback(None, None)
+            return
+        deleted = [camera_id for camera_id, op in changes.items() if op == 'delete']
+        upserted = camera_repository.fetch(camera_id for camera_id, op in changes.items() if op == 'upsert')
+        # Une caméra ajoutée puis supprimée entre deux relectures n'est plus en base
+        found = {camera.id for camera in upserted}
+        deleted += [camera_id for camera_id, op in changes.items() if op == 'upsert' and camera_id not in found]
+        self.callback(upserted, deleted)
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self._running:
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Change feed error: {e}")
@@ -0,0 +1,228 @@
+"""
+Bus d'images en mémoire partagée pour les analyses hors processus (OCR, comptage...).
+
+Le lecteur publie des images réduites (niveaux de gris) dans un anneau de slots
+multiprocessing.shared_memory. Chaque slot est protégé par deux numéros de séquence
+(début/fin d'écriture) : le publieur n'attend jamais personne, un abonné lent saute
+simplement des images et relit la plus récente (latest wins). Un flux n'a qu'un publieur :
+le segment d'un lecteur encore vivant (pid de l'en-tête) n'est jamais repris par un autre.
+
+Abonné :
+    from frame_bus import FrameSubscriber
+    with FrameSubscriber('12') as bus:
+        for seq, timestamp, frame in bus.frames():
+            ...
+"""
+import os
+import time
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+MAGIC = 0x53554243  # 'CBUS'
+VERSION = 1
+
+DEFAULT_SLOTS = 4
+DEFAULT_BUS_SIZE = (640, 360)
+
+# En-tête global : magic, version, largeur, hauteur, slots, taille d'image, dernière séquence, pid
+_HEADER_WORDS = 8
+# En-tête de slot : séquence de début, séquence de fin, horodatage (ns), réservé
+_SLOT_WORDS = 4
+_ALIGN = 64
+
+_H_MAGIC, _H_VERSION, _H_WIDTH, _H_HEIGHT, _H_SLOTS, _H_FRAME_SIZE, _H_LATEST, _H_PID = range(8)
+_S_BEGIN, _S_END, _S_TIME = range(3)
+
+
+def segment_name(name):
+    """Nom du segment partagé d'un flux (caractères sûrs pour tous les OS)"""
+    safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(name))
+    return f"camerabus_{safe}"
+
+
+def _layout(width, height, slots):
+    frame_size = width * height
+    data_offset = _HEADER_WORDS * 8 + slots * _SLOT_WORDS * 8
+    data_offset = (data_offset + _ALIGN - 1) // _ALIGN * _ALIGN
+    stride = (frame_size + _ALIGN - 1) // _ALIGN * _ALIGN
+    return frame_size, data_offset, stride, data_offset + slots * stride
+
+
+class _Segment:
+    def _map(self, width, height, slots):
+        frame_size, data_offset, stride, _ = _layout(width, height, slots)
+        buf = self.shm.buf
+        self.header = np.ndarray((_HEADER_WORDS,), dtype=np.uint64, buffer=buf)
+        self.slot_headers = np.ndarray((slots, _SLOT_WORDS), dtype=np.uint64, buffer=buf,
+                                       offset=_HEADER_WORDS * 8)
+        self.slots = [np.ndarray((height, width), dtype=np.uint8, buffer=buf,
+                                 offset=data_offset + index * stride) for index in range(slots)]
+        self.width, self.height, self.slot_count = width, height, slots
+
+    def _unmap(self):
+        # Les vues numpy doivent disparaître avant de fermer le segment
+        self.header = self.slot_headers = None
+        self.slots = []
+
+
+class FramePublisher(_Segment):
+    """Côté lecteur : écrit sans jamais attendre les abonnés"""
+
+    def __init__(self, name, width, height, slots=DEFAULT_SLOTS):
+        self.name = segment_name(name)
+        size = _layout(width, height, slots)[3]
+        try:
+            self.shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        except FileExistsError:
+            owner = _owner(self.name)
+            if owner is not None:
+                raise FileExistsError(f"{self.name} is already published by process {owner}")
+            # Segment laissé par un lecteur précédent arrêté brutalement
+            stale = _attach(self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        self._map(width, height, slots)
+        self.slot_headers[:] = 0
+        self.header[:] = [MAGIC, VERSION, width, height, slots, width * height, 0, os.getpid()]
+        self.seq = 0
+
+    def publish(self, frame):
+        """Copie une image (h, w) uint8 dans le slot suivant"""
+        self.seq += 1
+        index = (self.seq - 1) % self.slot_count
+        slot = self.slot_headers[index]
+        slot[_S_BEGIN] = self.seq
+        np.copyto(self.slots[index], frame)
+        slot[_S_TIME] = time.time_ns()
+        slot[_S_END] = self.seq
+        self.header[_H_LATEST] = self.seq
+
+    def close(self):
+        self._unmap()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameSubscriber(_Segment):
+    """Côté analyse : lit la dernière image complète, sans verrou ni attente du publieur"""
+
+    def __init__(self, name):
+        self.name = segment_name(name)
+        self.shm = _attach(self.name)
+        header = np.ndarray((_HEADER_WORDS,), dtype=np.uint64, buffer=self.shm.buf)
+        if int(header[_H_MAGIC]) != MAGIC or int(header[_H_VERSION]) != VERSION:
+            del header
+            self.shm.close()
+            raise ValueError(f"{self.name} is not a frame bus segment")
+        width, height, slots = int(header[_H_WIDTH]), int(header[_H_HEIGHT]), int(header[_H_SLOTS])
+        del header
+        self._map(width, height, slots)
+        # Image copiée hors du segment : le publieur peut réécrire le slot à tout moment
+        self.frame = np.empty((height, width), dtype=np.uint8)
+        self.last_seq = 0
+        self.dropped = 0
+
+    def latest_seq(self):
+        return int(self.header[_H_LATEST])
+
+    def read(self, out=None, retries=3):
+        """(seq, horodatage, image) de la dernière image complète, ou None"""
+        out = self.frame if out is None else out
+        for _ in range(retries):
+            seq = int(self.header[_H_LATEST])
+            if seq == 0:
+                return None
+            slot = self.slot_headers[(seq - 1) % self.slot_count]
+            if int(slot[_S_END]) != seq:
+                continue
+            timestamp = int(slot[_S_TIME]) / 1e9
+            np.copyto(out, self.slots[(seq - 1) % self.slot_count])
+            # Slot réécrit pendant la copie : on recommence avec la nouvelle dernière image
+            if int(slot[_S_BEGIN]) != seq:
+                continue
+            if self.last_seq and seq > self.last_seq + 1:
+                self.dropped += seq - self.last_seq - 1
+            self.last_seq = seq
+            return seq, timestamp, out
+        return None
+
+    def frames(self, poll=0.005, timeout=None):
+        """Génère les nouvelles images ; s'arrête après `timeout` s sans nouvelle image"""
+        idle_since = time.monotonic()
+        while True:
+            if self.latest_seq() != self.last_seq:
+                result = self.read()
+                if result is not None:
+                    idle_since = time.monotonic()
+                    yield result
+                    continue
+            if timeout is not None and time.monotonic() - idle_since > timeout:
+                return
+            time.sleep(poll)
+
+    def close(self):
+        self._unmap()
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill(pid, 0) terminerait le processus sous Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner(name):
+    """pid du publieur encore vivant d'un segment existant, ou None (segment abandonné)"""
+    shm = _attach(name)
+    try:
+        if shm.size < _HEADER_WORDS * 8:
+            return None
+        header = np.ndarray((_HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        magic, pid = int(header[_H_MAGIC]), int(header[_H_PID])
+        del header
+    finally:
+        shm.close()
+    if magic != MAGIC or pid <= 0:
+        return None
+    return pid if _process_alive(pid) else None
+
+
+def _attach(name):
+    """Ouvre un segment existant sans que ce processus le supprime à sa sortie"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python < 3.13 : le resource_tracker supprimerait le segment du publieur
+        shm = shared_memory.SharedMemory(name)
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
@@ -0,0 +1,180 @@
+"""
+Analyse des images décodées : libVLC décode (callbacks vidéo) directement dans un buffer
+NumPy préalloué, en niveaux de gris et à résolution réduite, puis une différence d'images
+vectorisée détecte le mouvement. Aucune allocation par image.
+"""
+import time
+import ctypes
+import threading
+from queue import Queue
+import numpy as np
+import vlc
+from stream_supervisor import get_supervisor
+
+# Niveaux de gris 8 bits : une seule conversion swscale, un octet par pixel
+TAP_CHROMA = 'GREY'
+
+DEFAULT_TAP_SIZE = (320, 180)
+
+# libVLC peut écrire au-delà de la zone visible : pitch et lignes alignés
+ALIGN = 32
+
+# Cadence maximale d'analyse (le décodage suit la cadence de la caméra)
+ANALYSIS_FPS = 5
+
+# Différence de luminance au-delà de laquelle un pixel a changé
+MOTION_THRESHOLD = 25
+
+# Part des pixels (dans le masque) qui doit changer pour signaler un mouvement
+MOTION_MIN_AREA = 0.01
+
+# Fin d'un mouvement après ce délai sans changement (secondes)
+MOTION_COOLDOWN = 2.0
+
+
+def _align(value):
+    return (value + ALIGN - 1) // ALIGN * ALIGN
+
+
+def build_mask(width, height, regions=None):
+    """Masque booléen à partir de rectangles relatifs (x0, y0, x1, y1) dans [0, 1]"""
+    if not regions:
+        return np.ones((height, width), dtype=bool)
+    mask = np.zeros((height, width), dtype=bool)
+    for x0, y0, x1, y1 in regions:
+        mask[int(y0 * height):int(round(y1 * height)), int(x0 * width):int(round(x1 * width))] = True
+    return mask
+
+
+class MotionDetector:
+    """Différence avec l'image analysée précédente, buffers de travail alloués une fois"""
+
+    def __init__(self, width, height, threshold=MOTION_THRESHOLD, min_area=MOTION_MIN_AREA,
+                 mask=None, cooldown=MOTION_COOLDOWN):
+        self.width = width
+        self.height = height
+        self.threshold = threshold
+        self.min_area = min_area
+        self.cooldown = cooldown
+        self.mask = mask if mask is not None else build_mask(width, height)
+        self._mask_area = max(1, int(np.count_nonzero(self.mask)))
+        self._previous = np.zeros((height, width), dtype=np.uint8)
+        self._high = np.empty((height, width), dtype=np.uint8)
+        self._low = np.empty((height, width), dtype=np.uint8)
+        self._changed = np.empty((height, width), dtype=bool)
+        self._primed = False
+        self.active = False
+        self.last_motion = 0.0
+        self.level = 0.0
+
+    def process(self, frame, now):
+        """Analyse une image (h, w) uint8 ; renvoie 'motion-start', 'motion-end' ou None"""
+        if not self._primed:
+            np.copyto(self._previous, frame)
+            self._primed = True
+            return None
+
+        # |frame - previous| en uint8 sans débordement : max - min
+        np.maximum(frame, self._previous, out=self._high)
+        np.minimum(frame, self._previous, out=self._low)
+        np.subtract(self._high, self._low, out=self._high)
+        np.greater(self._high, self.threshold, out=self._changed)
+        np.logical_and(self._changed, self.mask, out=self._changed)
+        self.level = int(np.count_nonzero(self._changed)) / self._mask_area
+        np.copyto(self._previous, frame)
+
+        if self.level >= self.min_area:
+            self.last_motion = now
+            if not self.active:
+                self.active = True
+                return 'motion-start'
+        elif self.active and now - self.last_motion > self.cooldown:
+            self.active = False
+            return 'motion-end'
+        return None
+
+
+class FrameTap:
+    """
+    Lecteur libVLC sans affichage qui décode dans un buffer NumPy (callbacks vidéo).
+    Même interface que VideoStream pour le superviseur (player, status_queue, restart).
+    """
+
+    def __init__(self, stream_uri, instance, size=DEFAULT_TAP_SIZE, detector=None,
+                 analysis_fps=ANALYSIS_FPS, name=None, media_options=()):
+        self.stream_uri = stream_uri
+        self.instance = instance
+        self.width, self.height = size
+        self.name = name or 'tap'
+        self.detector = detector
+        self.analysis_interval = 1.0 / analysis_fps if analysis_fps else 0.0
+        self.pitch = _align(self.width)
+        # Buffer unique où libVLC écrit ; `frame` en est la vue visible (sans padding)
+        self._buffer = np.zeros((_align(self.height), self.pitch), dtype=np.uint8)
+        self._address = self._buffer.ctypes.data
+        self.frame = self._buffer[:self.height, :self.width]
+        self.frames = 0
+        self.analyzed = 0
+        self.analysis_seconds = 0.0
+        self._last_analysis = 0.0
+        # Appelés avec chaque image décodée (ex. publication sur le bus d'images)
+        self.listeners = []
+        self.events = Queue()
+        self.status_queue = Queue()
+        self.running = False
+        self._restart_lock = threading.Lock()
+
+        # Les callbacks ctypes doivent rester référencés tant que le lecteur existe
+        self._lock_cb = vlc.CallbackDecorators.VideoLockCb(self._lock)
+        self._display_cb = vlc.CallbackDecorators.VideoDisplayCb(self._display)
+        self.player = instance.media_player_new()
+        self.player.video_set_callbacks(self._lock_cb, None, self._display_cb, None)
+        self.player.video_set_format(TAP_CHROMA, self.width, self.height, self.pitch)
+        self.media = instance.media_new(stream_uri)
+        self.media.add_option(':no-audio')
+        for option in media_options:
+            self.media.add_option(option)
+        self.player.set_media(self.media)
+
+    def _lock(self, opaque, planes):
+        planes[0] = ctypes.c_void_p(self._address)
+        return None
+
+    def _display(self, opaque, picture):
+        # Thread de sortie vidéo libVLC : traitement court, jamais d'appel à libVLC
+        self.frames += 1
+        for listener in self.listeners:
+            listener(self.frame)
+        if self.detector is None:
+            return
+        now = time.monotonic()
+        if now - self._last_analysis < self.analysis_interval:
+            return
+        self._last_analysis = now
+        event = self.detector.process(self.frame, now)
+        self.analysis_seconds += time.monotonic() - now
+        self.analyzed += 1
+        if event is not None:
+            self.events.put((event, self.detector.level, time.time()))
+
+    def ms_per_frame(self):
+        return self.analysis_seconds * 1000 / self.analyzed if self.analyzed else 0.0
+
+    def start(self):
+        self.running = True
+        get_supervisor().register(self)
+        self.player.play()
+
+    def stop(self):
+        self.running = False
+        get_supervisor().unregister(self)
+        with self._restart_lock:
+            self.player.stop()
+
+    def restart(self):
+        with self._restart_lock:
+            if not self.running:
+                return
+            self.player.stop()
+            self.player.set_media(self.media)
+            self.player.play()
@@ -0,0 +1,271 @@
+"""
+État du parc de caméras, vérifié en continu en arrière-plan.
+
+Une boucle asyncio (thread dédié) parcourt toutes les caméras avec une concurrence bornée :
+connexion TCP aux ports 80 et 554, requête RTSP OPTIONS, puis ONVIF GetSystemDateAndTime
+(sans authentification, comme le prévoit la norme). Aucun appel bloquant : des milliers
+de caméras tiennent dans un seul thread. Les résultats vont dans la table camera_health
+et sont transmis à l'interface par un callback (à relayer par une file pour Tk).
+"""
+import time
+import asyncio
+import argparse
+import threading
+import camera_db
+import migrations
+
+# Caméras vérifiées simultanément (deux connexions chacune)
+MAX_CONCURRENCY = 100
+
+# Délai par étape (connexion, réponse) et délai total par caméra (secondes)
+CONNECT_TIMEOUT = 2.0
+HOST_TIMEOUT = 5.0
+
+# Délai entre le début de deux passes sur tout le parc (secondes)
+SCAN_INTERVAL = 60
+
+HTTP_PORT = 80
+RTSP_PORT = 554
+
+# Taille maximale lue d'une réponse (la réponse ONVIF tient en quelques Ko)
+MAX_RESPONSE = 64 * 1024
+
+STATUS_OK = 'ok'
+STATUS_DEGRADED = 'degraded'
+STATUS_DOWN = 'down'
+
+STATUS_COLORS = {STATUS_OK: '#2e9e44', STATUS_DEGRADED: '#e0a800', STATUS_DOWN: '#d0342c',
+                 None: '#9e9e9e'}
+
+GET_SYSTEM_DATE_AND_TIME = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" '
+    'xmlns:tds="http://www.onvif.org/ver10/device/wsdl">'
+    '<s:Body><tds:GetSystemDateAndTime/></s:Body></s:Envelope>').encode()
+
+def store_results(results):
+    """Une transaction pour toute une passe"""
+    migrations.ensure_current()
+    camera_db.executemany(
+        'INSERT OR REPLACE INTO camera_health '
+        '(camera_id, status, latency_ms, http_open, rtsp_open, rtsp_ok, onvif_ok, error, checked_at) '
+        'VALUES (:camera_id, :status, :latency_ms, :http_open, :rtsp_open, :rtsp_ok, :onvif_ok, '
+        ':error, :checked_at)', results)
+
+
+def load_health():
+    """Dernier état connu : {camera_id: (status, latency_ms, checked_at)}"""
+    migrations.ensure_current()
+    rows = camera_db.query('SELECT camera_id, status, latency_ms, checked_at FROM camera_health')
+    return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+
+def describe(status, latency_ms):
+    if status is None:
+        return 'not checked yet'
+    if latency_ms is None:
+        return status
+    return f"{status}, {latency_ms:.0f} ms"
+
+
+async def _connect(host, port):
+    """(reader, writer, durée de connexion en ms)"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECT_TIMEOUT)
+    return reader, writer, (time.perf_counter() - start) * 1000
+
+
+async def _close(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, asyncio.CancelledError):
+        pass
+
+
+async def _read_response(reader):
+    """Lit jusqu'à la fermeture par la caméra (Connection: close), MAX_RESPONSE au plus"""
+    data = b''
+    while len(data) < MAX_RESPONSE:
+        chunk = await asyncio.wait_for(reader.read(MAX_RESPONSE - len(data)), CONNECT_TIMEOUT)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+async def check_rtsp(host, port=RTSP_PORT):
+    """(port ouvert, latence ms, OPTIONS répond, erreur)"""
+    try:
+        reader, writer, latency = await _connect(host, port)
+    except (OSError, asyncio.TimeoutError) as e:
+        return False, None, False, f"rtsp connect: {str(e) or 'timeout'}"
+    try:
+        writer.write(f"OPTIONS rtsp://{host}:{port}/ RTSP/1.0\r\nCSeq: 1\r\n"
+                     f"User-Agent: camera-health\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), CONNECT_TIMEOUT)
+        # 401 : le serveur RTSP répond, il veut seulement des identifiants
+        ok = status_line.startswith(b'RTSP/1.0 ') and status_line[9:12] in (b'200', b'401')
+        return True, latency, ok, None if ok else f"rtsp: {status_line[:40]!r}"
+    except (OSError, asyncio.TimeoutError) as e:
+        return True, latency, False, f"rtsp: {str(e) or 'timeout'}"
+    finally:
+        await _close(writer)
+
+
+async def check_onvif(host, port=HTTP_PORT):
+    """(port ouvert, latence ms, GetSystemDateAndTime répond, erreur)"""
+    try:
+        reader, writer, latency = await _connect(host, port)
+    except (OSError, asyncio.TimeoutError) as e:
+        return False, None, False, f"http connect: {str(e) or 'timeout'}"
+    try:
+        writer.write((f"POST /onvif/device_service HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                      f"Content-Type: application/soap+xml; charset=utf-8\r\n"
+                      f"Content-Length: {len(GET_SYSTEM_DATE_AND_TIME)}\r\n"
+                      f"Connection: close\r\n\r\n").encode() + GET_SYSTEM_DATE_AND_TIME)
+        await writer.drain()
+        response = await _read_response(reader)
+        status_line = response.split(b'\r\n', 1)[0]
+        ok = status_line.split(b' ')[1:2] == [b'200'] and b'GetSystemDateAndTimeResponse' in response
+        return True, latency, ok, None if ok else f"onvif: {status_line[:40]!r}"
+    except (OSError, asyncio.TimeoutError) as e:
+        return True, latency, False, f"onvif: {str(e) or 'timeout'}"
+    finally:
+        await _close(writer)
+
+
+async def check_camera(camera_id, host, http_port=HTTP_PORT, rtsp_port=RTSP_PORT):
+    """Les deux connexions en parallèle ; résultat prêt pour store_results"""
+    result = {'camera_id': camera_id, 'status': STATUS_DOWN, 'latency_ms': None,
+              'http_open': 0, 'rtsp_open': 0, 'rtsp_ok': 0, 'onvif_ok': 0,
+              'error': None, 'checked_at': time.time()}
+    try:
+        onvif, rtsp = await asyncio.wait_for(
+            asyncio.gather(check_onvif(host, http_port), check_rtsp(host, rtsp_port)),
+            HOST_TIMEOUT)
+    except asyncio.TimeoutError:
+        result['error'] = f"no answer within {HOST_TIMEOUT}s"
+        return result
+    except Exception as e:
+        # Adresse invalide (ex. 'a..b' : UnicodeError de l'encodage IDNA)... : caméra hors
+        # service, la passe continue pour les autres
+        result['error'] = f"check failed: {type(e).__name__}: {e}"
+        return result
+
+    result['http_open'], http_latency, result['onvif_ok'], onvif_error = onvif
+    result['rtsp_open'], rtsp_latency, result['rtsp_ok'], rtsp_error = rtsp
+    latencies = [value for value in (http_latency, rtsp_latency) if value is not None]
+    result['latency_ms'] = min(latencies) if latencies else None
+    result['error'] = '; '.join(e for e in (onvif_error, rtsp_error) if e) or None
+    for key in ('http_open', 'rtsp_open', 'rtsp_ok', 'onvif_ok'):
+        result[key] = int(result[key])
+    if result['rtsp_ok'] and result['onvif_ok']:
+        result['status'] = STATUS_OK
+    elif result['http_open'] or result['rtsp_open']:
+        result['status'] = STATUS_DEGRADED
+    return result
+
+
+async def scan(targets, concurrency=MAX_CONCURRENCY, callback=None, http_port=HTTP_PORT,
+               rtsp_port=RTSP_PORT):
+    """Vérifie [(camera_id, host), ...] ; callback(result) au fil des réponses"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(camera_id, host):
+        async with semaphore:
+            result = await check_camera(camera_id, host, http_port, rtsp_port)
+        if callback is not None:
+            callback(result)
+        return result
+
+    return await asyncio.gather(*(bounded(camera_id, host) for camera_id, host in targets))
+
+
+class HealthScanner:
+    """Boucle asyncio dans un thread : une passe complète toutes les `interval` secondes"""
+
+    def __init__(self, callback=None, interval=SCAN_INTERVAL, concurrency=MAX_CONCURRENCY,
+                 http_port=HTTP_PORT, rtsp_port=RTSP_PORT):
+        self.callback = callback
+        self.interval = interval
+        self.concurrency = concurrency
+        self.http_port = http_port
+        self.rtsp_port = rtsp_port
+        self.targets = []
+        self.last_scan_seconds = None
+        self._loop = None
+        self._wake = None
+        self._running = False
+        self._ready = threading.Event()
+        self._thread = None
+
+    def set_targets(self, targets, rescan=True):
+        """Remplace la liste [(camera_id, host), ...] et relance une passe tout de suite (rescan)"""
+        self.targets = list(targets)
+        if rescan and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='health-scanner', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        self._wake = asyncio.Event()
+        self._ready.set()
+        loop = asyncio.get_running_loop()
+        while self._running:
+            self._wake.clear()
+            targets = self.targets
+            if targets:
+                start = time.monotonic()
+                try:
+                    results = await scan(targets, self.concurrency, self.callback,
+                                         self.http_port, self.rtsp_port)
+                    # Écriture SQLite hors de la boucle asyncio
+                    await loop.run_in_executor(None, store_results, results)
+                except Exception as e:
+                    # Une passe ratée ne doit pas arrêter le thread : la suivante réessaie
+                    print(f"Health scan error: {e}")
+                self.last_scan_seconds = time.monotonic() - start
+            elapsed = self.last_scan_seconds or 0.0
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(1.0, self.interval - elapsed))
+            except asyncio.TimeoutError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the reachability of every camera once.')
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    import camera_repository
+    targets = [(camera.id, camera.ip) for camera in camera_repository.get_cameras(fields=('ip',))]
+    start = time.perf_counter()
+    results = asyncio.run(scan(targets, args.concurrency))
+    store_results(results)
+    for result in sorted(results, key=lambda r: r['camera_id']):
+        print(f"{result['camera_id']:>6} {describe(result['status'], result['latency_ms']):<20} "
+              f"{result['error'] or ''}")
+    print(f"{len(results)} camera(s) checked in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
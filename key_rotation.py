@@ -0,0 +1,261 @@
+"""
+Rotation des clés de chiffrement, en ligne.
+
+Les clés actives sont dans le trousseau (camera_keys.json) : la première chiffre, toutes
+déchiffrent. Une rotation se fait en trois temps, sans arrêter le viewer ni le manager :
+
+    python key_rotation.py new-key    # nouvelle clé en tête du trousseau
+    python key_rotation.py rotate     # réchiffre les lignes par petits lots (reprise possible)
+    python key_rotation.py retire     # vérifie puis retire les anciennes clés
+
+Chaque lot est une transaction courte qui enregistre aussi l'avancement (table
+key_rotation) : une rotation interrompue reprend au dernier lot validé. Les lecteurs (WAL)
+ne sont jamais bloqués ; les écrivains attendent au plus la durée d'un lot. Une ligne
+qu'aucune clé du trousseau ne déchiffre est notée (key_rotation_errors) et sautée : la
+rotation continue, mais retire refuse tant qu'il en reste.
+"""
+import sys
+import time
+import argparse
+from cryptography.fernet import Fernet, InvalidToken
+import camera_db
+import migrations
+from camera_crypto import credentials, load_keyring, save_keyring, key_id, looks_encrypted
+
+# Lignes réchiffrées par transaction (environ 100 µs par ligne)
+BATCH_SIZE = 500
+
+# Pause entre deux lots : laisse passer les écritures des interfaces (secondes)
+BATCH_PAUSE = 0.02
+
+# Tables chiffrées, dans l'ordre de traitement : (phase, clé, colonnes chiffrées)
+PHASES = (
+    ('cameras', 'id', ('ip', 'username', 'password')),
+    ('onvif_metadata', 'camera_id', ('profiles',)),
+)
+
+
+def add_key(path=None):
+    """Génère une clé et la place en tête du trousseau ; renvoie son empreinte"""
+    keyring = load_keyring(path)
+    key = Fernet.generate_key()
+    keyring['keys'].insert(0, key)
+    # Le trousseau créé ici garde l'ancienne clé et la clé d'index aveugle d'origine
+    save_keyring(keyring, path)
+    credentials.reload()
+    return key_id(key)
+
+
+def status():
+    """Avancement de la dernière rotation (dict) ou None"""
+    migrations.ensure_current()
+    row = camera_db.query_one('SELECT key_id, phase, last_id, rotated, total, started_at, finished_at '
+                              'FROM key_rotation WHERE id = 1')
+    if row is None:
+        return None
+    current = dict(zip(('key_id', 'phase', 'last_id', 'rotated', 'total', 'started_at', 'finished_at'), row))
+    current['failed'] = failed_rows()
+    return current
+
+
+def failed_rows():
+    """[(table, id)] des lignes qu'aucune clé du trousseau ne déchiffre"""
+    return camera_db.query('SELECT phase, row_id FROM key_rotation_errors ORDER BY phase, row_id')
+
+
+def _start(conn, primary):
+    total = sum(conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0] for table, _, _ in PHASES)
+    conn.execute('INSERT OR REPLACE INTO key_rotation '
+                 '(id, key_id, phase, last_id, rotated, total, started_at, finished_at) '
+                 'VALUES (1, ?, ?, 0, 0, ?, ?, NULL)', (primary, PHASES[0][0], total, time.time()))
+    conn.execute('DELETE FROM key_rotation_errors')
+
+
+def _select(table, key, columns, last_id, batch_size, conn=None):
+    sql = (f'SELECT {key}, {", ".join(columns)} FROM {table} WHERE {key} > ? '
+           f'ORDER BY {key} LIMIT ?')
+    if conn is None:
+        return camera_db.query(sql, (last_id, batch_size))
+    return conn.execute(sql, (last_id, batch_size)).fetchall()
+
+
+def _rewrite(conn, table, key, columns, rows):
+    """
+    Réchiffre les lignes (clé, valeurs...) avec la première clé ; renvoie le nombre de
+    lignes réécrites. Une ligne indéchiffrable est notée dans key_rotation_errors et laissée
+    telle quelle : elle n'arrête pas la rotation.
+    """
+    assignments = ', '.join(f'{column} = ?' for column in columns)
+    if table == 'cameras':
+        # Les valeurs en clair ne changent pas : le journal des modifications l'ignore
+        assignments += ', key_epoch = key_epoch + 1'
+    updates = []
+    for row in rows:
+        try:
+            updates.append(tuple(None if value is None else credentials.rotate(value) for value in row[1:])
+                           + (row[0],))
+        except InvalidToken:
+            conn.execute('INSERT OR REPLACE INTO key_rotation_errors (phase, row_id, error) VALUES (?, ?, ?)',
+                         (table, row[0], 'no key of the keyring decrypts this row'))
+            continue
+    conn.executemany(f'UPDATE {table} SET {assignments} WHERE {key} = ?', updates)
+    return len(updates)
+
+
+def rotate(batch_size=BATCH_SIZE, pause=BATCH_PAUSE, callback=None, stop=None):
+    """
+    Réchiffre toutes les valeurs avec la première clé du trousseau, lot par lot.
+    Reprend la rotation en cours si elle vise la même clé. callback(status) après chaque
+    lot ; stop (threading.Event) interrompt proprement entre deux lots.
+    """
+    migrations.upgrade()
+    credentials.reload()
+    primary = key_id(credentials.key)
+    with camera_db.transaction() as conn:
+        row = conn.execute('SELECT key_id FROM key_rotation WHERE id = 1').fetchone()
+        if row is None or row[0] != primary:
+            _start(conn, primary)
+    phases = [phase[0] for phase in PHASES]
+    while True:
+        with camera_db.transaction() as conn:
+            phase, last_id, rotated = conn.execute(
+                'SELECT phase, last_id, rotated FROM key_rotation WHERE id = 1').fetchone()
+            if phase == 'done':
+                break
+            table, key, columns = PHASES[phases.index(phase)]
+            rows = _select(table, key, columns, last_id, batch_size, conn)
+            if not rows:
+                # Table suivante, ou fin de la rotation
+                index = phases.index(phase) + 1
+                next_phase = phases[index] if index < len(phases) else 'done'
+                conn.execute('UPDATE key_rotation SET phase = ?, last_id = 0, finished_at = ? WHERE id = 1',
+                             (next_phase, time.time() if next_phase == 'done' else None))
+            else:
+                rewritten = _rewrite(conn, table, key, columns, rows)
+                conn.execute('UPDATE key_rotation SET last_id = ?, rotated = ? WHERE id = 1',
+                             (rows[-1][0], rotated + rewritten))
+        if callback is not None:
+            callback(status())
+        if stop is not None and stop.is_set():
+            break
+        if pause:
+            time.sleep(pause)
+    return status()
+
+
+def retire(path=None, batch_size=BATCH_SIZE):
+    """
+    Retire les anciennes clés du trousseau, une fois la rotation terminée. Les valeurs écrites
+    pendant la rotation par un processus qui n'avait pas encore relu le trousseau sont
+    vérifiées (déchiffrement avec la seule nouvelle clé) et réchiffrées au besoin.
+    Refuse (RuntimeError) s'il reste des lignes qu'aucune clé ne déchiffre : les retirer
+    rendrait ces lignes définitivement illisibles. Renvoie le nombre de clés retirées.
+    """
+    current = status()
+    credentials.reload()
+    if current is None or current['phase'] != 'done' or current['key_id'] != key_id(credentials.key):
+        raise RuntimeError('run the rotation to the end before retiring the old keys')
+    primary = Fernet(credentials.key)
+
+    def stale(value):
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = value.encode()
+        if not looks_encrypted(value):
+            return True
+        try:
+            primary.decrypt(value)
+            return False
+        except InvalidToken:
+            return True
+
+    for table, key, columns in PHASES:
+        last_id = 0
+        while True:
+            rows = _select(table, key, columns, last_id, batch_size)
+            if not rows:
+                break
+            ids = [row[0] for row in rows if any(stale(value) for value in row[1:])]
+            if ids:
+                with camera_db.transaction() as conn:
+                    # Relues sous le verrou d'écriture : valeurs à jour
+                    _rewrite(conn, table, key, columns, conn.execute(
+                        f'SELECT {key}, {", ".join(columns)} FROM {table} '
+                        f'WHERE {key} IN ({",".join("?" * len(ids))})', ids).fetchall())
+            last_id = rows[-1][0]
+
+    # Lignes toujours indéchiffrables (notées par la rotation ou par le contrôle ci-dessus,
+    # effacées si une clé ajoutée depuis les déchiffre ou si la caméra a été corrigée)
+    failed = []
+    for table, row_id in failed_rows():
+        key, columns = next((key, columns) for name, key, columns in PHASES if name == table)
+        row = camera_db.query_one(f'SELECT {", ".join(columns)} FROM {table} WHERE {key} = ?', (row_id,))
+        if row is None or not any(stale(value) for value in row):
+            camera_db.execute('DELETE FROM key_rotation_errors WHERE phase = ? AND row_id = ?', (table, row_id))
+        else:
+            failed.append(f'{table} {row_id}')
+    if failed:
+        raise RuntimeError(f"{len(failed)} row(s) cannot be decrypted with any key of the keyring "
+                           f"({', '.join(failed[:10])}{', ...' if len(failed) > 10 else ''}): "
+                           f"fix or delete them, then run retire again")
+
+    keyring = load_keyring(path)
+    retired = len(keyring['keys']) - 1
+    keyring['keys'] = keyring['keys'][:1]
+    save_keyring(keyring, path)
+    credentials.reload()
+    return retired
+
+
+def _print_progress(current):
+    done = current['rotated']
+    total = max(current['total'], 1)
+    sys.stdout.write(f"\r{current['phase']:<15} {done}/{current['total']} ({done * 100 // total}%)")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rotate the credential encryption keys.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('new-key', help='Add a new key in front of the keyring')
+    rotate_parser = subparsers.add_parser('rotate', help='Re-encrypt every value with the newest key')
+    rotate_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    rotate_parser.add_argument('--pause', type=float, default=BATCH_PAUSE,
+                               help='Seconds between two batches')
+    subparsers.add_parser('retire', help='Remove the old keys once the rotation is done')
+    subparsers.add_parser('status', help='Show the progress of the last rotation')
+    args = parser.parse_args()
+
+    if args.command == 'new-key':
+        print(f"new key {add_key()} added, run 'rotate' next")
+    elif args.command == 'rotate':
+        start = time.perf_counter()
+        try:
+            current = rotate(args.batch_size, args.pause, callback=_print_progress)
+        except KeyboardInterrupt:
+            print('\ninterrupted, run rotate again to resume')
+            sys.exit(1)
+        print(f"\n{current['rotated']} row(s) re-encrypted in {time.perf_counter() - start:.1f}s")
+        if current['failed']:
+            print(f"{len(current['failed'])} row(s) skipped: no key of the keyring decrypts them "
+                  f"('status' lists them)")
+    elif args.command == 'retire':
+        try:
+            print(f"{retire()} old key(s) retired")
+        except RuntimeError as e:
+            print(f"Cannot retire the old keys: {e}")
+            sys.exit(1)
+    else:
+        current = status()
+        credentials.reload()
+        print(f"{len(credentials.keys)} active key(s), encrypting with {key_id(credentials.key)}")
+        if current is not None:
+            print(f"last rotation to {current['key_id']}: {current['phase']}, "
+                  f"{current['rotated']}/{current['total']} row(s)")
+            for table, row_id in current['failed']:
+                print(f"  undecryptable: {table} {row_id}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Pool de processus pré-chauffés pour le lecteur et le contrôle PTZ.
+
+Chaque worker démarre l'interpréteur, importe vlc/onvif/PIL/tkinter et analyse les WSDL,
+puis attend un job JSON sur stdin. Les identifiants passent par le pipe, jamais par argv.
+"""
+import os
+import sys
+import json
+import runpy
+import shutil
+import threading
+import subprocess
+import functools
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = {
+    'player': 'player_vilkin_hikvision.py',
+    'ptz': 'ptz_keyboard_control.py',
+}
+
+# Nombre de workers prêts en permanence
+DEFAULT_POOL_SIZE = 2
+
+
+@functools.lru_cache(maxsize=None)
+def get_python39():
+    """Get Python 3.9 executable path (resolved once, `py -3.9` is slow to spawn)"""
+    python_exe = shutil.which("python3.9")
+    if not python_exe:
+        try:
+            python_exe = subprocess.check_output(
+                ["py", "-3.9", "-c", "import sys; print(sys.executable)"]
+            ).decode().strip()
+        except Exception:
+            python_exe = None
+    return python_exe
+
+
+class LauncherPool:
+    def __init__(self, python_exe, size=DEFAULT_POOL_SIZE):
+        self.python_exe = python_exe
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _spawn(self):
+        return subprocess.Popen([self.python_exe, os.path.abspath(__file__), '--worker'],
+                                stdin=subprocess.PIPE, cwd=SCRIPT_DIR)
+
+    def _refill(self):
+        while True:
+            with self._lock:
+                # Retirer les workers morts (erreur d'import, tués...)
+                self._idle = [p for p in self._idle if p.poll() is None]
+                if self._closed or len(self._idle) >= self.size:
+                    return
+            process = self._spawn()
+            with self._lock:
+                # Deux refill simultanés (lancements rapprochés) ont pu passer le test ci-dessus
+                surplus = self._closed or len(self._idle) >= self.size
+                if not surplus:
+                    self._idle.append(process)
+            if surplus:
+                process.terminate()
+                return
+
+    def refill(self):
+        """Complète le pool en arrière-plan"""
+        threading.Thread(target=self._refill, daemon=True).start()
+
+    def start(self):
+        self.refill()
+        return self
+
+    def _take(self):
+        with self._lock:
+            while self._idle:
+                process = self._idle.pop(0)
+                if process.poll() is None:
+                    return process
+        # Pool vide : démarrage à froid
+        return self._spawn()
+
+    @staticmethod
+    def _send(process, data):
+        try:
+            process.stdin.write(data)
+            process.stdin.close()
+        except OSError:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            raise
+
+    def launch(self, kind, camera_id, camera_ip, username, password):
+        """Confie un job à un worker prêt et renvoie son Popen"""
+        job = {
+            'script': SCRIPTS[kind],
+            'args': [str(camera_id), camera_ip, username, password],
+        }
+        data = (json.dumps(job) + '\n').encode()
+        process = self._take()
+        try:
+            self._send(process, data)
+        except OSError:
+            # Worker mort entre poll() et l'écriture (BrokenPipeError) : un nouvel essai, à froid
+            process = self._spawn()
+            self._send(process, data)
+        self.refill()
+        return process
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for process in idle:
+            try:
+                process.terminate()
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            except Exception as e:
+                print(f"Error closing worker: {e}")
+
+
+def _preload():
+    """Imports coûteux faits avant de recevoir le job"""
+    for module in ('vlc', 'tkinter', 'tkinter.ttk', 'PIL.Image', 'PIL.ImageTk', 'onvif_cache'):
+        try:
+            __import__(module)
+        except ImportError as e:
+            print(f"Worker preload: {e}")
+    try:
+        import onvif_client
+        onvif_client.preload()
+    except Exception as e:
+        print(f"Worker WSDL preload error: {e}")
+
+
+def worker_main():
+    sys.path.insert(0, SCRIPT_DIR)
+    _preload()
+
+    line = sys.stdin.readline()
+    if not line:
+        # Le parent est parti sans nous donner de travail
+        return
+    job = json.loads(line)
+    script_path = os.path.join(SCRIPT_DIR, job['script'])
+    # argv n'existe que dans ce processus : la ligne de commande OS reste "--worker"
+    sys.argv = [script_path] + job['args']
+    runpy.run_path(script_path, run_name='__main__')
+
+
+if __name__ == '__main__':
+    if '--worker' in sys.argv[1:]:
+        worker_main()
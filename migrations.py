@@ -0,0 +1,288 @@
+"""
+Migrations du schéma de la base, repérées par PRAGMA user_version.
+
+Chaque étape est idempotente et s'exécute dans sa transaction avec la mise à jour de
+user_version : une base à jour ne coûte qu'une lecture du PRAGMA au démarrage. Les étapes
+qui réécrivent des lignes avancent par lots (une transaction par lot, dernier id traité
+dans schema_progress) et reprennent où elles en étaient après une interruption.
+
+    python migrations.py            # met la base à jour et affiche la version
+"""
+import time
+import argparse
+import camera_db
+from camera_crypto import credentials, looks_encrypted, blind_index
+
+# Lignes réécrites par transaction dans les étapes par lots
+BATCH_SIZE = 1000
+
+# Base déjà mise à jour par ce processus (voir ensure_current)
+_current = False
+
+_PROGRESS = '''CREATE TABLE IF NOT EXISTS schema_progress
+               (version INTEGER PRIMARY KEY,
+                last_id INTEGER NOT NULL)'''
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_column(conn, table, column, definition):
+    if column not in _columns(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+# --- étapes ------------------------------------------------------------------------------
+# Une étape simple reçoit la connexion ; une étape par lots reçoit aussi le dernier id
+# traité et renvoie celui du lot, ou None quand il ne reste rien à faire.
+
+def create_cameras(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS cameras
+                    (id INTEGER PRIMARY KEY,
+                     ip TEXT,
+                     username TEXT,
+                     password TEXT)''')
+    _add_column(conn, 'cameras', 'ptz', 'INTEGER DEFAULT 0')
+
+
+def encrypt_credentials(conn, last_id, batch_size):
+    """Chiffre les identifiants écrits en clair avant l'ajout du chiffrement"""
+    rows = conn.execute('SELECT id, ip, username, password FROM cameras WHERE id > ? '
+                        'ORDER BY id LIMIT ?', (last_id, batch_size)).fetchall()
+    if not rows:
+        return None
+    # Contrôle structurel du jeton : aucune ligne n'est déchiffrée
+    plain = [(row[0], index, value) for row in rows for index, value in enumerate(row[1:])
+             if value is not None and not looks_encrypted(value)]
+    if plain:
+        tokens = credentials.encrypt_many([value for _, _, value in plain])
+        columns = ('ip', 'username', 'password')
+        for (camera_id, index, _), token in zip(plain, tokens):
+            conn.execute(f'UPDATE cameras SET {columns[index]} = ? WHERE id = ?', (token, camera_id))
+    return rows[-1][0]
+
+
+def add_blind_index(conn):
+    # Index aveugles (HMAC) : recherche et unicité sans déchiffrer les lignes
+    _add_column(conn, 'cameras', 'ip_bidx', 'BLOB')
+    _add_column(conn, 'cameras', 'username_bidx', 'BLOB')
+    conn.execute('CREATE INDEX IF NOT EXISTS cameras_ip_bidx ON cameras (ip_bidx)')
+    conn.execute('CREATE INDEX IF NOT EXISTS cameras_username_bidx ON cameras (username_bidx)')
+
+
+def backfill_blind_index(conn, last_id, batch_size):
+    """Index aveugles des lignes qui n'en ont pas"""
+    rows = conn.execute('SELECT id, ip, username FROM cameras '
+                        'WHERE ((ip_bidx IS NULL AND ip IS NOT NULL) '
+                        'OR (username_bidx IS NULL AND username IS NOT NULL)) AND id > ? '
+                        'ORDER BY id LIMIT ?', (last_id, batch_size)).fetchall()
+    if not rows:
+        return None
+    plain = credentials.decrypt_many([row[1] for row in rows] + [row[2] for row in rows])
+    count = len(rows)
+    conn.executemany('UPDATE cameras SET ip_bidx = ?, username_bidx = ? WHERE id = ?',
+                     [(blind_index('ip', plain[index]), blind_index('username', plain[count + index]),
+                       row[0]) for index, row in enumerate(rows)])
+    return rows[-1][0]
+
+
+def find_duplicate_ips():
+    """Groupes d'ids de caméras qui ont la même adresse (données antérieures à l'index)"""
+    rows = camera_db.query('SELECT group_concat(id) FROM cameras WHERE ip_bidx IS NOT NULL '
+                           'GROUP BY ip_bidx HAVING count(*) > 1')
+    return [[int(camera_id) for camera_id in row[0].split(',')] for row in rows]
+
+
+def create_onvif_metadata(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS onvif_metadata
+                    (camera_id INTEGER PRIMARY KEY,
+                     profiles BLOB,
+                     video_source_token TEXT,
+                     ptz_profile_token TEXT,
+                     fetched_at REAL)''')
+
+
+def create_recording_segments(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS recording_segments
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     camera_id TEXT NOT NULL,
+                     path TEXT NOT NULL UNIQUE,
+                     start_time REAL NOT NULL,
+                     end_time REAL NOT NULL,
+                     size INTEGER NOT NULL)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS recording_segments_camera
+                    ON recording_segments (camera_id, start_time)''')
+
+
+def create_camera_health(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS camera_health
+                    (camera_id INTEGER PRIMARY KEY,
+                     status TEXT NOT NULL,
+                     latency_ms REAL,
+                     http_open INTEGER NOT NULL,
+                     rtsp_open INTEGER NOT NULL,
+                     rtsp_ok INTEGER NOT NULL,
+                     onvif_ok INTEGER NOT NULL,
+                     error TEXT,
+                     checked_at REAL NOT NULL)''')
+
+
+def create_camera_changes(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS camera_changes
+                    (version INTEGER PRIMARY KEY AUTOINCREMENT,
+                     camera_id INTEGER NOT NULL,
+                     op TEXT NOT NULL,
+                     changed_at REAL NOT NULL)''')
+    # Horodatage Unix avec décimales (unixepoch('subsec') demande SQLite 3.42)
+    log = ("INSERT INTO camera_changes (camera_id, op, changed_at) "
+           "VALUES ({row}.id, '{op}', (julianday('now') - 2440587.5) * 86400.0);")
+    # Seules les colonnes affichées comptent : le remplissage des index aveugles ou une
+    # réécriture des mêmes valeurs ne réveillent pas les abonnés
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS cameras_insert_log AFTER INSERT ON cameras
+                     BEGIN {log.format(row='NEW', op='upsert')} END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS cameras_update_log
+                     AFTER UPDATE OF ip, username, password, ptz ON cameras
+                     WHEN OLD.ip IS NOT NEW.ip OR OLD.username IS NOT NEW.username
+                          OR OLD.password IS NOT NEW.password OR OLD.ptz IS NOT NEW.ptz
+                     BEGIN {log.format(row='NEW', op='upsert')} END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS cameras_delete_log AFTER DELETE ON cameras
+                     BEGIN {log.format(row='OLD', op='delete')} END''')
+
+
+def add_key_rotation(conn):
+    # Réchiffrement par key_rotation.py : key_epoch change, les valeurs en clair non. Le
+    # journal ignore ces lignes, sinon chaque lot réveillerait les abonnés pour rien.
+    _add_column(conn, 'cameras', 'key_epoch', 'INTEGER NOT NULL DEFAULT 0')
+    conn.execute('DROP TRIGGER IF EXISTS cameras_update_log')
+    conn.execute('''CREATE TRIGGER cameras_update_log
+                    AFTER UPDATE OF ip, username, password, ptz ON cameras
+                    WHEN (OLD.ip IS NOT NEW.ip OR OLD.username IS NOT NEW.username
+                          OR OLD.password IS NOT NEW.password OR OLD.ptz IS NOT NEW.ptz)
+                         AND OLD.key_epoch IS NEW.key_epoch
+                    BEGIN INSERT INTO camera_changes (camera_id, op, changed_at)
+                          VALUES (NEW.id, 'upsert', (julianday('now') - 2440587.5) * 86400.0); END''')
+    # Avancement de la rotation en cours (une seule ligne)
+    conn.execute('''CREATE TABLE IF NOT EXISTS key_rotation
+                    (id INTEGER PRIMARY KEY CHECK (id = 1),
+                     key_id TEXT NOT NULL,
+                     phase TEXT NOT NULL,
+                     last_id INTEGER NOT NULL,
+                     rotated INTEGER NOT NULL,
+                     total INTEGER NOT NULL,
+                     started_at REAL NOT NULL,
+                     finished_at REAL)''')
+
+
+def add_key_rotation_errors(conn):
+    # Lignes que la rotation n'a pas pu déchiffrer (clé absente du trousseau) : ignorées
+    # par le lot, elles empêchent de retirer les anciennes clés
+    conn.execute('''CREATE TABLE IF NOT EXISTS key_rotation_errors
+                    (phase TEXT NOT NULL,
+                     row_id INTEGER NOT NULL,
+                     error TEXT NOT NULL,
+                     PRIMARY KEY (phase, row_id))''')
+
+
+# Ordre fixe : la version d'une étape est sa position (1, 2, ...). Ne jamais modifier une
+# étape publiée, en ajouter une nouvelle à la fin.
+MIGRATIONS = [
+    ('cameras table', create_cameras, False),
+    ('encrypt clear-text credentials', encrypt_credentials, True),
+    ('blind index columns', add_blind_index, False),
+    ('blind index backfill', backfill_blind_index, True),
+    ('onvif_metadata table', create_onvif_metadata, False),
+    ('recording_segments table', create_recording_segments, False),
+    ('camera_health table', create_camera_health, False),
+    ('camera_changes log', create_camera_changes, False),
+    ('key rotation', add_key_rotation, False),
+    ('key rotation errors', add_key_rotation_errors, False),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn=None):
+    if conn is None:
+        return camera_db.query_one('PRAGMA user_version')[0]
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _run_step(version, step, batched, batch_size):
+    """Applique une étape ; False si un autre processus l'a déjà faite"""
+    if not batched:
+        with camera_db.transaction() as conn:
+            # Relu sous le verrou d'écriture : deux processus peuvent démarrer ensemble
+            if schema_version(conn) >= version:
+                return False
+            step(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        return True
+    while True:
+        with camera_db.transaction() as conn:
+            if schema_version(conn) >= version:
+                return False
+            conn.execute(_PROGRESS)
+            row = conn.execute('SELECT last_id FROM schema_progress WHERE version = ?',
+                               (version,)).fetchone()
+            last_id = step(conn, row[0] if row else 0, batch_size)
+            if last_id is None:
+                conn.execute('DELETE FROM schema_progress WHERE version = ?', (version,))
+                conn.execute(f'PRAGMA user_version = {version}')
+                return True
+            # Avancement enregistré dans la transaction du lot : reprise exacte
+            conn.execute('INSERT OR REPLACE INTO schema_progress (version, last_id) VALUES (?, ?)',
+                         (version, last_id))
+
+
+def upgrade(batch_size=BATCH_SIZE, verbose=False):
+    """Applique les étapes manquantes ; renvoie leurs descriptions (liste vide si à jour)"""
+    global _current
+    current = schema_version()
+    if current >= SCHEMA_VERSION:
+        _current = True
+        return []
+    applied = []
+    for version, (description, step, batched) in enumerate(MIGRATIONS, 1):
+        if version <= current:
+            continue
+        start = time.perf_counter()
+        if _run_step(version, step, batched, batch_size):
+            applied.append(description)
+            if verbose:
+                print(f"{version:>3} {description} ({time.perf_counter() - start:.2f}s)")
+    if 'blind index backfill' in applied:
+        # Quel que soit le processus qui migre (manager, import, découverte) : les doublons
+        # antérieurs à l'index ne sont pas refusés, seulement signalés
+        duplicates = find_duplicate_ips()
+        if duplicates:
+            print(f"Warning: cameras sharing an IP address: {duplicates}")
+    _current = True
+    return applied
+
+
+def ensure_current():
+    """upgrade() au premier appel du processus seulement : les modules qui lisent ou écrivent
+    leurs tables l'appellent avant chaque accès"""
+    if not _current:
+        upgrade()
+
+
+def reset_current():
+    """À appeler après camera_db.configure() : la nouvelle base sera vérifiée au prochain accès"""
+    global _current
+    _current = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upgrade the camera database schema.')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    before = schema_version()
+    applied = upgrade(args.batch_size, verbose=True)
+    print(f"schema version {before} -> {schema_version()} ({len(applied)} step(s) applied)")
+
+
+if __name__ == '__main__':
+    main()
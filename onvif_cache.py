@@ -0,0 +1,115 @@
+import json
+import time
+import camera_db
+import migrations
+from camera_crypto import credentials
+
+# Durée de validité des métadonnées ONVIF en cache (secondes)
+ONVIF_CACHE_TTL = 24 * 3600
+
+def _profile_info(media_service, profile, stream_setup):
+    """Résolution, débit et URI d'un profil média"""
+    encoder = getattr(profile, 'VideoEncoderConfiguration', None)
+    resolution = getattr(encoder, 'Resolution', None)
+    rate_control = getattr(encoder, 'RateControl', None)
+    try:
+        stream_uri = media_service.GetStreamUri({
+            'StreamSetup': stream_setup,
+            'ProfileToken': profile.token
+        }).Uri
+    except Exception as e:
+        print(f"GetStreamUri error for profile {profile.token}: {e}")
+        stream_uri = None
+    try:
+        snapshot_uri = media_service.GetSnapshotUri({'ProfileToken': profile.token}).Uri
+    except Exception:
+        # Fonction optionnelle : beaucoup de caméras ne la proposent pas
+        snapshot_uri = None
+    return {
+        'token': profile.token,
+        'name': getattr(profile, 'Name', None),
+        'encoding': getattr(encoder, 'Encoding', None),
+        'width': getattr(resolution, 'Width', 0) or 0,
+        'height': getattr(resolution, 'Height', 0) or 0,
+        'bitrate': getattr(rate_control, 'BitrateLimit', 0) or 0,
+        'stream_uri': stream_uri,
+        'snapshot_uri': snapshot_uri,
+    }
+
+
+def fetch_metadata(camera_ip, username, password, port=80, camera=None):
+    """Interroge la caméra (GetProfiles + GetStreamUri/GetSnapshotUri par profil)"""
+    if camera is None:
+        import onvif_client
+        camera = onvif_client.create_camera(camera_ip, username, password, port)
+    media_service = camera.create_media_service()
+    profiles = media_service.GetProfiles()
+    stream_setup = {'Stream': 'RTP-Unicast', 'Transport': 'RTSP'}
+
+    first = profiles[0]
+    ptz_profile = next((p for p in profiles if getattr(p, 'PTZConfiguration', None) is not None), first)
+    source_config = getattr(first, 'VideoSourceConfiguration', None)
+    return {
+        'profiles': [_profile_info(media_service, p, stream_setup) for p in profiles],
+        'video_source_token': getattr(source_config, 'SourceToken', None),
+        'ptz_profile_token': ptz_profile.token,
+    }
+
+
+def load(camera_id, ttl=ONVIF_CACHE_TTL):
+    """Métadonnées en cache pour la caméra, ou None si absentes/expirées"""
+    migrations.ensure_current()
+    row = camera_db.query_one(
+        'SELECT profiles, video_source_token, ptz_profile_token, fetched_at '
+        'FROM onvif_metadata WHERE camera_id = ?', (camera_id,))
+    if row is None or time.time() - row[3] > ttl:
+        return None
+    try:
+        # Les URI contiennent souvent les identifiants : la liste est stockée chiffrée
+        profiles = json.loads(credentials.decrypt(row[0]))
+    except ValueError:
+        return None
+    return {
+        'profiles': profiles,
+        'video_source_token': row[1],
+        'ptz_profile_token': row[2],
+    }
+
+
+def store(camera_id, metadata):
+    migrations.ensure_current()
+    camera_db.execute(
+        'INSERT OR REPLACE INTO onvif_metadata '
+        '(camera_id, profiles, video_source_token, ptz_profile_token, fetched_at) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (camera_id, credentials.encrypt(json.dumps(metadata['profiles'])),
+         metadata['video_source_token'], metadata['ptz_profile_token'], time.time()))
+
+
+def invalidate(camera_id):
+    migrations.ensure_current()
+    camera_db.execute('DELETE FROM onvif_metadata WHERE camera_id = ?', (camera_id,))
+
+
+def get_metadata(camera_id, camera_ip, username, password, refresh=False):
+    """
+    Renvoie les métadonnées ONVIF de la caméra, depuis le cache si possible.
+    camera_id None = pas de cache (caméra lancée hors base).
+    """
+    if camera_id is not None and not refresh:
+        metadata = load(camera_id)
+        if metadata is not None:
+            return metadata
+
+    metadata = fetch_metadata(camera_ip, username, password)
+    if camera_id is not None:
+        store(camera_id, metadata)
+    return metadata
+
+
+def parse_camera_id(value):
+    """Les scripts reçoivent l'id en argument texte"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,126 @@
+"""
+Clients ONVIF partagés : WSDL analysés une fois, session HTTP keep-alive par caméra.
+
+Le cache disque de zeep ne garde que les schémas distants téléchargés. Les WSDL analysés
+(Document zeep) ne peuvent pas être picklés : leur cache ne vit que dans le processus.
+Un nouveau processus paie donc toujours l'analyse au premier create_camera. Le gain au
+lancement d'une fenêtre (player, PTZ) vient des processus pré-chauffés de launcher.py, qui
+appellent preload() avant de recevoir une caméra. Mesure des deux cas :
+benchmarks/bench_onvif_startup.py.
+"""
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from zeep import Client, Settings
+from zeep.cache import SqliteCache
+from zeep.transports import Transport
+from zeep.wsdl import Document
+from onvif import ONVIFCamera, ONVIFService
+from onvif.client import UsernameDigestTokenDtDiff
+
+# Cache disque de zeep (schémas distants importés par les WSDL)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.onvif_cache')
+ZEEP_CACHE_FILE = os.path.join(CACHE_DIR, 'zeep_cache.db')
+ZEEP_CACHE_TTL = 30 * 24 * 3600
+
+# Timeout des requêtes SOAP (secondes)
+SOAP_TIMEOUT = 10
+
+# Connexions HTTP gardées ouvertes par caméra (media, ptz, imaging, ...)
+POOL_SIZE = 4
+
+DEFAULT_SERVICES = ('devicemgmt', 'media', 'ptz', 'imaging')
+
+_documents = {}
+_transports = {}
+_lock = threading.Lock()
+_zeep_cache = None
+
+
+def _settings():
+    settings = Settings()
+    settings.strict = False
+    settings.xml_huge_tree = True
+    return settings
+
+
+def _get_zeep_cache():
+    global _zeep_cache
+    if _zeep_cache is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _zeep_cache = SqliteCache(path=ZEEP_CACHE_FILE, timeout=ZEEP_CACHE_TTL)
+    return _zeep_cache
+
+
+def get_transport(host, port=80):
+    """Transport zeep partagé par tous les services d'une caméra (session keep-alive)"""
+    key = (host, int(port))
+    with _lock:
+        transport = _transports.get(key)
+        if transport is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            transport = Transport(session=session, cache=_get_zeep_cache(),
+                                  timeout=SOAP_TIMEOUT, operation_timeout=SOAP_TIMEOUT)
+            _transports[key] = transport
+        return transport
+
+
+def load_document(wsdl_file):
+    """
+    WSDL analysé une seule fois par processus, puis partagé entre caméras et services.
+    (Un Document zeep contient des types dynamiques et ne peut pas être picklé sur disque.)
+    """
+    with _lock:
+        document = _documents.get(wsdl_file)
+    if document is None:
+        document = Document(wsdl_file, Transport(cache=_get_zeep_cache()), settings=_settings())
+        with _lock:
+            document = _documents.setdefault(wsdl_file, document)
+    return document
+
+
+def preload(services=DEFAULT_SERVICES, wsdl_dir=None):
+    """Analyse à l'avance les WSDL des services donnés (ex. dans un processus pré-chauffé)"""
+    from onvif.definition import SERVICES
+    wsdl_dir = wsdl_dir or ONVIFCamera.__init__.__defaults__[0]
+    for name in services:
+        load_document(os.path.join(wsdl_dir, SERVICES[name]['wsdl']))
+
+
+class PooledONVIFCamera(ONVIFCamera):
+    """ONVIFCamera qui réutilise les WSDL analysés et la session HTTP de la caméra"""
+
+    def create_onvif_service(self, name, from_template=True, portType=None):
+        name = name.lower()
+        xaddr, wsdl_file, binding_name = self.get_definition(name, portType)
+
+        with self.services_lock:
+            wsse = UsernameDigestTokenDtDiff(self.user, self.passwd,
+                                             dt_diff=self.dt_diff, use_digest=self.encrypt)
+            zeep_client = Client(wsdl=load_document(wsdl_file), wsse=wsse,
+                                 transport=self.transport, settings=_settings())
+            service = ONVIFService(xaddr, self.user, self.passwd,
+                                   wsdl_file, self.encrypt,
+                                   self.daemon, zeep_client=zeep_client,
+                                   portType=portType,
+                                   dt_diff=self.dt_diff,
+                                   binding_name=binding_name,
+                                   transport=self.transport)
+
+            self.services[name] = service
+
+            setattr(self, name, service)
+            if not self.services_template.get(name):
+                self.services_template[name] = service
+
+        return service
+
+
+def create_camera(host, username, password, port=80):
+    """Point d'entrée unique pour créer un client ONVIF"""
+    return PooledONVIFCamera(host, port, username, password,
+                             transport=get_transport(host, port))
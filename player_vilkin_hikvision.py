@@ -1,20 +1,118 @@
 # V0.2.4
 
 import os
+import atexit
 from queue import Queue, Empty
 import threading
 import time
 import vlc
-import tkinter as tk
-from tkinter import Frame
-import tkinter.ttk as ttk
-from PIL import Image, ImageTk
-from onvif import ONVIFCamera
+try:
+    import tkinter as tk
+    from tkinter import Frame
+    import tkinter.ttk as ttk
+    from PIL import Image, ImageTk
+except ImportError:
+    # Serveur sans Tk/PIL : seul le mode --headless est disponible
+    tk = None
+import sys
+import signal
 import argparse
-from collections import deque
+from urllib.parse import urlsplit, urlunsplit, quote
+import onvif_cache
+from stream_supervisor import get_supervisor
+from stream_metrics import get_registry
+from prebuffer import (Prebuffer, get_hub, udp_destination, free_udp_port,
+                       CLIP_BEFORE, CLIP_AFTER, DEFAULT_CLIP_DIR)
+
+# Paramètres libVLC du lecteur (partagés par toutes les tuiles en mode grille)
+VLC_PARAMS = [
+    '--no-video-deco', '--no-embedded-video', '--rtsp-tcp',
+    '--network-caching=50', '--file-caching=50', '--live-caching=50',
+    '--no-skip-frames', '--drop-late-frames',
+    '--avcodec-threads=2', '--sout-mux-caching=0'
+]
+
+# Mode sans interface : pas de fenêtre ni de son, sortie vidéo nulle
+HEADLESS_PARAMS = [
+    '--rtsp-tcp', '--network-caching=300', '--live-caching=300',
+    '--no-xlib', '--vout=dummy', '--no-audio', '--quiet'
+]
+
+# Sans décodage : le flux est seulement démultiplexé (débit, progression du temps)
+HEADLESS_DEMUX_PARAMS = HEADLESS_PARAMS + ['--no-video']
+
+# Période du résumé affiché en mode sans interface (secondes)
+HEADLESS_REPORT_INTERVAL = 10
+
+# Dispositions disponibles pour le mur vidéo (lignes, colonnes)
+LAYOUTS = {
+    '1x1': (1, 1),
+    '2x2': (2, 2),
+    '3x3': (3, 3),
+    '4x4': (4, 4),
+}
+
+# Hystérésis : on ne redescend vers un profil plus léger que si la vidéo affichée
+# est nettement plus petite que sa résolution
+PROFILE_DOWNSWITCH_MARGIN = 0.85
+
+# Délai après le dernier redimensionnement avant de changer de profil (ms)
+PROFILE_SWITCH_DELAY = 600
+
+def get_profiles(camera_id, camera_ip, username, password):
+    # Aucun appel SOAP si les métadonnées de la caméra sont en cache
+    metadata = onvif_cache.get_metadata(onvif_cache.parse_camera_id(camera_id),
+                                        camera_ip, username, password)
+    return metadata['profiles']
+
+def _profile_cost(profile):
+    return (profile['width'] * profile['height'], profile['bitrate'])
+
+def select_profile(profiles, width=None, height=None, current=None):
+    """Profil le moins coûteux dont la résolution couvre la taille affichée"""
+    candidates = [p for p in profiles if p.get('stream_uri')]
+    sized = sorted((p for p in candidates if p['width'] and p['height']), key=_profile_cost)
+    if not sized:
+        # Résolutions inconnues : premier profil, comme avant
+        return candidates[0] if candidates else None
+    if not width or not height:
+        return sized[-1]
+
+    for profile in sized:
+        margin = 1.0
+        if current is not None and _profile_cost(profile) < _profile_cost(current):
+            margin = PROFILE_DOWNSWITCH_MARGIN
+        if profile['width'] * margin >= width and profile['height'] * margin >= height:
+            return profile
+    return sized[-1]
+
+def build_stream_uri(profile, camera_ip, username, password):
+    stream_uri = profile['stream_uri'] if profile else None
+    if not stream_uri:
+        return f"rtsp://{username}:{password}@{camera_ip}:554/Streaming/Channels/101"
+    if "@" not in stream_uri and username:
+        # Les caméras renvoient l'URI sans identifiants
+        parts = urlsplit(stream_uri)
+        netloc = f"{quote(username, safe='')}:{quote(password or '', safe='')}@{parts.netloc}"
+        stream_uri = urlunsplit(parts._replace(netloc=netloc))
+    return stream_uri
+
+def resolve_stream_uri(camera_id, camera_ip, username, password, width=None, height=None):
+    profiles = get_profiles(camera_id, camera_ip, username, password)
+    return build_stream_uri(select_profile(profiles, width, height), camera_ip, username, password)
+
+def attach_window(player, handle):
+    """Attache la sortie vidéo à une fenêtre native selon la plateforme"""
+    if sys.platform.startswith('win'):
+        player.set_hwnd(handle)
+    elif sys.platform == 'darwin':
+        player.set_nsobject(handle)
+    else:
+        player.set_xwindow(handle)
 
 class VideoStream:
-    def __init__(self, stream_uri, instance_params=None):
+    def __init__(self, stream_uri, instance_params=None, instance=None, name=None,
+                 prebuffer_capacity=0, frame_bus=None):
         if instance_params is None:
             instance_params = [
                 '--no-video-deco',
@@ -29,120 +127,126 @@ class VideoStream:
                 '--log-verbose=2'
             ]
         self.stream_uri = stream_uri
-        self.instance = vlc.Instance(*instance_params)
+        self.name = name or urlsplit(stream_uri).hostname or stream_uri
+        # Une instance libVLC partagée évite de recharger le cache des plugins par flux
+        self.instance = instance if instance is not None else vlc.Instance(*instance_params)
         self.player = self.instance.media_player_new()
-        self.media = self.instance.media_new(stream_uri)
+        # Pré-enregistrement en mémoire des paquets compressés (désactivé si 0)
+        self.prebuffer = Prebuffer(self.name, prebuffer_capacity) if prebuffer_capacity else None
+        # Bus d'images : (largeur, hauteur) publiées en mémoire partagée (désactivé si None)
+        self.frame_bus = frame_bus
+        self.bus_port = free_udp_port() if frame_bus else None
+        self.bus_tap = None
+        self.bus_publisher = None
+        self.media = self._new_media(stream_uri)
         self.player.set_media(self.media)
         self.running = False
         self.status_queue = Queue()
-        self._last_state = None
-        self._frame_count = 0
-        self._bitrate_samples = deque(maxlen=5)  # Utilisation de deque pour une moyenne mobile
-        self._last_bytes = 0
-        self._last_time = time.time()
         self.is_muted = False
-        self._no_update_count = 0
-        self._last_bitrate_value = 0
-        self._restart_attempt = 0  # Compteur de tentatives de redémarrage
-        self._max_restart_delay = 30  # Délai maximum entre les tentatives (en secondes)
-        
-        # Event handler pour les frames
-        self.player.event_manager().event_attach(vlc.EventType.MediaPlayerTimeChanged, 
-                                               lambda _: self._increment_frame())
-    
-    def _increment_frame(self):
-        self._frame_count += 1
+        self.metrics = None
+        self._restart_lock = threading.Lock()
+
+    def _new_media(self, stream_uri):
+        media = self.instance.media_new(stream_uri)
+        outputs = []
+        if self.prebuffer is not None:
+            outputs.append(self.prebuffer.sout_destination())
+        if self.bus_port is not None:
+            outputs.append(udp_destination(self.bus_port))
+        if outputs:
+            # Affichage + copies TS sans transcodage (pré-enregistrement, bus d'images)
+            media.add_option(":sout=#duplicate{dst=display,"
+                             + ",".join(f"dst={output}" for output in outputs) + "}")
+        return media
+
+    def _start_frame_bus(self):
+        from frame_tap import FrameTap
+        from frame_bus import FramePublisher
+        width, height = self.frame_bus
+        if self.bus_publisher is None:
+            try:
+                self.bus_publisher = FramePublisher(self.name, width, height)
+            except FileExistsError as e:
+                # Un autre lecteur publie déjà ce flux : ses abonnés restent servis
+                print(f"Frame bus disabled: {e}")
+                self.frame_bus = None
+                return
+            # Décode la copie locale du flux : pas de seconde session RTSP vers la caméra
+            self.bus_tap = FrameTap(f"udp://@127.0.0.1:{self.bus_port}", self.instance,
+                                    (width, height), name=f"{self.name}-bus",
+                                    media_options=(':network-caching=100',))
+            self.bus_tap.listeners.append(self.bus_publisher.publish)
+            atexit.register(self._close_frame_bus)
+        self.bus_tap.start()
+
+    def _close_frame_bus(self):
+        if self.bus_tap is not None:
+            self.bus_tap.stop()
+        if self.bus_publisher is not None:
+            self.bus_publisher.close()
+            self.bus_publisher = None
 
     def start(self):
         self.running = True
+        # Le superviseur du processus surveille ce flux via les événements libVLC
+        get_supervisor().register(self)
+        self.metrics = get_registry().register(self, self.name)
+        if self.prebuffer is not None:
+            try:
+                # Socket fermé par stop() (tuile masquée du mur vidéo) : rouvert sur le même port
+                self.prebuffer.open()
+                get_hub().register(self.prebuffer)
+            except OSError as e:
+                print(f"Prebuffer {self.name} unavailable: {e}")
         self.player.play()
+        if self.frame_bus is not None:
+            self._start_frame_bus()
         self.player.audio_set_mute(self.is_muted)
-        threading.Thread(target=self._monitor_stream, daemon=True).start()
 
     def stop(self):
         self.running = False
-        self.player.stop()
-
-    def _monitor_stream(self):
-        last_bitrate_ts = time.time()
-        zero_bitrate_count = 0  # Compteur pour les bitrates nuls consécutifs
-        
-        while self.running:
-            state = self.player.get_state()
-            
-            # Vérifie les états critiques (ajout de Ended)
-            if state in (vlc.State.Error, vlc.State.Stopped, vlc.State.Ended):
-                self.status_queue.put(f"restart-state-{state}")
-                self._restart_player()
-                zero_bitrate_count = 0  # Reset du compteur après redémarrage
-                time.sleep(10)  # Attendre 10 secondes avant de recommencer à vérifier
-                continue  # Passe au prochain cycle pour vérifier le nouveau état
-            
-            bitrate = self.get_bitrate()
-            if bitrate == "--" or float(bitrate) == 0.0:
-                zero_bitrate_count += 1
-                
-                if zero_bitrate_count >= 3:  # 3 lectures nulles consécutives
-                    self.status_queue.put("restart-zero-bitrate")
-                    self._restart_player()
-                    zero_bitrate_count = 0
-                    time.sleep(10)  # Attendre 10 secondes avant de recommencer à vérifier
-            else:
-                zero_bitrate_count = 0  # Reset du compteur si on reçoit un bitrate valide
-                last_bitrate_ts = time.time()
-                self._restart_attempt = 0  # Réinitialise le compteur si tout va bien
-            
-            self._last_state = state
-            time.sleep(2)
-
-    def _restart_player(self):
-        self._restart_attempt += 1
-        delay = min(5 * self._restart_attempt, self._max_restart_delay)  # Délai progressif
-        
-        time.sleep(delay)  # Attente progressive
-        
-        self.player.stop()
-        time.sleep(1)  # Petit délai pour laisser le temps à VLC de se réinitialiser
-        self.player.set_media(self.media)
-        self.player.play()
-        time.sleep(2)  # Délai pour laisser le temps au flux de redémarrer
+        get_supervisor().unregister(self)
+        get_registry().unregister(self)
+        if self.prebuffer is not None:
+            get_hub().unregister(self.prebuffer)
+            self.prebuffer.close()
+        if self.bus_tap is not None:
+            self.bus_tap.stop()
+        with self._restart_lock:
+            self.player.stop()
+
+    def switch_uri(self, stream_uri):
+        """Change de flux (principal <-> secondaire) sans recréer le lecteur ni la fenêtre"""
+        self.stream_uri = stream_uri
+        self.media = self._new_media(stream_uri)
+        with self._restart_lock:
+            self.player.set_media(self.media)
+            if self.running:
+                get_supervisor().restarting(self)
+                self.player.play()
+                self.player.audio_set_mute(self.is_muted)
+
+    def restart(self):
+        """Relance le lecteur (appelé par le superviseur, sans attente)"""
+        with self._restart_lock:
+            if not self.running:
+                return
+            self.player.stop()
+            self.player.set_media(self.media)
+            self.player.play()
+            self.player.audio_set_mute(self.is_muted)
 
     def get_bitrate(self):
-        stats = vlc.MediaStats()
-        current_time = time.time()
-
-        # Pas de stats ?
-        if not self.player.get_media().get_stats(stats):
-            self._no_update_count += 1
-            if self._no_update_count <= 3:
-                return self._last_bitrate_value
+        """Débit moyen (Mbps) échantillonné par le registre de métriques, "--" si inconnu"""
+        if self.metrics is None:
             return "--"
+        return self.metrics.bitrate()
 
-        current_bytes = stats.demux_read_bytes or 0
-        time_diff = current_time - self._last_time
-
-        # Calcul d'un nouveau bitrate
-        if self._last_bytes > 0 and time_diff >= 1.0:
-            bytes_diff = current_bytes - self._last_bytes
-            bitrate = (bytes_diff * 8) / (time_diff * 1_000_000)
-            self._bitrate_samples.append(bitrate)
-
-            self._last_bitrate_value = max(
-                0,
-                min(sum(self._bitrate_samples) / len(self._bitrate_samples), 100)
-            )
-
-            self._last_bytes = current_bytes
-            self._last_time = current_time
-            self._no_update_count = 0
-
-            return self._last_bitrate_value
-
-        self._last_bytes = current_bytes
-        self._last_time = current_time
-        self._no_update_count = 0
-
-        return self._last_bitrate_value
+    def export_clip(self, path=None, before=CLIP_BEFORE, after=CLIP_AFTER):
+        """Clip TS des `before` dernières secondes et des `after` suivantes (bloquant)"""
+        if self.prebuffer is None:
+            raise RuntimeError("Prebuffer is disabled for this stream")
+        return self.prebuffer.export_clip(path or self.prebuffer.clip_path(), before, after)
 
 class ButtonStyle:
     def __init__(self, 
@@ -176,45 +280,52 @@ class ButtonStyle:
 class VideoPlayer:
     CONTROL_BAR_HEIGHT = 40
 
-    def __init__(self, camera_id, camera_ip, username, password):
+    def __init__(self, camera_id, camera_ip, username, password, stream_uri=None,
+                 prebuffer_capacity=0, clip_dir=DEFAULT_CLIP_DIR, motion=None, frame_bus=None):
         self.camera_id = camera_id
         self.camera_ip = camera_ip
-        self.stream_uri = self._get_stream_uri(camera_ip, username, password)
+        self.username = username
+        self.password = password
+        self.profiles = []
+        self.current_profile = None
+        self._profile_job = None
+        if stream_uri is None:
+            self.profiles = get_profiles(camera_id, camera_ip, username, password)
+            self.current_profile = select_profile(self.profiles, 800, 600)
+            stream_uri = build_stream_uri(self.current_profile, camera_ip, username, password)
+        self.stream_uri = stream_uri
         self.video_ratio = 0
         self.root = None
         self.frame = None
         self.control_bar = None
         self.bitrate_label = None
+        self.motion_label = None
         self.mute_button = None
         self.volume_up_icon = None
         self.volume_mute_icon = None
         self.button_style = ButtonStyle()  # Ajout du style de bouton
         self.base_title = f"Camera {camera_id}"  # Changed from "Caméra" to "Camera"
         
-        vlc_params = [
-            '--no-video-deco', '--no-embedded-video', '--rtsp-tcp',
-            '--network-caching=50', '--file-caching=50', '--live-caching=50',
-            '--no-skip-frames', '--drop-late-frames',
-            '--avcodec-threads=2', '--sout-mux-caching=0'
-        ]
-        
-        self.video_stream = VideoStream(self.stream_uri, vlc_params)
+        self.clip_dir = clip_dir
+        self.video_stream = VideoStream(self.stream_uri, VLC_PARAMS, name=camera_id,
+                                        prebuffer_capacity=prebuffer_capacity, frame_bus=frame_bus)
+        self.frame_tap = self.create_frame_tap(motion) if motion is not None else None
         self.setup_gui()
 
-    def _get_stream_uri(self, camera_ip, username, password):
-        camera = ONVIFCamera(camera_ip, 80, username, password)
-        media_service = camera.create_media_service()
-        media_profile = media_service.GetProfiles()[0]
-        
-        stream_uri = media_service.GetStreamUri({
-            'StreamSetup': {'Stream': 'RTP-Unicast', 'Transport': 'RTSP'},
-            'ProfileToken': media_profile.token
-        }).Uri
-
-        if "@" not in stream_uri:
-            stream_uri = f"rtsp://{username}:{password}@{camera_ip}:554/Streaming/Channels/101"
-        
-        return stream_uri
+    def create_frame_tap(self, motion):
+        """Analyse de mouvement optionnelle sur le profil le plus léger qui couvre la taille d'analyse"""
+        from frame_tap import (FrameTap, MotionDetector, build_mask, DEFAULT_TAP_SIZE,
+                               MOTION_THRESHOLD, MOTION_MIN_AREA)
+        width, height = motion.get('size', DEFAULT_TAP_SIZE)
+        detector = MotionDetector(width, height, motion.get('threshold', MOTION_THRESHOLD),
+                                  motion.get('min_area', MOTION_MIN_AREA),
+                                  build_mask(width, height, motion.get('regions')))
+        tap_uri = self.stream_uri
+        if self.profiles:
+            tap_uri = build_stream_uri(select_profile(self.profiles, width, height),
+                                       self.camera_ip, self.username, self.password)
+        return FrameTap(tap_uri, self.video_stream.instance, (width, height), detector,
+                        name=f"{self.camera_id}-motion")
 
     def setup_gui(self):
         self.root = tk.Tk()
@@ -230,6 +341,8 @@ class VideoPlayer:
         
         # Configuration des événements
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        if self.video_stream.prebuffer is not None:
+            self.root.bind("<F9>", self.save_clip)
         self.root.after(500, self.initial_resize)
         self.root.after(1000, self.check_stream_status)
         self.root.after(1000, self.update_bitrate)
@@ -278,6 +391,16 @@ class VideoPlayer:
         )
         self.bitrate_label.pack(side=tk.RIGHT, padx=10)
 
+        if self.frame_tap is not None:
+            self.motion_label = tk.Label(
+                right_container,
+                text="Motion",
+                fg="#606060",
+                bg='#2b2b2b',
+                font=('Arial', 9, 'bold')
+            )
+            self.motion_label.pack(side=tk.RIGHT, padx=5)
+
     def toggle_mute(self):
         self.video_stream.is_muted = not self.video_stream.is_muted
         self.video_stream.player.audio_set_mute(self.video_stream.is_muted)
@@ -300,7 +423,7 @@ class VideoPlayer:
             total_height = window_height + self.CONTROL_BAR_HEIGHT
             self.root.geometry(f"{window_width}x{total_height}")
             self.frame.config(width=window_width, height=window_height)
-            self.video_stream.player.set_hwnd(self.frame.winfo_id())
+            attach_window(self.video_stream.player, self.frame.winfo_id())
             self.root.bind("<Configure>", self.resize)
         else:
             self.root.after(500, self.initial_resize)
@@ -323,38 +446,314 @@ class VideoPlayer:
             new_height = int(window_width / self.video_ratio)
             
         self.frame.config(width=new_width, height=new_height)
-        self.video_stream.player.set_hwnd(self.frame.winfo_id())
+        attach_window(self.video_stream.player, self.frame.winfo_id())
+        self.schedule_profile_update(new_width, new_height)
+
+    def schedule_profile_update(self, width, height):
+        if len(self.profiles) < 2:
+            return
+        # Attendre la fin du redimensionnement avant de changer de flux
+        if self._profile_job is not None:
+            self.root.after_cancel(self._profile_job)
+        self._profile_job = self.root.after(PROFILE_SWITCH_DELAY,
+                                            lambda: self.update_profile(width, height))
+
+    def update_profile(self, width, height):
+        self._profile_job = None
+        profile = select_profile(self.profiles, width, height, self.current_profile)
+        if profile is None or profile is self.current_profile:
+            return
+        print(f"Switching to profile {profile['name']} ({profile['width']}x{profile['height']}) "
+              f"for {width}x{height}")
+        self.current_profile = profile
+        self.video_stream.switch_uri(
+            build_stream_uri(profile, self.camera_ip, self.username, self.password))
 
     def check_stream_status(self):
         try:
-            msg = self.video_stream.status_queue.get_nowait()
-            if msg == "restart":
-                print("Stream frozen, restarting...")  # Changed from "Flux figé, redémarrage..."
+            while True:
+                msg = self.video_stream.status_queue.get_nowait()
+                if msg.startswith("restart"):
+                    print(f"Stream frozen, restarting... ({msg})")  # Changed from "Flux figé, redémarrage..."
+                elif msg.startswith("circuit-open"):
+                    print(f"Stream keeps failing, retrying later ({msg})")
         except Empty:
             pass
         finally:
-            self.root.after(2000, self.check_stream_status)
+            if self.frame_tap is not None:
+                self.check_motion()
+            self.root.after(500, self.check_stream_status)
+
+    def check_motion(self):
+        try:
+            while True:
+                self.frame_tap.status_queue.get_nowait()
+        except Empty:
+            pass
+        try:
+            while True:
+                event, level, timestamp = self.frame_tap.events.get_nowait()
+                print(f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {event} "
+                      f"({level:.1%} of pixels, {self.frame_tap.ms_per_frame():.2f} ms/frame)")
+                self.motion_label.config(fg='#ff4040' if event == 'motion-start' else '#606060')
+        except Empty:
+            pass
+
+    def save_clip(self, event=None):
+        """F9 : exporte le clip autour de maintenant sans bloquer l'interface"""
+        path = self.video_stream.prebuffer.clip_path(self.clip_dir)
+        print(f"Saving clip to {path} ({CLIP_BEFORE}s before, {CLIP_AFTER}s after)")
+
+        def export():
+            try:
+                self.video_stream.export_clip(path)
+                print(f"Clip saved: {path}")
+            except Exception as e:
+                print(f"Clip export error: {e}")
+        threading.Thread(target=export, daemon=True).start()
 
     def update_bitrate(self):
         try:
             bitrate = self.video_stream.get_bitrate()
-            self.bitrate_label.config(
-                text=f"{bitrate:.2f} Mbps" if isinstance(bitrate, (int, float)) and bitrate > 0 else "-- Mbps"
-            )
+            text = f"{bitrate:.2f} Mbps" if isinstance(bitrate, (int, float)) and bitrate > 0 else "-- Mbps"
+            prebuffer = self.video_stream.metrics.prebuffer() if self.video_stream.metrics else None
+            if prebuffer is not None:
+                text += f" | buffer {prebuffer[2]:.0f}s"
+            self.bitrate_label.config(text=text)
         except Exception:
             self.bitrate_label.config(text="-- Mbps")
         finally:
             self.root.after(1000, self.update_bitrate)
 
     def on_closing(self):
+        if self.frame_tap is not None:
+            self.frame_tap.stop()
         self.video_stream.stop()
         self.root.destroy()
 
     def run(self):
-        self.video_stream.player.set_hwnd(self.frame.winfo_id())
+        attach_window(self.video_stream.player, self.frame.winfo_id())
         self.video_stream.start()
+        if self.frame_tap is not None:
+            self.frame_tap.start()
+        self.root.mainloop()
+
+class VideoWall:
+    """Mur vidéo : N tuiles VideoStream dans un seul processus, sur une seule instance libVLC"""
+    TILE_BG = '#000000'
+    TITLE_BG = '#2b2b2b'
+    WIDTH = 1280
+    HEIGHT = 720
+
+    def __init__(self, sources, layout=None):
+        # sources : liste de (titre, stream_uri)
+        self.sources = sources
+        self.layout = layout or self.fit_layout(len(sources))
+        self.instance = vlc.Instance(*VLC_PARAMS)
+        self.tiles = []
+        self.root = None
+        self.grid_frame = None
+        self.layout_var = None
+        self.setup_gui()
+
+    @staticmethod
+    def fit_layout(count):
+        """Plus petite disposition qui contient toutes les caméras"""
+        for name, (rows, cols) in LAYOUTS.items():
+            if rows * cols >= count:
+                return name
+        return '4x4'
+
+    def setup_gui(self):
+        self.root = tk.Tk()
+        self.root.title(f"Video Wall ({len(self.sources)} cameras)")
+        self.root.geometry(f"{self.WIDTH}x{self.HEIGHT + VideoPlayer.CONTROL_BAR_HEIGHT}")
+        self.root.configure(bg=self.TILE_BG)
+
+        self.grid_frame = Frame(self.root, bg=self.TILE_BG)
+        self.grid_frame.pack(fill=tk.BOTH, expand=True)
+
+        control_bar = Frame(self.root, height=VideoPlayer.CONTROL_BAR_HEIGHT, bg=self.TITLE_BG)
+        control_bar.pack(fill=tk.X, side=tk.BOTTOM)
+        self.layout_var = tk.StringVar(value=self.layout)
+        layout_menu = tk.OptionMenu(control_bar, self.layout_var, *LAYOUTS.keys(),
+                                    command=self.set_layout)
+        layout_menu.config(bg=self.TITLE_BG, fg='white', highlightthickness=0, bd=0)
+        layout_menu.pack(side=tk.LEFT, padx=5, pady=5)
+
+        for title, stream_uri in self.sources:
+            tile = Frame(self.grid_frame, bg=self.TILE_BG, highlightthickness=1,
+                         highlightbackground=self.TITLE_BG)
+            header = Frame(tile, bg=self.TITLE_BG)
+            header.pack(fill=tk.X, side=tk.TOP)
+            tk.Label(header, text=title, fg='white', bg=self.TITLE_BG,
+                     font=('Arial', 9)).pack(side=tk.LEFT, padx=5)
+            bitrate_label = tk.Label(header, text="-- Mbps", fg='white', bg=self.TITLE_BG,
+                                     font=('Arial', 9))
+            bitrate_label.pack(side=tk.RIGHT, padx=5)
+            video = Frame(tile, bg=self.TILE_BG)
+            video.pack(fill=tk.BOTH, expand=True)
+
+            stream = VideoStream(stream_uri, instance=self.instance, name=title)
+            stream.is_muted = True  # Pas de son en mode mur
+            self.tiles.append({'title': title, 'frame': tile, 'video': video, 'stream': stream,
+                               'bitrate_label': bitrate_label, 'visible': False})
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.root.after(1000, self.update_bitrates)
+
+    def set_layout(self, layout):
+        self.layout = layout
+        rows, cols = LAYOUTS[layout]
+        for index in range(4):
+            self.grid_frame.grid_rowconfigure(index, weight=1 if index < rows else 0, uniform='row')
+            self.grid_frame.grid_columnconfigure(index, weight=1 if index < cols else 0, uniform='col')
+
+        for index, tile in enumerate(self.tiles):
+            if index < rows * cols:
+                tile['frame'].grid(row=index // cols, column=index % cols, sticky='nsew')
+                if not tile['visible']:
+                    self.root.update_idletasks()
+                    attach_window(tile['stream'].player, tile['video'].winfo_id())
+                    tile['stream'].start()
+                    tile['visible'] = True
+            else:
+                # Hors de la grille : on arrête le décodage
+                tile['frame'].grid_remove()
+                if tile['visible']:
+                    tile['stream'].stop()
+                    tile['visible'] = False
+
+    def update_bitrates(self):
+        for tile in self.tiles:
+            if not tile['visible']:
+                continue
+            try:
+                while True:
+                    msg = tile['stream'].status_queue.get_nowait()
+                    if msg != "playing":
+                        print(f"{tile['title']}: {msg}")
+            except Empty:
+                pass
+            try:
+                bitrate = tile['stream'].get_bitrate()
+                tile['bitrate_label'].config(
+                    text=f"{bitrate:.2f} Mbps" if isinstance(bitrate, (int, float)) and bitrate > 0 else "-- Mbps"
+                )
+            except Exception:
+                tile['bitrate_label'].config(text="-- Mbps")
+        self.root.after(1000, self.update_bitrates)
+
+    def on_closing(self):
+        for tile in self.tiles:
+            tile['stream'].stop()
+        self.root.destroy()
+
+    def run(self):
+        self.set_layout(self.layout)
         self.root.mainloop()
 
+def load_wall_sources(camera_ids, layout=None):
+    """Caméras du mur depuis la base (toutes si aucun id n'est donné), flux adapté à la tuile"""
+    wanted = {int(camera_id) for camera_id in camera_ids}
+    if wanted:
+        count = len(wanted)
+    else:
+        import camera_db
+        count = camera_db.query_one('SELECT COUNT(*) FROM cameras')[0]
+    rows_count, cols_count = LAYOUTS[layout or VideoWall.fit_layout(count)]
+    return load_camera_sources(camera_ids, VideoWall.WIDTH // cols_count,
+                               VideoWall.HEIGHT // rows_count)
+
+def load_camera_sources(camera_ids, width=None, height=None):
+    """(titre, stream_uri) des caméras de la base, toutes si aucun id n'est donné"""
+    import camera_repository
+    wanted = sorted({int(camera_id) for camera_id in camera_ids})
+    fields = ('ip', 'username', 'password')
+    cameras = (camera_repository.fetch(wanted, fields) if wanted
+               else camera_repository.get_cameras(fields))
+    sources = []
+    for camera in camera_repository.load_passwords(cameras):
+        try:
+            sources.append((f"Camera {camera.id}",
+                            resolve_stream_uri(camera.id, camera.ip, camera.username, camera.password,
+                                               width, height)))
+        except Exception as e:
+            print(f"Error loading camera {camera.id}: {e}")
+    return sources
+
+class HeadlessMonitor:
+    """Supervision et métriques des flux sans fenêtre (serveur Linux, CI)"""
+
+    def __init__(self, sources, decode=False, report_interval=HEADLESS_REPORT_INTERVAL,
+                 frame_bus=None):
+        # sources : liste de (titre, stream_uri)
+        self.sources = sources
+        self.report_interval = report_interval
+        # --no-video désélectionne aussi la vidéo de la copie destinée au bus d'images
+        decode = decode or frame_bus is not None
+        self.instance = vlc.Instance(*(HEADLESS_PARAMS if decode else HEADLESS_DEMUX_PARAMS))
+        self.streams = [VideoStream(stream_uri, instance=self.instance, name=title, frame_bus=frame_bus)
+                        for title, stream_uri in sources]
+        self.played = set()
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def drain_status(self):
+        for stream in self.streams:
+            try:
+                while True:
+                    msg = stream.status_queue.get_nowait()
+                    if msg == "playing":
+                        self.played.add(stream.name)
+                    print(f"{time.strftime('%H:%M:%S')} {stream.name}: {msg}", flush=True)
+            except Empty:
+                pass
+
+    def report(self):
+        supervisor = get_supervisor()
+        for stream in self.streams:
+            entry = supervisor.get(stream)
+            metrics = stream.metrics
+            fps = metrics.decoded_fps.latest() if metrics else 0.0
+            bitrate = stream.get_bitrate()
+            bitrate = f"{bitrate:.2f}" if isinstance(bitrate, (int, float)) else bitrate
+            print(f"{time.strftime('%H:%M:%S')} {stream.name}: "
+                  f"state={entry.state if entry else '-'} restarts={entry.restarts if entry else 0} "
+                  f"fps={fps:.1f} bitrate={bitrate} Mbps", flush=True)
+
+    def run(self, duration=None):
+        """Tourne jusqu'à SIGINT/SIGTERM ou `duration` secondes ; 0 si tous les flux sont lus"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+        for stream in self.streams:
+            stream.start()
+
+        deadline = time.monotonic() + duration if duration else None
+        next_report = time.monotonic() + self.report_interval
+        while not self._stop.wait(0.5):
+            self.drain_status()
+            now = time.monotonic()
+            if now >= next_report:
+                self.report()
+                next_report = now + self.report_interval
+            if deadline is not None and now >= deadline:
+                break
+
+        self.drain_status()
+        self.report()
+        supervisor = get_supervisor()
+        failed = [stream.name for stream in self.streams
+                  if stream.name not in self.played
+                  or getattr(supervisor.get(stream), 'state', None) != 'playing']
+        for stream in self.streams:
+            stream.stop()
+        if failed:
+            print(f"Streams not playing: {', '.join(failed)}", flush=True)
+        return 1 if failed else 0
+
 class PlayerVilkinHikvision:
     def __init__(self):
         self.player = vlc.MediaPlayer()
@@ -366,13 +765,89 @@ class PlayerVilkinHikvision:
 
 def main():
     parser = argparse.ArgumentParser(description='Launch ONVIF camera video stream.')  # Changed from 'Lancer le flux vidéo de la caméra ONVIF.'
-    parser.add_argument('camera_id', type=str, help='Camera ID')  # Changed from 'ID de la caméra'
-    parser.add_argument('camera_ip', type=str, help='Camera IP address')  # Changed from 'Adresse IP de la caméra'
+    parser.add_argument('camera_id', type=str, nargs='?', help='Camera ID')  # Changed from 'ID de la caméra'
+    parser.add_argument('camera_ip', type=str, nargs='?', help='Camera IP address')  # Changed from 'Adresse IP de la caméra'
     parser.add_argument('username', type=str, nargs='?', default=os.getenv('CAMERA_USERNAME'))
     parser.add_argument('password', type=str, nargs='?', default=os.getenv('CAMERA_PASSWORD'))
+    parser.add_argument('--uri', action='append', default=[],
+                        help='Stream URI to play directly, without ONVIF (repeatable)')
+    parser.add_argument('--grid', type=int, nargs='*', metavar='CAMERA_ID',
+                        help='Video wall of the given cameras (all cameras if no id)')
+    parser.add_argument('--layout', choices=list(LAYOUTS), help='Video wall layout')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Expose Prometheus metrics on 127.0.0.1:PORT/metrics')
+    parser.add_argument('--headless', type=int, nargs='*', metavar='CAMERA_ID',
+                        help='Supervise the given cameras (all if no id) and --uri sources without GUI')
+    parser.add_argument('--decode', action='store_true',
+                        help='Headless: decode video to a null output instead of demuxing only')
+    parser.add_argument('--duration', type=float,
+                        help='Headless: stop after N seconds, exit 1 if a stream is not playing')
+    parser.add_argument('--prebuffer-mb', type=float, default=0,
+                        help='Keep the last compressed packets in memory (MB), F9 saves a clip')
+    parser.add_argument('--clip-dir', default=DEFAULT_CLIP_DIR, help='Directory of saved clips')
+    parser.add_argument('--frame-bus', metavar='WxH',
+                        help='Publish WxH grey frames to shared memory for analytics workers (requires numpy)')
+    parser.add_argument('--motion', action='store_true',
+                        help='Motion detection on decoded frames (requires numpy)')
+    parser.add_argument('--motion-size', default='320x180', help='Analysis resolution WxH')
+    parser.add_argument('--motion-threshold', type=int, default=25,
+                        help='Luma difference for a pixel to count as changed')
+    parser.add_argument('--motion-area', type=float, default=0.01,
+                        help='Fraction of masked pixels that must change')
+    parser.add_argument('--motion-mask', action='append', metavar='X0,Y0,X1,Y1',
+                        help='Region to watch in relative coordinates (repeatable, default whole frame)')
     args = parser.parse_args()
 
-    player = VideoPlayer(args.camera_id, args.camera_ip, args.username, args.password)
+    if args.metrics_port:
+        get_registry().start_http_server(args.metrics_port)
+
+    frame_bus = None
+    if args.frame_bus:
+        try:
+            frame_bus = tuple(int(v) for v in args.frame_bus.lower().split('x'))
+        except ValueError:
+            frame_bus = ()
+        if len(frame_bus) != 2:
+            parser.error('--frame-bus expects WxH')
+
+    if args.headless is not None:
+        sources = [(f"Stream {index + 1}", uri) for index, uri in enumerate(args.uri)]
+        if args.headless or not sources:
+            sources += load_camera_sources(args.headless)
+        if not sources:
+            parser.error('no stream to supervise')
+        sys.exit(HeadlessMonitor(sources, decode=args.decode, frame_bus=frame_bus).run(args.duration))
+
+    if tk is None:
+        parser.error('tkinter and PIL are required without --headless')
+
+    if args.grid is not None:
+        sources = [(f"Stream {index + 1}", uri) for index, uri in enumerate(args.uri)]
+        if args.grid or not sources:
+            sources += load_wall_sources(args.grid, args.layout)
+        wall = VideoWall(sources[:16], args.layout)
+        wall.run()
+        return
+
+    if not args.uri and not args.camera_ip:
+        parser.error('camera_id and camera_ip are required (or --uri / --grid)')
+
+    motion = None
+    if args.motion:
+        try:
+            width, height = (int(v) for v in args.motion_size.lower().split('x'))
+            regions = [tuple(float(v) for v in region.split(',')) for region in args.motion_mask or []]
+        except ValueError:
+            parser.error('invalid --motion-size or --motion-mask')
+        if any(len(region) != 4 for region in regions):
+            parser.error('--motion-mask expects X0,Y0,X1,Y1')
+        motion = {'size': (width, height), 'threshold': args.motion_threshold,
+                  'min_area': args.motion_area, 'regions': regions}
+
+    player = VideoPlayer(args.camera_id or '-', args.camera_ip, args.username, args.password,
+                         stream_uri=args.uri[0] if args.uri else None,
+                         prebuffer_capacity=int(args.prebuffer_mb * 1024 * 1024),
+                         clip_dir=args.clip_dir, motion=motion, frame_bus=frame_bus)
     player.run()
 
 if __name__ == "__main__":
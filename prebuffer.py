@@ -0,0 +1,229 @@
+"""
+Pré-enregistrement en mémoire : les derniers paquets TS (compressés) de chaque flux.
+
+libVLC duplique le flux vers un socket UDP local (sout duplicate, mux ts, sans transcodage).
+Un seul thread par processus copie les datagrammes dans un buffer circulaire préalloué par
+flux ; un export écrit les N dernières secondes (depuis une image clé) puis les M suivantes.
+"""
+import os
+import time
+import socket
+import selectors
+import threading
+from collections import deque
+
+TS_PACKET_SIZE = 188
+
+# Mémoire maximale par caméra (octets), allouée une fois
+DEFAULT_CAPACITY = 16 * 1024 * 1024
+
+# Durée par défaut d'un clip autour de l'événement (secondes)
+CLIP_BEFORE = 30
+CLIP_AFTER = 10
+
+DEFAULT_CLIP_DIR = 'clips'
+
+# Un repère temporel au plus toutes les MARK_INTERVAL secondes (plus un par image clé)
+MARK_INTERVAL = 0.25
+
+# Tampon de réception du socket : absorbe les rafales d'une image clé
+SOCKET_RCVBUF = 4 * 1024 * 1024
+
+_MAX_DATAGRAM = 65536
+
+
+def udp_destination(port):
+    """Branche #duplicate qui recopie le flux en TS, sans transcodage, vers 127.0.0.1:port"""
+    return f"std{{access=udp{{caching=0}},mux=ts,dst=127.0.0.1:{port}}}"
+
+
+def free_udp_port():
+    """Port UDP local libre (pour une copie du flux lue par un autre lecteur libVLC)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _has_keyframe(data):
+    """random_access_indicator d'un des paquets TS du datagramme"""
+    for offset in range(0, len(data) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        # sync byte, champ d'adaptation présent, non vide, bit RAI
+        if (data[offset] == 0x47 and data[offset + 3] & 0x20
+                and data[offset + 4] and data[offset + 5] & 0x40):
+            return True
+    return False
+
+
+class Prebuffer:
+    """Buffer circulaire de paquets TS d'un flux"""
+
+    def __init__(self, name, capacity=DEFAULT_CAPACITY):
+        # Capacité arrondie à un nombre entier de paquets TS
+        self.capacity = capacity - capacity % TS_PACKET_SIZE
+        self.name = name
+        self._buffer = bytearray(self.capacity)
+        self._written = 0                # octets reçus depuis le début (position absolue)
+        self._marks = deque()            # (monotonic, position absolue, image clé)
+        self._lock = threading.Lock()
+        self.socket = None
+        self.port = 0
+        self.open()
+
+    def open(self):
+        """(Re)crée le socket de réception sur le même port : la destination sout ne change pas"""
+        if self.socket is not None and self.socket.fileno() != -1:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+            sock.bind(('127.0.0.1', self.port))
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        self.socket = sock
+        self.port = sock.getsockname()[1]
+
+    def sout_destination(self):
+        """Destination sout (pour #duplicate) : copie TS vers le socket"""
+        return udp_destination(self.port)
+
+    def write(self, data, now=None):
+        now = time.monotonic() if now is None else now
+        size = len(data)
+        if size > self.capacity:
+            data, size = data[-self.capacity:], self.capacity
+        key = _has_keyframe(data)
+        with self._lock:
+            start = self._written % self.capacity
+            first = min(size, self.capacity - start)
+            self._buffer[start:start + first] = data[:first]
+            if first < size:
+                self._buffer[:size - first] = data[first:]
+            if key or not self._marks or now - self._marks[-1][0] >= MARK_INTERVAL:
+                self._marks.append((now, self._written, key))
+            self._written += size
+            oldest = self._written - self.capacity
+            while self._marks and self._marks[0][1] < oldest:
+                self._marks.popleft()
+
+    def _read(self, start, end):
+        """Octets entre deux positions absolues encore présentes dans le buffer"""
+        start = max(start, self._written - self.capacity)
+        size = end - start
+        if size <= 0:
+            return b''
+        first = start % self.capacity
+        if first + size <= self.capacity:
+            return bytes(self._buffer[first:first + size])
+        return bytes(self._buffer[first:]) + bytes(self._buffer[:first + size - self.capacity])
+
+    def stats(self):
+        """(octets utilisés, capacité, secondes couvertes)"""
+        with self._lock:
+            used = min(self._written, self.capacity)
+            seconds = self._marks[-1][0] - self._marks[0][0] if len(self._marks) > 1 else 0.0
+        return used, self.capacity, seconds
+
+    def _clip_start(self, since):
+        """Dernière image clé avant `since`, sinon la plus ancienne disponible"""
+        start = None
+        for when, position, key in self._marks:
+            if not key:
+                continue
+            if start is None or when <= since:
+                start = position
+            if when > since:
+                break
+        if start is None:
+            start = self._marks[0][1] if self._marks else self._written
+        return start
+
+    def export_clip(self, path, before=CLIP_BEFORE, after=CLIP_AFTER):
+        """Écrit les `before` dernières secondes puis les `after` suivantes ; bloque `after` s"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            position = self._clip_start(time.monotonic() - before)
+            end = self._written
+            data = self._read(position, end)
+        with open(path, 'wb') as f:
+            f.write(data)
+            deadline = time.monotonic() + after
+            while True:
+                # Par tranches : le buffer peut tourner pendant `after` secondes
+                time.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+                with self._lock:
+                    position, end = end, self._written
+                    if position < end - self.capacity:
+                        print(f"Prebuffer {self.name}: clip overrun, {end - self.capacity - position} bytes lost")
+                    data = self._read(position, end)
+                f.write(data)
+                if time.monotonic() >= deadline:
+                    break
+        return path
+
+    def clip_path(self, directory=DEFAULT_CLIP_DIR):
+        safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(self.name))
+        return os.path.join(directory, f"{safe}_{time.strftime('%Y%m%d-%H%M%S')}.ts")
+
+    def close(self):
+        self.socket.close()
+
+
+class PrebufferHub:
+    """Thread unique de réception pour tous les buffers du processus"""
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.RLock()
+        self._thread = None
+        self._scratch = bytearray(_MAX_DATAGRAM)
+
+    def register(self, prebuffer):
+        with self._lock:
+            self._selector.register(prebuffer.socket, selectors.EVENT_READ, prebuffer)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='prebuffer', daemon=True)
+                self._thread.start()
+
+    def unregister(self, prebuffer):
+        with self._lock:
+            try:
+                self._selector.unregister(prebuffer.socket)
+            except (KeyError, ValueError):
+                pass
+
+    def _run(self):
+        view = memoryview(self._scratch)
+        while True:
+            with self._lock:
+                ready = self._selector.select(timeout=0.2) if self._selector.get_map() else None
+            if ready is None:
+                time.sleep(0.2)
+                continue
+            for key, _ in ready:
+                prebuffer = key.data
+                now = time.monotonic()
+                # Vider le socket : plusieurs datagrammes par réveil
+                while True:
+                    try:
+                        size = prebuffer.socket.recv_into(self._scratch)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        self.unregister(prebuffer)
+                        break
+                    prebuffer.write(view[:size], now)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """Récepteur unique du processus"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = PrebufferHub()
+        return _hub
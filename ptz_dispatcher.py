@@ -0,0 +1,126 @@
+"""
+Envoi des commandes PTZ hors de la boucle Tk.
+
+Un thread dédié fait les requêtes SOAP ; l'interface dépose ses commandes sans attendre.
+Chaque axe (mouvement, focus) a son emplacement : une commande continue remplace celle qui
+attend encore (la répétition des touches ne s'accumule pas) et part au plus `max_rate` fois
+par seconde. Les commandes ordonnées (Stop, preset) ne sont jamais remplacées ni retardées
+par le limiteur : elles partent dans l'ordre, avant toute commande continue déposée après
+(deux identiques qui se suivent ne partent qu'une fois).
+"""
+import time
+import threading
+from collections import deque
+
+# Commandes continues envoyées au plus par seconde et par axe
+MAX_RATE = 10
+
+# Attente maximale des commandes ordonnées encore en file à la fermeture (secondes)
+CLOSE_TIMEOUT = 2.0
+
+
+class _Slot:
+    __slots__ = ('ordered', 'latest', 'next_send')
+
+    def __init__(self):
+        self.ordered = deque()
+        self.latest = None
+        self.next_send = 0.0
+
+
+class PTZDispatcher:
+    """
+    submit(axis, command, ordered) dépose command() (appel bloquant, sans argument) ;
+    le thread les exécute une par une : une seule requête en vol, la suivante est
+    toujours la plus récente.
+    """
+
+    def __init__(self, max_rate=MAX_RATE):
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.sent = 0
+        self.coalesced = 0
+        self._slots = {}
+        self._condition = threading.Condition()
+        self._busy = False
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='ptz-dispatcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, axis, command, ordered=False):
+        with self._condition:
+            slot = self._slots.get(axis)
+            if slot is None:
+                slot = self._slots[axis] = _Slot()
+            if slot.latest is not None:
+                # Remplacée par une commande plus récente, ou rendue caduque par un Stop
+                self.coalesced += 1
+                slot.latest = None
+            if ordered:
+                if slot.ordered and slot.ordered[-1] is command:
+                    # Stop, Stop : le second ne change rien, il part une fois, à sa place
+                    self.coalesced += 1
+                else:
+                    slot.ordered.append(command)
+            else:
+                slot.latest = command
+            self._condition.notify()
+
+    def wait_idle(self, timeout=None):
+        """Attend que tout ce qui a été déposé soit envoyé ; False si le délai expire"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._busy and not self._pending(), timeout)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Envoie les commandes ordonnées encore en file (Stop) puis arrête le thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _pending(self):
+        return any(slot.ordered or slot.latest is not None for slot in self._slots.values())
+
+    def _next(self):
+        """(commande, emplacement) à envoyer maintenant, ou (None, délai avant la prochaine)"""
+        for slot in self._slots.values():
+            if slot.ordered:
+                return slot.ordered.popleft(), slot
+        if not self._running:
+            # Fermeture : les mouvements en attente n'ont plus de sens
+            return None, None
+        now = time.monotonic()
+        delay = None
+        for slot in self._slots.values():
+            if slot.latest is None:
+                continue
+            if now >= slot.next_send:
+                command, slot.latest = slot.latest, None
+                return command, slot
+            delay = slot.next_send - now if delay is None else min(delay, slot.next_send - now)
+        return None, delay
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._busy = False
+                while True:
+                    command, slot = self._next()
+                    if command is not None:
+                        break
+                    self._condition.notify_all()
+                    if not self._running:
+                        return
+                    self._condition.wait(slot)
+                self._busy = True
+                slot.next_send = time.monotonic() + self.interval
+            try:
+                command()
+            except Exception as e:
+                print(f"PTZ command error: {e}")
+            self.sent += 1
@@ -1,9 +1,11 @@
 import os
 import tkinter as tk
 from tkinter import ttk
-from onvif import ONVIFCamera
 import sys
 import time
+import onvif_cache
+import onvif_client
+from ptz_dispatcher import PTZDispatcher
 
 # Get command line arguments
 if len(sys.argv) != 5:
@@ -17,16 +19,18 @@ password = sys.argv[4]
 
 # Connexion à la caméra ONVIF
 try:
-    camera = ONVIFCamera(camera_ip, 80, username, password)
-    media_service = camera.create_media_service()
+    # Profils et tokens depuis le cache : pas de GetProfiles si le cache est chaud
+    metadata = onvif_cache.get_metadata(onvif_cache.parse_camera_id(camera_id),
+                                        camera_ip, username, password)
+    camera = onvif_client.create_camera(camera_ip, username, password)
     ptz_service = camera.create_ptz_service()
     imaging_service = camera.create_imaging_service()
 except Exception as e:
     print(f"Error connecting to camera: {e}")
     sys.exit(1)
 
-media_profile = media_service.GetProfiles()[0]
-video_source_token = media_profile.VideoSourceConfiguration.SourceToken
+ptz_profile_token = metadata['ptz_profile_token']
+video_source_token = metadata['video_source_token']
 
 # Paramètres de vitesse et mapping des presets
 speed = 0.5
@@ -58,13 +62,18 @@ PTZSpeed = ptz_service.zeep_client.wsdl.types.get_type('{http://www.onvif.org/ve
 Vector2D = ptz_service.zeep_client.wsdl.types.get_type('{http://www.onvif.org/ver10/schema}Vector2D')
 Vector1D = ptz_service.zeep_client.wsdl.types.get_type('{http://www.onvif.org/ver10/schema}Vector1D')
 
-def start_move(pan, tilt, zoom):
-    global current_pan, current_tilt, current_zoom
-    if pan == current_pan and tilt == current_tilt and zoom == current_zoom:
-        return
-    current_pan, current_tilt, current_zoom = pan, tilt, zoom
+# Les requêtes SOAP partent d'un thread dédié : la boucle Tk ne fait que déposer les
+# commandes. Un mouvement en attente est remplacé par le suivant ; Stop n'est jamais perdu.
+dispatcher = PTZDispatcher().start()
+
+# Sous X11, la répétition automatique envoie KeyRelease puis KeyPress : un relâchement n'est
+# pris en compte que si la même touche n'est pas appuyée à nouveau dans ce délai (ms)
+RELEASE_DELAY = 30
+pending_releases = {}
+
+def send_move(pan, tilt, zoom):
     request = ptz_service.create_type('ContinuousMove')
-    request.ProfileToken = media_profile.token
+    request.ProfileToken = ptz_profile_token
     request.Velocity = PTZSpeed()
     request.Velocity.PanTilt = Vector2D(x=pan, y=tilt)
     request.Velocity.Zoom = Vector1D(x=zoom)
@@ -73,21 +82,13 @@ def start_move(pan, tilt, zoom):
     except Exception as e:
         print(f"ContinuousMove error: {e}")
 
-def stop_move():
-    global current_pan, current_tilt, current_zoom
-    if current_pan == 0 and current_tilt == 0 and current_zoom == 0:
-        return
-    current_pan, current_tilt, current_zoom = 0, 0, 0
+def send_stop():
     try:
-        ptz_service.Stop({'ProfileToken': media_profile.token})
+        ptz_service.Stop({'ProfileToken': ptz_profile_token})
     except Exception as e:
         print(f"Stop error: {e}")
 
-def start_focus(focus_speed):
-    global current_focus
-    if focus_speed == current_focus:
-        return
-    current_focus = focus_speed
+def send_focus(focus_speed):
     request = imaging_service.create_type('Move')
     request.VideoSourceToken = video_source_token
     request.Focus = {'Continuous': {'Speed': focus_speed}}
@@ -96,11 +97,7 @@ def start_focus(focus_speed):
     except Exception as e:
         print(f"Focus move error: {e}")
 
-def stop_focus():
-    global current_focus
-    if current_focus == 0:
-        return
-    current_focus = 0
+def send_focus_stop():
     request = imaging_service.create_type('Stop')
     request.VideoSourceToken = video_source_token
     try:
@@ -108,6 +105,48 @@ def stop_focus():
     except Exception as e:
         print(f"Focus stop error: {e}")
 
+def send_preset(key, preset_token):
+    try:
+        ptz_service.GotoPreset({
+            'ProfileToken': ptz_profile_token,
+            'PresetToken': preset_token,
+            'Speed': {
+                'PanTilt': {'x': pan_tilt_speed, 'y': pan_tilt_speed},
+                'Zoom': {'x': zoom_speed}
+            }
+        })
+        print(f"Aller au preset {key}")
+    except Exception as e:
+        print(f"Erreur preset {key}: {e}")
+
+def start_move(pan, tilt, zoom):
+    global current_pan, current_tilt, current_zoom
+    if pan == current_pan and tilt == current_tilt and zoom == current_zoom:
+        return
+    current_pan, current_tilt, current_zoom = pan, tilt, zoom
+    dispatcher.submit('move', lambda: send_move(pan, tilt, zoom))
+
+def stop_move():
+    global current_pan, current_tilt, current_zoom
+    if current_pan == 0 and current_tilt == 0 and current_zoom == 0:
+        return
+    current_pan, current_tilt, current_zoom = 0, 0, 0
+    dispatcher.submit('move', send_stop, ordered=True)
+
+def start_focus(focus_speed):
+    global current_focus
+    if focus_speed == current_focus:
+        return
+    current_focus = focus_speed
+    dispatcher.submit('focus', lambda: send_focus(focus_speed))
+
+def stop_focus():
+    global current_focus
+    if current_focus == 0:
+        return
+    current_focus = 0
+    dispatcher.submit('focus', send_focus_stop, ordered=True)
+
 class KeyboardManager:
     def __init__(self):
         self.keys = {
@@ -151,6 +190,9 @@ class KeyboardManager:
                 return True
         return False
 
+    def handles(self, key):
+        return any(self._get_direction(key, axis) for axis in self.keys)
+
     def get_movement(self):
         pan = tilt = zoom = 0
         
@@ -238,14 +280,30 @@ def decrease_speed():
         speed = round(speed, 1)
         speed_value_label.config(text=f"{speed:.1f}")
 
-def on_key_press(event):
-    global speed
+def normalize_key(event):
     key = event.keysym.lower()
-
     if key in ('control_l', 'control_r'):
-        key = 'ctrl'
+        return 'ctrl'
     if key in ('shift_l', 'shift_r'):
-        key = 'shift'
+        return 'shift'
+    return key
+
+def quit_control():
+    stop_move()
+    stop_focus()
+    # Les Stop en file partent avant la fermeture
+    dispatcher.close()
+    root.quit()
+
+def on_key_press(event):
+    global speed
+    key = normalize_key(event)
+
+    job = pending_releases.pop(key, None)
+    if job is not None:
+        # Répétition automatique : la touche n'a pas été relâchée
+        root.after_cancel(job)
+        return
 
     if key == 'm':
         increase_speed()
@@ -263,39 +321,28 @@ def on_key_press(event):
         update_focus()
     elif key in preset_tokens:
         preset_token = preset_tokens[key]
-        try:
-            ptz_service.GotoPreset({
-                'ProfileToken': media_profile.token,
-                'PresetToken': preset_token,
-                'Speed': {
-                    'PanTilt': {'x': pan_tilt_speed, 'y': pan_tilt_speed},
-                    'Zoom': {'x': zoom_speed}
-                }
-            })
-            print(f"Aller au preset {key}")
-        except Exception as e:
-            print(f"Erreur preset {key}: {e}")
+        dispatcher.submit('move', lambda: send_preset(key, preset_token), ordered=True)
     elif key == 'escape':
-        stop_move()
-        stop_focus()
-        root.quit()
+        quit_control()
     else:
         keyboard.press_key(key)
         update_move()
         update_focus()
 
 def on_key_release(event):
-    key = event.keysym.lower()
-
-    if key in ('control_l', 'control_r'):
-        key = 'ctrl'
-    elif key in ('shift_l', 'shift_r'):
-        key = 'shift'
+    key = normalize_key(event)
+    if not keyboard.handles(key):
+        return
+    job = pending_releases.pop(key, None)
+    if job is not None:
+        root.after_cancel(job)
+    pending_releases[key] = root.after(RELEASE_DELAY, release_key, key)
 
+def release_key(key):
+    pending_releases.pop(key, None)
     keyboard.release_key(key)
     update_move()
     update_focus()
-    root.update_idletasks()
 
 # Création de la fenêtre Tkinter
 root = tk.Tk()
@@ -354,6 +401,7 @@ speed_progress['value'] = (speed - min_speed) / (max_speed - min_speed) * 100
 
 root.bind("<KeyPress>", on_key_press)
 root.bind("<KeyRelease>", on_key_release)
+root.protocol("WM_DELETE_WINDOW", quit_control)
 
 print("Window ready. Click on the window to select it, then use the indicated keys.")
 root.mainloop()
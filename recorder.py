@@ -0,0 +1,341 @@
+"""
+Enregistrement continu des caméras en segments TS, sans transcodage.
+
+libVLC recopie le flux RTSP tel quel (sout livehttp + mux ts) dans des segments coupés
+sur les images clés. Un thread d'arrière-plan indexe les segments terminés dans SQLite
+(caméra, début, fin, taille) et applique la rétention par âge et par quota disque.
+"""
+import os
+import time
+import signal
+import argparse
+import threading
+from queue import Queue
+import vlc
+import camera_db
+import migrations
+from stream_supervisor import get_supervisor
+from stream_metrics import get_registry
+
+# Paramètres libVLC : copie de toutes les pistes, aucune sortie audio/vidéo
+RECORD_PARAMS = [
+    '--rtsp-tcp', '--network-caching=1000', '--sout-all',
+    '--no-xlib', '--quiet'
+]
+
+DEFAULT_ROOT = 'recordings'
+
+# Durée visée d'un segment (secondes, coupé sur l'image clé suivante)
+SEGMENT_SECONDS = 60
+
+# Rétention par caméra
+RETENTION_MAX_AGE = 7 * 24 * 3600
+RETENTION_QUOTA_BYTES = 50 * 1024 ** 3
+
+# Périodes du thread d'indexation / de rétention (secondes)
+INDEX_INTERVAL = 10
+RETENTION_INTERVAL = 60
+
+# Sans données pendant ce délai le superviseur relance l'enregistrement
+RECORD_STALL_TIMEOUT = 5.0
+
+def find_segments(camera_id, start=None, end=None):
+    """Segments (path, start_time, end_time, size) d'une caméra qui recouvrent [start, end]"""
+    migrations.ensure_current()
+    return camera_db.query(
+        'SELECT path, start_time, end_time, size FROM recording_segments '
+        'WHERE camera_id = ? AND end_time >= ? AND start_time <= ? ORDER BY start_time',
+        (str(camera_id), start if start is not None else 0,
+         end if end is not None else float('inf')))
+
+
+def _sout_quote(value):
+    """Valeur entre quotes pour une chaîne sout (chemins Windows, espaces)"""
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _read_playlist(path):
+    """Durées #EXTINF du playlist livehttp : {nom du segment: secondes}"""
+    durations = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            duration = None
+            for line in f:
+                line = line.strip()
+                if line.startswith('#EXTINF:'):
+                    try:
+                        duration = float(line[8:].split(',')[0])
+                    except ValueError:
+                        duration = None
+                elif line and not line.startswith('#'):
+                    if duration is not None:
+                        durations[os.path.basename(line)] = duration
+                    duration = None
+    except OSError:
+        pass
+    return durations
+
+
+class RecordingStream:
+    """Copie d'un flux vers des segments ; même interface que VideoStream pour le superviseur"""
+
+    def __init__(self, camera_id, stream_uri, directory, instance, segment_seconds=SEGMENT_SECONDS):
+        self.name = str(camera_id)
+        self.stream_uri = stream_uri
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.instance = instance
+        self.player = instance.media_player_new()
+        self.session = None
+        self.running = False
+        self.status_queue = Queue()
+        self.metrics = None
+        self._restart_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _new_media(self):
+        # Une session par (re)démarrage : livehttp renumérote ses segments à partir de 1
+        now = time.time()
+        self.session = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        segment = os.path.join(self.directory, f"{self.session}-########.ts")
+        playlist = os.path.join(self.directory, f"{self.session}.m3u8")
+        access = (f"livehttp{{seglen={self.segment_seconds},delsegs=false,numsegs=0,"
+                  f"index={_sout_quote(playlist)},index-url={_sout_quote(self.session + '-########.ts')}}}")
+        media = self.instance.media_new(self.stream_uri)
+        media.add_option(f":sout=#std{{access={access},mux=ts{{use-key-frames}},dst={_sout_quote(segment)}}}")
+        self.player.set_media(media)
+
+    def start(self):
+        self.running = True
+        get_supervisor().register(self, stall_timeout=RECORD_STALL_TIMEOUT)
+        self.metrics = get_registry().register(self, self.name)
+        with self._restart_lock:
+            self._new_media()
+            self.player.play()
+
+    def stop(self):
+        self.running = False
+        get_supervisor().unregister(self)
+        get_registry().unregister(self)
+        with self._restart_lock:
+            self.player.stop()
+
+    def restart(self):
+        """Relance dans une nouvelle session (appelé par le superviseur)"""
+        with self._restart_lock:
+            if not self.running:
+                return
+            self.player.stop()
+            self._new_media()
+            self.player.play()
+
+
+class Recorder:
+    def __init__(self, root=DEFAULT_ROOT, segment_seconds=SEGMENT_SECONDS,
+                 max_age=RETENTION_MAX_AGE, quota_bytes=RETENTION_QUOTA_BYTES):
+        self.root = os.path.abspath(root)
+        self.segment_seconds = segment_seconds
+        self.max_age = max_age
+        self.quota_bytes = quota_bytes
+        # Une seule instance libVLC pour toutes les caméras du nœud
+        self.instance = vlc.Instance(*RECORD_PARAMS)
+        self.streams = {}
+        self._indexed = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add(self, camera_id, stream_uri):
+        migrations.ensure_current()
+        camera_id = str(camera_id)
+        stream = RecordingStream(camera_id, stream_uri, os.path.join(self.root, camera_id),
+                                 self.instance, self.segment_seconds)
+        with self._lock:
+            if camera_id not in self._indexed:
+                self._indexed[camera_id] = {row[0] for row in camera_db.query(
+                    'SELECT path FROM recording_segments WHERE camera_id = ?', (camera_id,))}
+            self.streams[camera_id] = stream
+        stream.start()
+        self._ensure_thread()
+        return stream
+
+    def remove(self, camera_id):
+        with self._lock:
+            stream = self.streams.pop(str(camera_id), None)
+        if stream is not None:
+            stream.stop()
+            # Le dernier segment est fermé : on l'indexe tout de suite
+            self.index_stream(stream)
+
+    # --- index -----------------------------------------------------------------------
+
+    def index_stream(self, stream):
+        """Indexe les segments terminés d'une caméra, renvoie le nombre de nouveaux segments"""
+        try:
+            names = sorted(entry.name for entry in os.scandir(stream.directory)
+                           if entry.name.endswith('.ts') and entry.is_file())
+        except FileNotFoundError:
+            return 0
+        current = [name for name in names if name.startswith(f"{stream.session}-")]
+        if stream.running and current:
+            # Segment en cours d'écriture
+            names.remove(current[-1])
+
+        with self._lock:
+            indexed = self._indexed.setdefault(stream.name, set())
+        playlists = {}
+        rows = []
+        for name in names:
+            path = os.path.join(stream.directory, name)
+            if path in indexed:
+                continue
+            session = name.rsplit('-', 1)[0]
+            if session not in playlists:
+                playlists[session] = _read_playlist(os.path.join(stream.directory, f"{session}.m3u8"))
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            duration = playlists[session].get(name, stream.segment_seconds)
+            rows.append((stream.name, path, stat.st_mtime - duration, stat.st_mtime, stat.st_size))
+
+        if rows:
+            camera_db.executemany(
+                'INSERT OR IGNORE INTO recording_segments (camera_id, path, start_time, end_time, size) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            with self._lock:
+                indexed.update(row[1] for row in rows)
+        return len(rows)
+
+    def index_all(self):
+        with self._lock:
+            streams = list(self.streams.values())
+        return sum(self.index_stream(stream) for stream in streams)
+
+    # --- rétention -------------------------------------------------------------------
+
+    def apply_retention(self, now=None):
+        """Supprime les segments trop vieux ou au-delà du quota, du plus ancien au plus récent"""
+        now = time.time() if now is None else now
+        removed = 0
+        for (camera_id,) in camera_db.query('SELECT DISTINCT camera_id FROM recording_segments'):
+            rows = camera_db.query(
+                'SELECT id, path, end_time, size FROM recording_segments '
+                'WHERE camera_id = ? ORDER BY start_time', (camera_id,))
+            total = sum(row[3] for row in rows)
+            doomed = []
+            for segment_id, path, end_time, size in rows:
+                if end_time >= now - self.max_age and total <= self.quota_bytes:
+                    break
+                doomed.append((segment_id, path))
+                total -= size
+            if not doomed:
+                continue
+
+            for _, path in doomed:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Retention: cannot delete {path}: {e}")
+            camera_db.executemany('DELETE FROM recording_segments WHERE id = ?',
+                                  [(segment_id,) for segment_id, _ in doomed])
+            with self._lock:
+                indexed = self._indexed.get(camera_id)
+                if indexed is not None:
+                    indexed.difference_update(path for _, path in doomed)
+            self._remove_playlists(camera_id, {path for _, path in doomed},
+                                   [row[1] for row in rows[len(doomed):]])
+            removed += len(doomed)
+        return removed
+
+    def _remove_playlists(self, camera_id, doomed, remaining):
+        """Playlist d'une session dont tous les segments ont été supprimés"""
+        live = {os.path.basename(path).rsplit('-', 1)[0] for path in remaining}
+        stream = self.streams.get(camera_id)
+        if stream is not None and stream.running:
+            live.add(stream.session)
+        for path in doomed:
+            session = os.path.basename(path).rsplit('-', 1)[0]
+            if session not in live:
+                try:
+                    os.remove(os.path.join(os.path.dirname(path), f"{session}.m3u8"))
+                except OSError:
+                    pass
+                live.add(session)
+
+    # --- thread d'arrière-plan -------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='recorder-index', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_retention = 0.0
+        while not self._stop.wait(INDEX_INTERVAL):
+            try:
+                self.index_all()
+                if time.monotonic() >= next_retention:
+                    self.apply_retention()
+                    next_retention = time.monotonic() + RETENTION_INTERVAL
+            except Exception as e:
+                print(f"Recorder index error: {e}")
+
+    def shutdown(self):
+        self._stop.set()
+        for camera_id in list(self.streams):
+            self.remove(camera_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Continuous segmented recording (stream copy).')
+    parser.add_argument('camera_ids', type=int, nargs='*', metavar='CAMERA_ID',
+                        help='Cameras to record (all cameras if none and no --uri)')
+    parser.add_argument('--uri', action='append', default=[], metavar='NAME=URI',
+                        help='Record a stream URI directly, without ONVIF (repeatable)')
+    parser.add_argument('--root', default=DEFAULT_ROOT, help='Recordings directory')
+    parser.add_argument('--segment', type=int, default=SEGMENT_SECONDS, help='Segment length (s)')
+    parser.add_argument('--max-age-days', type=float, default=RETENTION_MAX_AGE / 86400)
+    parser.add_argument('--quota-gb', type=float, default=RETENTION_QUOTA_BYTES / 1024 ** 3,
+                        help='Disk quota per camera (GB)')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Expose Prometheus metrics on 127.0.0.1:PORT/metrics')
+    args = parser.parse_args()
+
+    sources = []
+    for value in args.uri:
+        name, sep, uri = value.partition('=')
+        if not sep or '://' in name:
+            parser.error(f'--uri expects NAME=URI, got {value!r}')
+        sources.append((name, uri))
+    if args.camera_ids or not sources:
+        from player_vilkin_hikvision import load_camera_sources
+        # Titres "Camera N" -> répertoire N
+        sources += [(title.split()[-1], uri) for title, uri in load_camera_sources(args.camera_ids)]
+    if not sources:
+        parser.error('no stream to record')
+
+    if args.metrics_port:
+        get_registry().start_http_server(args.metrics_port)
+
+    recorder = Recorder(args.root, args.segment, args.max_age_days * 86400,
+                        int(args.quota_gb * 1024 ** 3))
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    for name, uri in sources:
+        recorder.add(name, uri)
+    print(f"Recording {len(sources)} stream(s) to {recorder.root}", flush=True)
+
+    while not stop.wait(1):
+        for stream in recorder.streams.values():
+            while not stream.status_queue.empty():
+                print(f"{time.strftime('%H:%M:%S')} {stream.name}: {stream.status_queue.get()}", flush=True)
+    recorder.shutdown()
+
+
+if __name__ == '__main__':
+    main()
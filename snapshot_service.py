@@ -0,0 +1,207 @@
+"""
+Vignettes des caméras : JPEG récupérés en parallèle (pool de threads borné), via
+GetSnapshotUri si la caméra le propose, sinon une seule image décodée par libVLC.
+Les vignettes sont gardées sur disque (taille totale bornée) et rafraîchies après un TTL.
+"""
+import io
+import os
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from requests.auth import HTTPBasicAuth, HTTPDigestAuth
+import onvif_cache
+import onvif_client
+
+THUMBNAIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.thumbnails')
+THUMBNAIL_SIZE = (160, 90)
+THUMBNAIL_QUALITY = 80
+
+# Taille maximale du cache disque (octets), les vignettes les plus anciennes partent d'abord
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Âge au-delà duquel une vignette est rafraîchie (elle reste affichée en attendant)
+THUMBNAIL_TTL = 300
+
+# Délai avant de réessayer une caméra en échec
+FAILURE_TTL = 60
+
+SNAPSHOT_WORKERS = 8
+SNAPSHOT_TIMEOUT = 5
+
+# Le repli libVLC décode un flux : on en limite le nombre simultané
+DECODE_WORKERS = 2
+
+DECODE_PARAMS = ['--rtsp-tcp', '--no-xlib', '--vout=dummy', '--no-audio', '--quiet']
+
+
+def fetch_snapshot_jpeg(snapshot_uri, camera_ip, username, password, port=80):
+    """JPEG de GetSnapshotUri, via la session HTTP déjà ouverte vers la caméra"""
+    session = onvif_client.get_transport(camera_ip, port).session
+    response = session.get(snapshot_uri, auth=HTTPDigestAuth(username, password),
+                           timeout=SNAPSHOT_TIMEOUT)
+    if response.status_code == 401:
+        response = session.get(snapshot_uri, auth=HTTPBasicAuth(username, password),
+                               timeout=SNAPSHOT_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+
+class SnapshotService:
+    def __init__(self, directory=THUMBNAIL_DIR, max_bytes=CACHE_MAX_BYTES, ttl=THUMBNAIL_TTL,
+                 workers=SNAPSHOT_WORKERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='snapshot')
+        self._decode_slots = threading.Semaphore(DECODE_WORKERS)
+        self._instance = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failures = {}
+        self._sizes = {}
+        os.makedirs(directory, exist_ok=True)
+        # Taille du cache existant, relue une fois au démarrage
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.jpg'):
+                self._sizes[entry.path] = entry.stat().st_size
+
+    def path(self, camera_id):
+        return os.path.join(self.directory, f"{camera_id}.jpg")
+
+    def cached(self, camera_id):
+        """(chemin, à jour) de la vignette en cache, ou (None, False)"""
+        path = self.path(camera_id)
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return None, False
+        return path, age < self.ttl
+
+    def request(self, camera_id, camera_ip, username, password, callback):
+        """
+        callback(camera_id, chemin) tout de suite si une vignette est en cache, puis encore
+        après rafraîchissement. Appelé depuis un thread du pool pour les nouvelles vignettes.
+        password peut être une fonction : appelée seulement si une capture est nécessaire.
+        """
+        path, fresh = self.cached(camera_id)
+        if path is not None:
+            callback(camera_id, path)
+            if fresh:
+                return
+        with self._lock:
+            if camera_id in self._pending:
+                return
+            if time.monotonic() - self._failures.get(camera_id, -FAILURE_TTL) < FAILURE_TTL:
+                return
+            self._pending.add(camera_id)
+        self._executor.submit(self._refresh, camera_id, camera_ip, username, password, callback)
+
+    def _refresh(self, camera_id, camera_ip, username, password, callback):
+        try:
+            if callable(password):
+                password = password()
+            jpeg = self.capture(camera_id, camera_ip, username, password)
+            path = self.store(camera_id, jpeg)
+            with self._lock:
+                self._failures.pop(camera_id, None)
+            callback(camera_id, path)
+        except Exception as e:
+            with self._lock:
+                self._failures[camera_id] = time.monotonic()
+            print(f"Snapshot error for camera {camera_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(camera_id)
+
+    # --- capture ---------------------------------------------------------------------
+
+    def capture(self, camera_id, camera_ip, username, password):
+        metadata = onvif_cache.get_metadata(camera_id, camera_ip, username, password)
+        profiles = metadata['profiles']
+        if profiles and any('snapshot_uri' not in p for p in profiles):
+            # Cache écrit avant l'ajout de GetSnapshotUri
+            profiles = onvif_cache.get_metadata(camera_id, camera_ip, username, password,
+                                                refresh=True)['profiles']
+        snapshot_uri = next((p['snapshot_uri'] for p in profiles if p.get('snapshot_uri')), None)
+        if snapshot_uri:
+            try:
+                return fetch_snapshot_jpeg(snapshot_uri, camera_ip, username, password)
+            except Exception as e:
+                print(f"GetSnapshotUri failed for camera {camera_id}, decoding a frame: {e}")
+        with self._decode_slots:
+            return self.decode_frame(profiles, camera_ip, username, password)
+
+    def _get_instance(self):
+        import vlc
+        with self._lock:
+            if self._instance is None:
+                self._instance = vlc.Instance(*DECODE_PARAMS)
+            return self._instance
+
+    def decode_frame(self, profiles, camera_ip, username, password):
+        """Une image du flux le plus léger, décodée par libVLC vers une sortie nulle"""
+        from player_vilkin_hikvision import select_profile, build_stream_uri
+        stream_uri = build_stream_uri(select_profile(profiles, 1, 1), camera_ip, username, password)
+        player = self._get_instance().media_player_new(stream_uri)
+        fd, snapshot = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+        try:
+            player.play()
+            deadline = time.monotonic() + SNAPSHOT_TIMEOUT
+            while time.monotonic() < deadline:
+                width, height = player.video_get_size()
+                if width and player.video_take_snapshot(0, snapshot, 0, 0) == 0 \
+                        and os.path.getsize(snapshot):
+                    with open(snapshot, 'rb') as f:
+                        return f.read()
+                time.sleep(0.1)
+            raise TimeoutError(f"no frame decoded within {SNAPSHOT_TIMEOUT}s")
+        finally:
+            player.stop()
+            player.release()
+            os.remove(snapshot)
+
+    # --- cache disque ----------------------------------------------------------------
+
+    def store(self, camera_id, jpeg):
+        image = Image.open(io.BytesIO(jpeg))
+        image.draft('RGB', THUMBNAIL_SIZE)  # décodage JPEG réduit : bien plus rapide
+        image = image.convert('RGB')
+        image.thumbnail(THUMBNAIL_SIZE)
+        path = self.path(camera_id)
+        temporary = f"{path}.tmp"
+        image.save(temporary, 'JPEG', quality=THUMBNAIL_QUALITY)
+        os.replace(temporary, path)
+        with self._lock:
+            self._sizes[path] = os.path.getsize(path)
+            self._evict()
+        return path
+
+    def _evict(self):
+        """Supprime les vignettes les plus anciennes au-delà de max_bytes (verrou pris)"""
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        for path in sorted(self._sizes, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0):
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def invalidate(self, camera_id):
+        path = self.path(camera_id)
+        with self._lock:
+            self._sizes.pop(path, None)
+            self._failures.pop(camera_id, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,281 @@
+"""
+Métriques par flux : un thread d'échantillonnage par processus lit vlc.MediaStats,
+les valeurs sont gardées dans des buffers circulaires de taille fixe et exposées
+au format texte Prometheus sur un endpoint HTTP local.
+"""
+import time
+import threading
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import vlc
+
+# Période d'échantillonnage (secondes)
+SAMPLE_INTERVAL = 1.0
+
+# Historique gardé par métrique (échantillons)
+HISTORY_SIZE = 300
+
+# Fenêtre de la moyenne mobile du débit affiché (échantillons)
+BITRATE_WINDOW = 5
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 9108
+
+
+class RingBuffer:
+    """Buffer circulaire préalloué de flottants"""
+
+    __slots__ = ('_data', '_size', '_index', '_count')
+
+    def __init__(self, size=HISTORY_SIZE):
+        self._data = array('d', bytes(8 * size))
+        self._size = size
+        self._index = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._index] = value
+        self._index = (self._index + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def latest(self, default=0.0):
+        if not self._count:
+            return default
+        return self._data[(self._index - 1) % self._size]
+
+    def values(self, last=None):
+        """Valeurs du plus ancien au plus récent"""
+        count = self._count if last is None else min(last, self._count)
+        start = (self._index - count) % self._size
+        return [self._data[(start + i) % self._size] for i in range(count)]
+
+    def mean(self, last=None):
+        values = self.values(last)
+        return sum(values) / len(values) if values else 0.0
+
+
+class StreamMetrics:
+    # Compteurs cumulés de vlc.MediaStats
+    COUNTERS = ('decoded_video', 'displayed_pictures', 'lost_pictures', 'read_bytes', 'demux_read_bytes')
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = str(name)
+        self.totals = dict.fromkeys(self.COUNTERS, 0)
+        self._last_raw = dict.fromkeys(self.COUNTERS, 0)
+        self._last_sample = None
+        self.decoded_fps = RingBuffer()
+        self.lost_fps = RingBuffer()
+        self.input_mbps = RingBuffer()
+        self.demux_mbps = RingBuffer()
+        self.time_to_first_frame = RingBuffer(32)
+        self.stall_seconds = RingBuffer(64)
+        self.stalls_total = 0
+        self.stall_seconds_total = 0.0
+        self.has_stats = False
+
+    def sample(self, stats, now):
+        deltas = {}
+        for key in self.COUNTERS:
+            raw = getattr(stats, key) or 0
+            # Les compteurs libVLC repartent de zéro quand le média est rouvert
+            delta = raw - self._last_raw[key] if raw >= self._last_raw[key] else raw
+            self._last_raw[key] = raw
+            self.totals[key] += delta
+            deltas[key] = delta
+
+        if self._last_sample is not None:
+            elapsed = now - self._last_sample
+            if elapsed > 0:
+                self.decoded_fps.append(deltas['decoded_video'] / elapsed)
+                self.lost_fps.append(deltas['lost_pictures'] / elapsed)
+                self.input_mbps.append(deltas['read_bytes'] * 8 / (elapsed * 1_000_000))
+                self.demux_mbps.append(deltas['demux_read_bytes'] * 8 / (elapsed * 1_000_000))
+        self._last_sample = now
+        self.has_stats = True
+
+    def no_stats(self, now):
+        self._last_sample = None
+
+    def bitrate(self):
+        """Débit démultiplexé (Mbps) en moyenne mobile, comme l'ancien get_bitrate"""
+        if not self.has_stats or not len(self.demux_mbps):
+            return "--"
+        return max(0, min(self.demux_mbps.mean(BITRATE_WINDOW), 100))
+
+    def prebuffer(self):
+        """(octets utilisés, capacité, secondes couvertes) du pré-enregistrement, ou None"""
+        prebuffer = getattr(self.stream, 'prebuffer', None)
+        return prebuffer.stats() if prebuffer is not None else None
+
+    def record_first_frame(self, seconds):
+        self.time_to_first_frame.append(seconds)
+
+    def record_stall(self, seconds):
+        self.stalls_total += 1
+        self.stall_seconds_total += seconds
+        self.stall_seconds.append(seconds)
+
+
+class MetricsRegistry:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._server = None
+
+    def register(self, stream, name):
+        metrics = StreamMetrics(stream, name)
+        with self._lock:
+            self._metrics[id(stream)] = metrics
+        self._ensure_thread()
+        return metrics
+
+    def unregister(self, stream):
+        with self._lock:
+            self._metrics.pop(id(stream), None)
+
+    def get(self, stream):
+        with self._lock:
+            return self._metrics.get(id(stream))
+
+    def all(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    # --- échantillonnage -------------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='stream-metrics', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        stats = vlc.MediaStats()
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            for metrics in self.all():
+                try:
+                    media = metrics.stream.player.get_media()
+                    if media is not None and media.get_stats(stats):
+                        metrics.sample(stats, now)
+                    else:
+                        metrics.no_stats(now)
+                except Exception as e:
+                    print(f"Metrics sampling error ({metrics.name}): {e}")
+
+    def on_supervisor_event(self, entry, message):
+        """Listener du superviseur : temps jusqu'à la première image et durées de blocage"""
+        metrics = self.get(entry.stream)
+        if metrics is None:
+            return
+        if message == 'playing' and entry.ttff is not None:
+            metrics.record_first_frame(entry.ttff)
+        elif message.endswith('stalled') and entry.stall_duration is not None:
+            metrics.record_stall(entry.stall_duration)
+
+    # --- export Prometheus -----------------------------------------------------------
+
+    def render(self, supervisor=None):
+        if supervisor is None:
+            from stream_supervisor import get_supervisor
+            supervisor = get_supervisor()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f'{name}{{camera="{_escape(labels)}"}} {value}')
+
+        streams = self.all()
+        entries = {id(entry.stream): entry for entry in supervisor.entries()}
+
+        family('camera_frames_decoded_total', 'counter', 'Decoded video frames.',
+               [(m.name, m.totals['decoded_video']) for m in streams])
+        family('camera_frames_displayed_total', 'counter', 'Displayed pictures.',
+               [(m.name, m.totals['displayed_pictures']) for m in streams])
+        family('camera_frames_lost_total', 'counter', 'Lost pictures.',
+               [(m.name, m.totals['lost_pictures']) for m in streams])
+        family('camera_decoded_fps', 'gauge', 'Decoded frames per second (last sample).',
+               [(m.name, round(m.decoded_fps.latest(), 3)) for m in streams])
+        family('camera_input_bitrate_mbps', 'gauge', 'Input bitrate in Mbit/s (last sample).',
+               [(m.name, round(m.input_mbps.latest(), 4)) for m in streams])
+        family('camera_demux_bitrate_mbps', 'gauge', 'Demuxed bitrate in Mbit/s (last sample).',
+               [(m.name, round(m.demux_mbps.latest(), 4)) for m in streams])
+        family('camera_time_to_first_frame_seconds', 'gauge', 'Time to first frame of the last (re)start.',
+               [(m.name, round(m.time_to_first_frame.latest(), 3)) for m in streams])
+        family('camera_stalls_total', 'counter', 'Detected stream stalls.',
+               [(m.name, m.stalls_total) for m in streams])
+        family('camera_stall_seconds_total', 'counter', 'Cumulated stall duration.',
+               [(m.name, round(m.stall_seconds_total, 3)) for m in streams])
+        buffered = [(m.name, m.prebuffer()) for m in streams]
+        buffered = [(name, stats) for name, stats in buffered if stats is not None]
+        family('camera_prebuffer_bytes', 'gauge', 'Compressed packets held in the pre-event buffer.',
+               [(name, stats[0]) for name, stats in buffered])
+        family('camera_prebuffer_capacity_bytes', 'gauge', 'Pre-event buffer size (preallocated).',
+               [(name, stats[1]) for name, stats in buffered])
+        family('camera_prebuffer_seconds', 'gauge', 'Duration covered by the pre-event buffer.',
+               [(name, round(stats[2], 1)) for name, stats in buffered])
+        supervised = [(m, entries[id(m.stream)]) for m in streams if id(m.stream) in entries]
+        family('camera_restarts_total', 'counter', 'Player restarts by the supervisor.',
+               [(m.name, entry.restarts) for m, entry in supervised])
+        family('camera_up', 'gauge', '1 if the stream is playing.',
+               [(m.name, int(entry.state == 'playing')) for m, entry in supervised])
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port=DEFAULT_PORT, host=DEFAULT_HOST, supervisor=None):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render(supervisor).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        return self._server
+
+    def shutdown(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registre unique du processus"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from stream_supervisor import get_supervisor
+            _registry = MetricsRegistry()
+            get_supervisor().listeners.append(_registry.on_supervisor_event)
+        return _registry
@@ -0,0 +1,256 @@
+"""
+Superviseur de flux : un seul thread par processus pour tous les VideoStream.
+
+Les événements libVLC (erreur, fin, buffering, vout, progression du temps) ne font que
+mettre à jour des horodatages ; le thread du superviseur décide et relance les lecteurs.
+Les callbacks libVLC ne doivent jamais rappeler libVLC (risque d'interblocage).
+"""
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import vlc
+
+# Période d'évaluation du superviseur (secondes)
+TICK = 0.2
+
+# Pas de nouvelle image depuis ce délai = flux figé
+STALL_TIMEOUT = 0.8
+
+# Délai max pour obtenir la première image après (re)démarrage
+START_TIMEOUT = 10.0
+
+# Backoff exponentiel avec jitter entre deux relances
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Disjoncteur : après N échecs rapprochés on cesse de relancer pendant un moment
+CIRCUIT_FAILURES = 5
+CIRCUIT_WINDOW = 60.0
+CIRCUIT_OPEN_TIME = 120.0
+
+# stop()/play() libVLC peuvent bloquer : exécutés hors du thread du superviseur
+RESTART_WORKERS = 4
+
+# Durée de lecture saine qui remet les compteurs d'échecs à zéro
+HEALTHY_AFTER = 10.0
+
+STARTING = 'starting'
+PLAYING = 'playing'
+BACKOFF = 'backoff'
+OPEN = 'circuit-open'
+
+
+class _Supervised:
+    """État de supervision d'un flux (écrit par les callbacks, lu par le superviseur)"""
+
+    def __init__(self, stream, stall_timeout):
+        self.stream = stream
+        self.stall_timeout = stall_timeout
+        self.state = STARTING
+        self.state_since = time.monotonic()
+        self.last_progress = 0.0
+        self.buffering = False
+        self.failed = None          # raison signalée par un événement
+        self.attempt = 0
+        self.next_attempt = 0.0
+        self.failures = []          # horodatages des échecs récents
+        self.restarts = 0
+        self.stall_started = None
+        self.stall_duration = None  # durée du dernier blocage (s)
+        self.ttff = None            # temps jusqu'à la première image du dernier démarrage (s)
+        self.handlers = []
+        # EventManager qui a reçu les handlers (event_manager() est mémoïsé par lecteur dans
+        # python-vlc) : gardé ici pour que le détachement ne dépende pas de ce cache
+        self.event_manager = None
+
+    def set_state(self, state, now):
+        self.state = state
+        self.state_since = now
+
+
+class StreamSupervisor:
+    def __init__(self, tick=TICK):
+        self.tick = tick
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._restarter = ThreadPoolExecutor(max_workers=RESTART_WORKERS,
+                                             thread_name_prefix='stream-restart')
+        self.listeners = []
+
+    # --- enregistrement ------------------------------------------------------------
+
+    def register(self, stream, stall_timeout=STALL_TIMEOUT):
+        entry = _Supervised(stream, stall_timeout)
+        self._attach_events(entry)
+        with self._lock:
+            self._streams[id(stream)] = entry
+        self._ensure_thread()
+        return entry
+
+    def unregister(self, stream):
+        with self._lock:
+            entry = self._streams.pop(id(stream), None)
+        if entry is not None:
+            self._detach_events(entry)
+
+    def get(self, stream):
+        with self._lock:
+            return self._streams.get(id(stream))
+
+    def entries(self):
+        with self._lock:
+            return list(self._streams.values())
+
+    def restarting(self, stream):
+        """
+        Relance volontaire du lecteur (changement de profil) : le flux repart en STARTING,
+        la reconnexion RTSP n'est ni un blocage ni un échec du disjoncteur
+        """
+        entry = self.get(stream)
+        if entry is None:
+            return
+        entry.failed = None
+        entry.stall_started = None
+        entry.buffering = False
+        entry.set_state(STARTING, time.monotonic())
+
+    def _attach_events(self, entry):
+        manager = entry.event_manager = entry.stream.player.event_manager()
+
+        def progress(event):
+            entry.last_progress = time.monotonic()
+            entry.buffering = False
+
+        def buffering(event):
+            entry.buffering = event.u.new_cache < 100
+
+        def failed(reason):
+            def handler(event):
+                entry.failed = reason
+            return handler
+
+        handlers = [
+            (vlc.EventType.MediaPlayerTimeChanged, progress),
+            (vlc.EventType.MediaPlayerVout, progress),
+            (vlc.EventType.MediaPlayerBuffering, buffering),
+            (vlc.EventType.MediaPlayerEncounteredError, failed('error')),
+            (vlc.EventType.MediaPlayerEndReached, failed('end-reached')),
+        ]
+        for event_type, handler in handlers:
+            manager.event_attach(event_type, handler)
+        entry.handlers = handlers
+
+    def _detach_events(self, entry):
+        manager = entry.event_manager
+        if manager is None:
+            return
+        for event_type, _ in entry.handlers:
+            try:
+                manager.event_detach(event_type)
+            except Exception:
+                pass
+        entry.handlers = []
+
+    # --- boucle ----------------------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='stream-supervisor', daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            now = time.monotonic()
+            for entry in self.entries():
+                try:
+                    self._evaluate(entry, now)
+                except Exception as e:
+                    print(f"Supervisor error: {e}")
+
+    def _notify(self, entry, message):
+        entry.stream.status_queue.put(message)
+        for listener in self.listeners:
+            listener(entry, message)
+
+    def _evaluate(self, entry, now):
+        if entry.state == STARTING:
+            if entry.failed:
+                self._fail(entry, now, entry.failed)
+            elif entry.last_progress >= entry.state_since:
+                entry.ttff = entry.last_progress - entry.state_since
+                entry.set_state(PLAYING, now)
+                self._notify(entry, 'playing')
+            elif now - entry.state_since > START_TIMEOUT:
+                self._fail(entry, now, 'start-timeout')
+
+        elif entry.state == PLAYING:
+            if entry.failed:
+                self._fail(entry, now, entry.failed)
+                return
+            idle = now - entry.last_progress
+            if idle > entry.stall_timeout:
+                if entry.stall_started is None:
+                    entry.stall_started = entry.last_progress
+                # Un buffering réseau annoncé laisse jusqu'à START_TIMEOUT avant de relancer
+                if not entry.buffering or idle > START_TIMEOUT:
+                    entry.stall_duration = now - entry.stall_started
+                    entry.stall_started = None
+                    self._fail(entry, now, 'stalled')
+            else:
+                entry.stall_started = None
+                if now - entry.state_since > HEALTHY_AFTER:
+                    entry.attempt = 0
+                    entry.failures.clear()
+
+        elif entry.state == BACKOFF:
+            if now >= entry.next_attempt:
+                self._restart(entry, now)
+
+        elif entry.state == OPEN:
+            # Demi-ouverture : un seul essai, un nouvel échec rouvre le disjoncteur
+            if now >= entry.next_attempt:
+                self._notify(entry, 'circuit-half-open')
+                self._restart(entry, now)
+
+    def _fail(self, entry, now, reason):
+        entry.failed = None
+        entry.failures = [t for t in entry.failures if now - t < CIRCUIT_WINDOW] + [now]
+        if len(entry.failures) >= CIRCUIT_FAILURES:
+            entry.set_state(OPEN, now)
+            entry.next_attempt = now + CIRCUIT_OPEN_TIME
+            entry.failures.clear()
+            self._notify(entry, f"circuit-open-{reason}")
+            return
+
+        entry.attempt += 1
+        delay = min(BACKOFF_BASE * (2 ** (entry.attempt - 1)), BACKOFF_MAX)
+        entry.next_attempt = now + random.uniform(delay / 2, delay)
+        entry.set_state(BACKOFF, now)
+        self._notify(entry, f"restart-{reason}")
+
+    def _restart(self, entry, now):
+        entry.restarts += 1
+        entry.failed = None
+        entry.buffering = False
+        entry.set_state(STARTING, now)
+        self._restarter.submit(entry.stream.restart)
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_supervisor():
+    """Superviseur unique du processus"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = StreamSupervisor()
+        return _supervisor